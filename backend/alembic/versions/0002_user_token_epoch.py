@@ -0,0 +1,23 @@
+"""Add users.token_epoch for access token revocation
+
+Revision ID: 0002
+Revises: 67915f146566
+Create Date: 2026-10-18 09:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "67915f146566"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("token_epoch", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+def downgrade() -> None:
+    op.drop_column("users", "token_epoch")
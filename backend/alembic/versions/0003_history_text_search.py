@@ -0,0 +1,49 @@
+"""Index search_history.query and image_history.prompt for substring search
+
+PostgreSQL gets pg_trgm GIN indexes; SQLite gets FTS5 trigram shadow tables
+kept in sync by triggers (backfilled with the FTS5 'rebuild' command).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:00:00.000000
+"""
+from alembic import op
+from app.db.text_search import (
+    postgres_create_statements,
+    postgres_drop_statements,
+    sqlite_create_statements,
+    sqlite_drop_statements,
+    sqlite_rebuild_statement,
+)
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+SEARCHABLE = (("search_history", "query"), ("image_history", "prompt"))
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table, column in SEARCHABLE:
+        if dialect == "postgresql":
+            statements = postgres_create_statements(table, column)
+        elif dialect == "sqlite":
+            statements = sqlite_create_statements(table, column) + [sqlite_rebuild_statement(table)]
+        else:
+            statements = []
+        for statement in statements:
+            op.execute(statement)
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table, column in SEARCHABLE:
+        if dialect == "postgresql":
+            statements = postgres_drop_statements(table, column)
+        elif dialect == "sqlite":
+            statements = sqlite_drop_statements(table)
+        else:
+            statements = []
+        for statement in statements:
+            op.execute(statement)
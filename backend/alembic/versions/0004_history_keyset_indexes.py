@@ -0,0 +1,27 @@
+"""Add (user_id, created_at DESC, id DESC) indexes to the history tables
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    for table in ("search_history", "image_history"):
+        op.create_index(
+            f"ix_{table}_user_created",
+            table,
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+        )
+
+def downgrade() -> None:
+    for table in ("search_history", "image_history"):
+        op.drop_index(f"ix_{table}_user_created", table_name=table)
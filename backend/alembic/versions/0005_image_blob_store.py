@@ -0,0 +1,72 @@
+"""Move generated images from image_history.image_data into the blob store
+
+Adds image_digest/image_size/image_mime and migrates existing base64 rows in
+batches, clearing image_data once the bytes are stored.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00.000000
+"""
+import base64
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 200
+
+def upgrade() -> None:
+    op.add_column("image_history", sa.Column("image_digest", sa.String(length=64), nullable=True))
+    op.add_column("image_history", sa.Column("image_size", sa.Integer(), nullable=True))
+    op.add_column("image_history", sa.Column("image_mime", sa.String(), nullable=True))
+    op.create_index(op.f("ix_image_history_image_digest"), "image_history", ["image_digest"], unique=False)
+
+    from app.services.blob_store import get_blob_store
+
+    store = get_blob_store()
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT id, image_data FROM image_history "
+                "WHERE id > :last_id AND image_data IS NOT NULL "
+                "ORDER BY id LIMIT :batch"
+            ),
+            {"last_id": last_id, "batch": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, image_data in rows:
+            blob = store.put(base64.b64decode(image_data))
+            bind.execute(
+                sa.text(
+                    "UPDATE image_history SET image_digest = :digest, image_size = :size, "
+                    "image_mime = :mime, image_data = NULL WHERE id = :id"
+                ),
+                {"digest": blob.digest, "size": blob.size, "mime": blob.mime_type, "id": row_id},
+            )
+        last_id = rows[-1][0]
+
+def downgrade() -> None:
+    from app.services.blob_store import get_blob_store
+
+    store = get_blob_store()
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.text("SELECT id, image_digest FROM image_history WHERE image_digest IS NOT NULL")
+    ).fetchall()
+    for row_id, digest in rows:
+        bind.execute(
+            sa.text("UPDATE image_history SET image_data = :data WHERE id = :id"),
+            {"data": base64.b64encode(store.read(digest)).decode(), "id": row_id},
+        )
+
+    op.drop_index(op.f("ix_image_history_image_digest"), table_name="image_history")
+    op.drop_column("image_history", "image_mime")
+    op.drop_column("image_history", "image_size")
+    op.drop_column("image_history", "image_digest")
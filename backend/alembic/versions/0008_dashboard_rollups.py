@@ -0,0 +1,57 @@
+"""Add per-user activity rollup tables for /dashboard/stats
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 16:00:00.000000
+
+The tables are backfilled from existing history during the upgrade, so
+deleting older history later decrements counts that were really made.
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.db.rollups import rebuild_user, rollup_user_ids
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "user_daily_activity",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("searches", sa.Integer(), nullable=False),
+        sa.Column("images", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "day"),
+    )
+    op.create_table(
+        "user_query_counts",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(length=255), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "query"),
+    )
+    op.create_index(
+        "ix_user_query_counts_user_count", "user_query_counts", ["user_id", sa.text("count DESC")], unique=False
+    )
+    op.create_table(
+        "user_image_sizes",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("size", sa.String(length=32), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "size"),
+    )
+    bind = op.get_bind()
+    for user_id in rollup_user_ids(bind):
+        rebuild_user(bind, user_id)
+
+def downgrade() -> None:
+    op.drop_table("user_image_sizes")
+    op.drop_index("ix_user_query_counts_user_count", table_name="user_query_counts")
+    op.drop_table("user_query_counts")
+    op.drop_table("user_daily_activity")
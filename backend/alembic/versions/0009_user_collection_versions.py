@@ -0,0 +1,30 @@
+"""Add per-user collection versions backing listing ETags
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 18:00:00.000000
+
+Rows are created on the first write after upgrading; a missing row reads as
+version 0, so no backfill is needed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "user_collection_versions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("collection", sa.String(length=16), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "collection"),
+    )
+
+def downgrade() -> None:
+    op.drop_table("user_collection_versions")
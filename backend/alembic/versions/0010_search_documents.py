@@ -0,0 +1,61 @@
+"""Store search result documents once and link them to search history
+
+Adds search_documents, search_history_documents and
+search_history.result_count, then moves the results of existing rows over
+in batches (see app.db.result_documents).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 20:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+def upgrade() -> None:
+    op.add_column("search_history", sa.Column("result_count", sa.Integer(), nullable=True))
+    op.create_table(
+        "search_documents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("url", sa.Text(), nullable=False),
+        sa.Column("title", sa.Text(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("extra", sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("digest"),
+    )
+    op.create_table(
+        "search_history_documents",
+        sa.Column("history_id", sa.Integer(), nullable=False),
+        sa.Column("rank", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["history_id"], ["search_history.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["document_id"], ["search_documents.id"]),
+        sa.PrimaryKeyConstraint("history_id", "rank"),
+    )
+    op.create_index(
+        op.f("ix_search_history_documents_document_id"), "search_history_documents", ["document_id"], unique=False
+    )
+
+    from app.db.result_documents import backfill
+
+    backfill(op.get_bind(), BATCH_SIZE)
+
+def downgrade() -> None:
+    from app.db.result_documents import inline
+
+    inline(op.get_bind(), BATCH_SIZE)
+
+    op.drop_index(op.f("ix_search_history_documents_document_id"), table_name="search_history_documents")
+    op.drop_table("search_history_documents")
+    op.drop_table("search_documents")
+    op.drop_column("search_history", "result_count")
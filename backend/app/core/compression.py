@@ -0,0 +1,145 @@
+"""Response compression (brotli when available, otherwise gzip).
+
+Pure ASGI middleware. It picks an encoding from ``Accept-Encoding``.
+Brotli is only offered when the optional ``brotli`` package is installed.
+Single-message responses are compressed when they reach
+``compression_min_bytes``. Streamed bodies, such as the exports, are
+compressed incrementally as they pass through.
+
+These responses are left untouched:
+- responses that already carry a ``Content-Encoding``
+- server-sent events, which must not be held back by a compressor buffer
+- formats that are already compressed (images, PDFs)
+- partial content and bodiless statuses
+"""
+import importlib.util
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.config import settings
+
+SKIP_MEDIA_TYPES = ("text/event-stream", "application/pdf", "application/zip", "application/gzip")
+SKIP_MEDIA_PREFIXES = ("image/", "audio/", "video/")
+
+
+def brotli_available() -> bool:
+    return importlib.util.find_spec("brotli") is not None
+
+
+def choose_encoding(accept_encoding: str, allow_brotli: bool) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    if allow_brotli and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            import brotli
+
+            self._compressor = brotli.Compressor(quality=settings.compression_brotli_quality)
+            self._compress = self._compressor.process
+            self._finish = self._compressor.finish
+        else:
+            # wbits 16+ selects the gzip container
+            self._compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._compressor.compress
+            self._finish = self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.compression_min_bytes if minimum_size is None else minimum_size
+        self.allow_brotli = brotli_available()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.allow_brotli)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                passthrough = (
+                    "content-encoding" in headers
+                    or media_type in SKIP_MEDIA_TYPES
+                    or media_type.startswith(SKIP_MEDIA_PREFIXES)
+                    or message["status"] < 200
+                    or message["status"] in (204, 206, 304)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                # e.g. a zero-copy file send: hand the response over as is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    # Small complete body: not worth compressing
+                    passthrough = True
+                    MutableHeaders(raw=start_message["headers"]).add_vary_header("Accept-Encoding")
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    compressed = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(start_message)
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
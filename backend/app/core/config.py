@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pydantic import validator
 from typing import Optional
@@ -11,10 +12,106 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: Optional[int] = 7
+    # Expired refresh tokens are deleted in batches by a lifespan task
+    refresh_token_purge_interval_seconds: float = 3600.0
+    refresh_token_purge_batch_size: int = 5000
+    # Authenticated principals are cached per process; the TTL bounds how long
+    # a revoked token stays valid on other workers
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_max_entries: int = 10000
+
+    # Password hashing (bcrypt runs on a bounded thread pool)
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 32
 
     # MCP Servers
     tavily_api_key: str
     replicate_api_token: str
+    # Streamable HTTP endpoints; providers without one answer with mock data
+    search_mcp_url: Optional[str] = None
+    image_mcp_url: Optional[str] = None
+    # Shared provider clients (one pool per provider)
+    provider_http2: bool = True  # needs h2, from the httpx[http2] requirement
+    provider_max_connections: int = 20
+    provider_max_keepalive_connections: int = 10
+    provider_keepalive_expiry_seconds: float = 30.0
+    provider_connect_timeout_seconds: float = 5.0
+    provider_read_timeout_seconds: float = 30.0
+    provider_total_timeout_seconds: float = 60.0
+
+    # Search result cache ("memory" per process, or "redis" shared via
+    # search_cache_url; the latter needs the redis package)
+    search_cache_backend: str = "memory"
+    search_cache_url: Optional[str] = None
+    search_cache_ttl_seconds: float = 300.0
+    search_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # Admission control for provider-backed endpoints: token buckets per user
+    # and endpoint class ("memory" per process, or "redis" shared via
+    # rate_limit_url), and per-process in-flight caps past which requests are
+    # shed with 503. A rate or cap of 0 turns that check off. A batch search
+    # costs one token per query, so the burst also caps the batch size.
+    rate_limit_backend: str = "memory"
+    rate_limit_url: Optional[str] = None
+    rate_limit_search_per_minute: float = 60.0
+    rate_limit_search_burst: int = 30
+    rate_limit_image_per_minute: float = 10.0
+    rate_limit_image_burst: int = 5
+    admission_max_in_flight_search: int = 64
+    admission_max_in_flight_image: int = 16
+    admission_shed_retry_after_seconds: float = 1.0
+
+    # Provider calls running at once for one POST /search/batch
+    search_batch_concurrency: int = 8
+
+    # Write-behind buffering of history inserts (off: commit per request)
+    history_write_behind: bool = False
+    history_write_behind_max_queue: int = 10000
+    history_write_behind_flush_rows: int = 500
+    history_write_behind_flush_ms: int = 200
+    history_write_behind_put_timeout_seconds: float = 0.5
+
+    # Background image generation jobs
+    image_job_workers: int = 4
+    image_job_max_active_per_user: int = 3
+    image_job_max_queue: int = 1000
+    # Jobs "running" for longer than this at startup lost their worker
+    image_job_stale_seconds: int = 300
+    # How long shutdown waits for running jobs before cancelling them
+    image_job_shutdown_grace_seconds: float = 10.0
+
+    # Metrics: with several worker processes, point every worker at the same
+    # (empty at deploy) directory so /metrics aggregates all of them
+    metrics_multiproc_dir: Optional[str] = None
+    metrics_flush_seconds: float = 5.0
+
+    # Response compression (brotli needs the optional brotli package)
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # History retention, enforced in batches by a lifespan task; 0 disables
+    # a limit. Rows older than the days limit, and rows beyond a user's
+    # newest max_rows, are deleted.
+    history_retention_days: int = 0
+    history_retention_max_rows: int = 0
+    history_retention_interval_seconds: float = 3600.0
+    history_retention_batch_size: int = 1000
+
+    # Serialize history listings without re-validating rows and pass stored
+    # JSON columns through as text; renders with orjson when installed
+    fast_json_responses: bool = False
+
+    # Similar past searches (GET /search/similar): hashed character n-gram
+    # vectors per user, saved under the directory and memory-mapped at startup
+    similar_search_index_dir: str = "./search_index"
+    similar_search_dimensions: int = 128
+    similar_search_ngram: int = 3
+
+    # Generated image storage
+    blob_store_backend: str = "local"
+    blob_store_path: str = "./blobs"
     # Environment
     environment: str = "development"
     debug: bool = True
@@ -30,4 +127,9 @@ class Settings(BaseSettings):
         case_sensitive = False
         extra = "ignore"  # This will ignore extra fields instead of raising errors
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Validate the environment once per process and share the result."""
+    return Settings()
+
+settings = get_settings()
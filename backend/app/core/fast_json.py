@@ -0,0 +1,79 @@
+"""Opt-in fast JSON path for history listings (``fast_json_responses``).
+
+By default a listing goes through four steps:
+- the rows load into ORM objects, decoding the JSON columns
+- ``response_model`` validates every row again, nested ``results`` included
+- FastAPI converts the result to plain Python
+- the stdlib ``json`` module encodes that
+
+With the setting on, listings instead do the following:
+- stored JSON columns come back as their raw text (see ``crud.json_text``)
+- each trusted row is built with ``model_construct`` and dumped straight to
+  bytes by the model's pydantic-core serializer, so it is never validated
+- the raw column text is spliced into that output unchanged
+
+The stored JSON was produced by our own encoder, so it is passed through
+without checking it. Any other JSON response is rendered with orjson when
+that package is installed.
+"""
+import importlib.util
+from typing import Iterable, Sequence, Type
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
+from app.core.config import settings
+
+
+def enabled() -> bool:
+    return settings.fast_json_responses
+
+
+def orjson_available() -> bool:
+    return importlib.util.find_spec("orjson") is not None
+
+
+def default_response_class() -> Type[JSONResponse]:
+    return ORJSONResponse if enabled() and orjson_available() else JSONResponse
+
+
+def _raw(value) -> bytes:
+    if value is None:
+        return b"null"
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+
+def encode_rows(model: Type[BaseModel], rows: Iterable, raw_fields: Sequence[str] = ()) -> bytes:
+    """Serialize result rows as a JSON array of ``model`` without validating them.
+
+    ``raw_fields`` name columns holding JSON text that is copied into the
+    output as is; names a row does not carry are ignored.
+    """
+    serializer = model.__pydantic_serializer__
+    fields = model.model_fields
+    parts = []
+    for row in rows:
+        values = row._mapping
+        raw = [name for name in raw_fields if name in values]
+        exclude = set(raw)
+        instance = model.model_construct(
+            **{name: values[name] for name in fields if name in values and name not in exclude}
+        )
+        body = serializer.to_json(instance, exclude=exclude, by_alias=True)
+        if raw:
+            spliced = b",".join(b'"%s":%s' % (name.encode(), _raw(values[name])) for name in raw)
+            body = body[:-1] + (b"," if len(body) > 2 else b"") + spliced + b"}"
+        parts.append(body)
+    return b"[" + b",".join(parts) + b"]"
+
+
+def listing_response(
+    model: Type[BaseModel], rows: Iterable, response: Response, raw_fields: Sequence[str] = ()
+) -> Response:
+    """JSON response for ``rows`` carrying the headers already set on the
+    endpoint's ``response`` (ETag, cursor), which FastAPI would otherwise
+    drop when a Response is returned directly."""
+    return Response(
+        content=encode_rows(model, rows, raw_fields),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
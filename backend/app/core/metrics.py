@@ -0,0 +1,441 @@
+"""Process-local metrics with Prometheus text exposition.
+
+Counters, gauges and histograms live in a per-process registry. With
+``METRICS_MULTIPROC_DIR`` set (one shared directory per deployment), each
+worker periodically writes its snapshot to ``<dir>/metrics-<pid>.json`` and a
+scrape of ``/metrics`` on any worker merges every snapshot: counters and
+histograms are summed across all files, gauges only across live processes.
+
+No third-party client library is needed.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {
+            "type": self.type_name,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "samples": samples,
+        }
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels: str) -> None:
+        """Mirror a running total kept elsewhere (collectors only)."""
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        # Deep-copy the mutable state taken under the lock
+        data["samples"] = [[key, [list(v[0]), v[1], v[2]]] for key, v in data["samples"]]
+        return data
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Run ``collector`` before every snapshot to refresh mirrored values."""
+        self._collectors.append(collector)
+
+    def clear(self) -> None:
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def snapshot(self) -> dict:
+        for collector in self._collectors:
+            collector()
+        return {
+            "pid": os.getpid(),
+            "metrics": {name: metric.snapshot() for name, metric in self._metrics.items()},
+        }
+
+    # Multi-process support
+
+    def write_snapshot(self, directory: str) -> None:
+        """Atomically replace this process's snapshot file in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        data = json.dumps(self.snapshot(), separators=(",", ":"))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-metrics-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(directory, f"metrics-{os.getpid()}.json"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """Prometheus text format for this process, or for every process
+        that wrote a snapshot to ``directory``."""
+        own = self.snapshot()
+        snapshots = [own]
+        if directory:
+            snapshots.extend(
+                s for s in _read_snapshots(directory) if s.get("pid") != own["pid"]
+            )
+        return render_snapshots(snapshots)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots(directory: str) -> Iterable[dict]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        if not (name.startswith("metrics-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_snapshots(snapshots: Sequence[dict]) -> str:
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        alive = snapshot.get("pid") == os.getpid() or _pid_alive(snapshot.get("pid", 0))
+        for name, metric in snapshot["metrics"].items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            samples = target["samples"]
+            for key, value in metric["samples"]:
+                key = tuple(key)
+                if metric["type"] == "histogram":
+                    current = samples.get(key)
+                    if current is None:
+                        samples[key] = [list(value[0]), value[1], value[2]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                else:
+                    samples[key] = samples.get(key, 0.0) + value
+
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        labels = metric["labels"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key in sorted(metric["samples"]):
+            value = metric["samples"][key]
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels_text(labels, key)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_labels_text(labels, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels_text(labels, key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_labels_text(labels, key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+db_queries_total = registry.counter(
+    "db_queries_total", "SQL statements executed by fingerprint", ("statement",)
+)
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "SQL statement latency by fingerprint", ("statement",)
+)
+db_pool_checkout_seconds = registry.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection", ("pool",)
+)
+provider_requests_total = registry.counter(
+    "provider_requests_total", "Provider calls by outcome", ("provider", "outcome")
+)
+provider_request_duration_seconds = registry.histogram(
+    "provider_request_duration_seconds", "Provider call latency", ("provider",)
+)
+history_writer_flush_seconds = registry.histogram(
+    "history_writer_flush_seconds", "Write-behind history flush latency, retries included"
+)
+
+
+@asynccontextmanager
+async def observe_provider(provider: str):
+    """Time a provider call and count it as ok or error."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        provider_request_duration_seconds.observe(time.perf_counter() - started, provider=provider)
+        provider_requests_total.inc(provider=provider, outcome=outcome)
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+_SPACE = re.compile(r"\s+")
+FINGERPRINT_MAX_LENGTH = 200
+
+
+def fingerprint(statement: str) -> str:
+    """Collapse a SQL statement into a low-cardinality label.
+
+    Literals become ``?``, parameter lists become ``(...)``, whitespace is
+    collapsed and long statements are truncated.
+    """
+    text = _LITERALS.sub("?", statement)
+    text = _PLACEHOLDER_LISTS.sub("(...)", text)
+    text = _SPACE.sub(" ", text).strip()
+    return text[:FINGERPRINT_MAX_LENGTH]
+
+
+def instrument_engine(engine, pool_label: str = "default") -> None:
+    """Record statement counts, latency and pool checkout wait for ``engine``.
+
+    Accepts a sync ``Engine`` or an ``AsyncEngine``.
+    """
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if getattr(sync_engine, "_metrics_instrumented", False):
+        return
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        label = fingerprint(statement)
+        db_queries_total.inc(statement=label)
+        db_query_duration_seconds.observe(elapsed, statement=label)
+
+    _instrument_pool(sync_engine.pool, pool_label)
+    sync_engine._metrics_instrumented = True
+
+
+def _instrument_pool(pool, pool_label: str) -> None:
+    # Pools have no "before checkout" event, so time connect() itself; wrap
+    # recreate() as well so the replacement pool from dispose() stays timed.
+    connect = pool.connect
+    recreate = pool.recreate
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - started, pool=pool_label)
+
+    def instrumented_recreate():
+        new_pool = recreate()
+        _instrument_pool(new_pool, pool_label)
+        return new_pool
+
+    pool.connect = timed_connect
+    pool.recreate = instrumented_recreate
+
+
+async def flush_periodically(directory: str, interval: float) -> None:
+    """Lifespan task: keep this process's snapshot file fresh."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            registry.write_snapshot(directory)
+        except OSError:
+            logger.exception("Could not write metrics snapshot to %s", directory)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware counting and timing requests by route template.
+
+    Labels use the matched route's path (``/image/jobs/{job_id}``), never the
+    raw URL, so cardinality stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Callable, str] = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            for route in getattr(scope.get("app"), "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = self._route_paths[endpoint] = route.path
+                    break
+            else:
+                return "<unmatched>"
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Streaming responses finish inside the app call, so this covers
+            # the whole body
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            route = self._route_label(scope)
+            http_requests_total.inc(method=method, route=route, status=str(status_code))
+            http_request_duration_seconds.observe(elapsed, method=method, route=route)
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers.
+
+    Carries the same fields as the ``User`` response schema so it can be
+    returned from ``/auth/me`` without touching the database.
+    """
+    id: int
+    email: str
+    full_name: str
+    is_active: bool
+    is_admin: bool
+    created_at: Optional[datetime]
+    token_epoch: int
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin),
+            created_at=user.created_at,
+            token_epoch=user.token_epoch or 0,
+        )
+
+
+class PrincipalCache:
+    """In-process TTL/LRU cache of principals keyed by user id.
+
+    Entries are dropped explicitly when a user's token epoch changes in this
+    process; other workers pick the change up once their entry expires, so the
+    TTL bounds how long a revoked token can survive elsewhere.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def put(self, principal: Principal) -> None:
+        self._entries[principal.id] = (principal, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.principal_cache_ttl_seconds,
+    max_entries=settings.principal_cache_max_entries,
+)
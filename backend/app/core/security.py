@@ -1,21 +1,27 @@
+import hashlib
+import secrets
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.db.database import get_db
-from app.db.crud import get_user_by_email
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.db.crud import get_user
+from app.core.principal_cache import Principal, principal_cache
+from app.db.models import utcnow
 
 # JWT token scheme
 security = HTTPBearer(auto_error=False)
 
 
+def _jwt():
+    # python-jose (and its crypto backend) loads on the first token, not at boot
+    from jose import jwt
+
+    return jwt
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -25,12 +31,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
 
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    encoded_jwt = _jwt().encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
+def create_user_access_token(user, expires_delta: Optional[timedelta] = None):
+    """Create an access token carrying the claims needed to skip the user lookup."""
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "act": bool(user.is_active),
+            "adm": bool(user.is_admin),
+            "ep": user.token_epoch or 0,
+        },
+        expires_delta=expires_delta,
+    )
+
+async def _load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    user = await get_user(db, user_id)
+    if user is None:
+        principal_cache.invalidate(user_id)
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return principal
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not credentials:
         # No Authorization header: return 401 with WWW-Authenticate
@@ -46,26 +74,39 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    from jose import JWTError
+
     try:
-        payload = jwt.decode(
+        payload = _jwt().decode(
             credentials.credentials,
             settings.secret_key,
             algorithms=[settings.algorithm]
         )
-        email: str = payload.get("sub")
-        if email is None:
+        user_id = payload.get("uid")
+        epoch = payload.get("ep")
+        if not isinstance(user_id, int) or not isinstance(epoch, int) or not payload.get("act"):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_email(db, email=email)
-    if user is None:
+    # Fast path: the cached principal answers without a database round-trip.
+    # A token from a newer epoch than the cache means the cache is stale, so
+    # reload once before deciding.
+    principal = principal_cache.get(user_id)
+    if principal is None or principal.token_epoch < epoch:
+        principal = await _load_principal(db, user_id)
+
+    if principal is None or not principal.is_active or principal.token_epoch != epoch:
         raise credentials_exception
 
-    return user
+    return principal
+
+def create_refresh_token() -> str:
+    """An opaque random refresh token; only its digest is stored."""
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
 
-def create_refresh_token(email: str) -> str:
-    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
-    to_encode = {"sub": email, "exp": expire}
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-    return encoded_jwt
\ No newline at end of file
+def refresh_token_expiry() -> datetime:
+    return utcnow() + timedelta(days=settings.refresh_token_expire_days)
\ No newline at end of file
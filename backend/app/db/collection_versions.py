@@ -0,0 +1,96 @@
+"""Per-user version stamps for history collections, and the ETags built on them.
+
+``user_collection_versions`` holds one counter per (user, collection). It
+is bumped in the same transaction as every insert into or delete from that
+history table (see ``crud.apply_history_change``). Listing endpoints look up
+the counter, a single primary-key read, before loading any rows. They
+answer ``If-None-Match`` with 304 when nothing changed since the client's
+copy.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+from app.db.models import UserCollectionVersion
+from app.db.rollups import dialect_insert
+
+SEARCHES = "searches"
+IMAGES = "images"
+# Listings are private to the user and may change at any time, so clients
+# must revalidate; the ETag makes that a cheap 304
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+
+async def bump(db: AsyncSession, user_ids: Iterable[int], collection: str) -> None:
+    """Advance the collection version for each user; does not commit."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    table = UserCollectionVersion.__table__
+    stmt = dialect_insert(db.bind.dialect.name)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "collection"],
+        set_={"version": table.c.version + 1},
+    )
+    await db.execute(
+        stmt, [{"user_id": user_id, "collection": collection, "version": 1} for user_id in user_ids]
+    )
+
+
+async def get_versions(db: AsyncSession, user_id: int, collections: Sequence[str]) -> Dict[str, int]:
+    result = await db.execute(
+        select(UserCollectionVersion.collection, UserCollectionVersion.version).where(
+            UserCollectionVersion.user_id == user_id,
+            UserCollectionVersion.collection.in_(collections),
+        )
+    )
+    versions = dict(result.all())
+    return {collection: versions.get(collection, 0) for collection in collections}
+
+
+def listing_etag(user_id: int, versions: Dict[str, int], variant: str = "") -> str:
+    """Weak ETag for one representation of a user's listing.
+
+    ``variant`` carries whatever else selects the representation, such as
+    the query string. Weak because gzip and brotli encodings share it.
+    """
+    stamp = ".".join(f"{name}{version}" for name, version in sorted(versions.items()))
+    digest = hashlib.sha256(f"{user_id}|{variant}".encode()).hexdigest()[:16]
+    return f'W/"{stamp}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an ``If-None-Match`` header value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+async def conditional_listing(
+    db: AsyncSession, request: Request, user_id: int, collections: Sequence[str], variant: str = ""
+) -> Tuple[str, Optional[Response]]:
+    """Return the listing's ETag, plus a ready 304 response when the client's
+    ``If-None-Match`` still matches (the caller then skips the query)."""
+    versions = await get_versions(db, user_id, collections)
+    etag = listing_etag(user_id, versions, f"{request.url.path}?{request.url.query}{variant}")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return etag, Response(
+            status_code=304, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL}
+        )
+    return etag, None
+
+
+def set_listing_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
@@ -1,121 +1,578 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+import base64
+import uuid
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import JSON, Text, and_, delete, desc, func, insert, literal, or_, select, type_coerce, update
+from sqlalchemy.orm import defer
 from typing import Optional, List
-from app.db.models import User, SearchHistory, ImageHistory, RefreshToken
+from app.db.models import User, SearchHistory, ImageHistory, ImageJob, RefreshToken, utcnow
 from app.schemas.user import UserCreate
-from app.core.password import get_password_hash 
+from app.core.principal_cache import principal_cache
+from app.db.text_search import apply_text_filter, ranks_matches
+from app.db.pagination import apply_cursor
+from app.db import collection_versions, result_documents, rollups
+from app.services.blob_store import get_blob_store
+from app.services.similar_searches import similar_searches
 
 # User CRUD operations
-def get_user(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(User, user_id)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: str):
     db_user = User(
         email=user.email,
         full_name=user.full_name,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
+async def update_user_password_hash(db: AsyncSession, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    await db.commit()
+    return user
+
+async def bump_token_epoch(db: AsyncSession, user_id: int):
+    """Revoke all access tokens issued to a user so far."""
+    await db.execute(
+        update(User).where(User.id == user_id).values(token_epoch=User.token_epoch + 1)
+    )
+    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+    await db.commit()
+    principal_cache.invalidate(user_id)
+
+async def deactivate_user(db: AsyncSession, user_id: int):
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(is_active=False, token_epoch=User.token_epoch + 1)
+    )
+    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+    await db.commit()
+    principal_cache.invalidate(user_id)
+
+# History bookkeeping
+async def apply_history_change(db: AsyncSession, model, rows: List[dict], sign: int = 1):
+    """Update the rollups and collection versions for history rows being
+    inserted (``sign=1``) or deleted (``sign=-1``); does not commit.
+
+    Search rows should carry their ``id`` for the similar-search index.
+    """
+    if model is SearchHistory:
+        await rollups.count_searches(db, rows, sign)
+        similar_searches.stage(db, rows, sign)
+        collection = collection_versions.SEARCHES
+    else:
+        await rollups.count_images(db, rows, sign)
+        collection = collection_versions.IMAGES
+    await collection_versions.bump(db, (row["user_id"] for row in rows), collection)
+
+def history_columns(model) -> tuple:
+    """Columns ``apply_history_change`` needs, for INSERT/DELETE ... RETURNING."""
+    counted = model.query if model is SearchHistory else model.meta_data
+    return (model.id, model.user_id, counted, model.created_at)
+
+async def insert_history_rows(db: AsyncSession, model, rows: List[dict]) -> List[dict]:
+    """Insert history rows in one statement along with their rollup, version
+    and result document updates; does not commit.
+
+    Returns the ``history_columns`` of the inserted rows.
+    """
+    entries = None
+    if model is SearchHistory:
+        rows, entries = result_documents.prepare(rows)
+    stmt = insert(model)
+    if not any(entries or ()):
+        result = await db.execute(stmt.returning(*history_columns(model)), rows)
+        inserted = [dict(row._mapping) for row in result]
+    elif _dialect_name(db) == "sqlite":
+        # Rowids are handed out in VALUES order, RETURNING just does not
+        # promise to list them in it; asking SQLAlchemy for that order costs
+        # one INSERT per row on SQLite
+        result = await db.execute(stmt.returning(*history_columns(model)), rows)
+        inserted = sorted((dict(row._mapping) for row in result), key=lambda row: row["id"])
+    else:
+        result = await db.execute(
+            stmt.returning(*history_columns(model), sort_by_parameter_order=True), rows
+        )
+        inserted = [dict(row._mapping) for row in result]
+    if entries is not None:
+        await result_documents.link(db, zip((row["id"] for row in inserted), entries))
+    await apply_history_change(db, model, inserted)
+    return inserted
+
 # Search History CRUD operations
-def create_search_history(
-    db: Session, 
-    user_id: int, 
-    query: str, 
-    results: dict, 
+async def create_search_history(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    results: dict,
     meta_data: dict = None
 ):
-    db_search = SearchHistory(
-        user_id=user_id,
-        query=query,
-        results=results,
-        meta_data=meta_data or {}
-    )
-    db.add(db_search)
-    db.commit()
-    db.refresh(db_search)
-    return db_search
-
-def get_user_search_history(
-    db: Session, 
-    user_id: int, 
-    skip: int = 0, 
-    limit: int = 10
+    inserted = await insert_history_rows(db, SearchHistory, [{
+        "user_id": user_id,
+        "query": query,
+        "results": results,
+        "meta_data": meta_data or {},
+        "created_at": utcnow(),
+    }])
+    await db.commit()
+    return await get_search_history_item(db, inserted[0]["id"], user_id)
+
+async def create_search_history_bulk(db: AsyncSession, user_id: int, entries: List[dict]) -> int:
+    """Record several searches in one INSERT and one commit.
+
+    ``entries`` hold ``query``, ``results`` and optionally ``meta_data``.
+    """
+    if not entries:
+        return 0
+    rows = [
+        {
+            "user_id": user_id,
+            "query": entry["query"],
+            "results": entry["results"],
+            "meta_data": entry.get("meta_data") or {},
+            "created_at": utcnow(),
+        }
+        for entry in entries
+    ]
+    await insert_history_rows(db, SearchHistory, rows)
+    await db.commit()
+    return len(entries)
+
+def _dialect_name(db: AsyncSession) -> str:
+    return db.bind.dialect.name
+
+def json_text(column):
+    """Select a JSON column as its stored text, skipping the decode."""
+    return type_coerce(column, Text).label(column.key)
+
+def json_columns(model) -> tuple:
+    """Names of the model's JSON columns."""
+    return tuple(column.key for column in model.__table__.columns if isinstance(column.type, JSON))
+
+def _listing_columns(model, exclude: tuple = ()) -> list:
+    """Every column of ``model`` but ``exclude``, JSON ones as raw text."""
+    return [
+        json_text(column) if isinstance(column.type, JSON) else column
+        for column in model.__table__.columns
+        if column.key not in exclude
+    ]
+
+def results_count_expr(dialect_name: str):
+    """SQL expression counting the provider results of a SearchHistory row,
+    stored as documents or inline."""
+    if dialect_name == "postgresql":
+        count = func.json_array_length(SearchHistory.results["results"])
+    else:
+        count = func.json_array_length(SearchHistory.results, "$.results")
+    return func.coalesce(SearchHistory.result_count, count, 0)
+
+async def _history_page(
+    db: AsyncSession,
+    stmt,
+    model,
+    text_column: str,
+    user_id: int,
+    skip: int,
+    limit: int,
+    search: Optional[str],
+    cursor: Optional[str]
 ):
-    return db.query(SearchHistory).filter(
-        SearchHistory.user_id == user_id
-    ).order_by(desc(SearchHistory.created_at)).offset(skip).limit(limit).all()
-
-def delete_search_history(db: Session, search_id: int, user_id: int):
-    search = db.query(SearchHistory).filter(
-        SearchHistory.id == search_id,
-        SearchHistory.user_id == user_id
-    ).first()
+    """Run one page of a per-user history listing.
+
+    Newest first, or by relevance to ``search``. With ``cursor`` the page
+    starts after that row (keyset pagination) and is always in time order;
+    ``skip`` still applies on top for compatibility.
+    """
+    stmt = stmt.where(model.user_id == user_id)
+    order_by = [desc(model.created_at), desc(model.id)]
+    if cursor:
+        stmt = apply_cursor(stmt, model, cursor)
     if search:
-        db.delete(search)
-        db.commit()
-        return True
-    return False
+        stmt, relevance = apply_text_filter(stmt, model, text_column, search, _dialect_name(db))
+        if relevance is not None and not cursor:
+            order_by.insert(0, relevance)
+    return await db.execute(stmt.order_by(*order_by).offset(skip).limit(limit))
+
+def history_page_in_time_order(db: AsyncSession, search: Optional[str], cursor: Optional[str]) -> bool:
+    """Whether a history listing page comes back in time order, so the next
+    page can be fetched with a cursor."""
+    return bool(cursor) or not search or not ranks_matches(search, _dialect_name(db))
+
+async def get_user_search_history(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 10,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    raw_json: bool = False
+):
+    """List a user's searches.
+
+    The ``summary`` view returns rows without the ``results`` payload and with
+    ``results_count`` computed in SQL; ``full`` returns ORM objects. With
+    ``raw_json`` both return rows whose JSON columns hold the stored text
+    (for ``app.core.fast_json``). Full results are rebuilt from the result
+    documents either way.
+    """
+    if view == "summary":
+        stmt = select(
+            SearchHistory.id,
+            SearchHistory.query,
+            json_text(SearchHistory.meta_data) if raw_json else SearchHistory.meta_data,
+            SearchHistory.created_at,
+            results_count_expr(_dialect_name(db)).label("results_count"),
+        )
+        result = await _history_page(db, stmt, SearchHistory, "query", user_id, skip, limit, search, cursor)
+        return result.all()
+    if raw_json:
+        stmt = select(*_listing_columns(SearchHistory, exclude=("user_id",)))
+        result = await _history_page(db, stmt, SearchHistory, "query", user_id, skip, limit, search, cursor)
+        return await result_documents.expand_raw(db, result.all())
+    result = await _history_page(
+        db, select(SearchHistory), SearchHistory, "query", user_id, skip, limit, search, cursor
+    )
+    searches = result.scalars().all()
+    await result_documents.expand(db, searches)
+    return searches
+
+async def get_search_history_item(db: AsyncSession, search_id: int, user_id: int):
+    result = await db.execute(
+        select(SearchHistory).where(
+            SearchHistory.id == search_id,
+            SearchHistory.user_id == user_id
+        )
+    )
+    search = result.scalars().first()
+    if search is not None:
+        await result_documents.expand(db, [search])
+    return search
+
+async def get_search_history_items(db: AsyncSession, user_id: int, search_ids: List[int]) -> dict:
+    """The user's searches among ``search_ids``, keyed by id."""
+    if not search_ids:
+        return {}
+    # Ownership is checked on the loaded rows: with user_id in the WHERE
+    # clause SQLite may walk the user's whole history index instead of
+    # looking the ids up by primary key
+    result = await db.execute(select(SearchHistory).where(SearchHistory.id.in_(search_ids)))
+    searches = {search.id: search for search in result.scalars() if search.user_id == user_id}
+    await result_documents.expand(db, list(searches.values()))
+    return searches
+
+async def delete_history_rows(
+    db: AsyncSession, model, *conditions, limit: Optional[int] = None, order_by: Optional[tuple] = None
+) -> int:
+    """Delete the history rows matching ``conditions`` in one statement and commit.
+
+    Rollups and collection versions are adjusted from the deleted rows
+    (``DELETE ... RETURNING``) in the same transaction. With ``limit`` at most
+    that many rows, oldest ids first (or first by ``order_by``), are deleted.
+    Returns the row count.
+    """
+    if limit is not None:
+        ids = select(model.id).where(*conditions).order_by(*(order_by or (model.id,))).limit(limit)
+        conditions = (model.id.in_(ids.scalar_subquery()),)
+    result = await db.execute(delete(model).where(*conditions).returning(*history_columns(model)))
+    rows = [dict(row._mapping) for row in result]
+    if rows:
+        if model is SearchHistory:
+            await result_documents.unlink(db, [row["id"] for row in rows])
+        await apply_history_change(db, model, rows, sign=-1)
+    await db.commit()
+    return len(rows)
+
+def history_range_conditions(
+    model,
+    user_id: int,
+    ids: Optional[List[int]] = None,
+    before: Optional[datetime] = None,
+    after: Optional[datetime] = None
+) -> list:
+    """WHERE clauses selecting a user's history rows by id and/or created_at range."""
+    conditions = [model.user_id == user_id]
+    if ids is not None:
+        conditions.append(model.id.in_(ids))
+    if before is not None:
+        conditions.append(model.created_at < before)
+    if after is not None:
+        conditions.append(model.created_at >= after)
+    return conditions
+
+async def delete_search_history(db: AsyncSession, search_id: int, user_id: int):
+    deleted = await delete_history_rows(
+        db, SearchHistory, SearchHistory.id == search_id, SearchHistory.user_id == user_id
+    )
+    return deleted > 0
 
 # Image History CRUD operations
-def create_image_history(
-    db: Session,
+async def image_history_values(
+    user_id: int,
+    prompt: str,
+    image_url: str = None,
+    image_data: str = None,
+    meta_data: dict = None
+) -> dict:
+    """Column values for an image history row, storing the image blob first."""
+    blob = None
+    if image_data:
+        blob = await run_in_threadpool(get_blob_store().put, base64.b64decode(image_data))
+    return {
+        "user_id": user_id,
+        "prompt": prompt,
+        "image_url": image_url,
+        "image_digest": blob.digest if blob else None,
+        "image_size": blob.size if blob else None,
+        "image_mime": blob.mime_type if blob else None,
+        "meta_data": meta_data or {},
+    }
+
+async def create_image_history(
+    db: AsyncSession,
     user_id: int,
     prompt: str,
     image_url: str = None,
     image_data: str = None,
     meta_data: dict = None
 ):
+    """Record a generated image.
+
+    ``image_data`` (base64) is written to the blob store; the row keeps only
+    its digest, size and MIME type.
+    """
     db_image = ImageHistory(
-        user_id=user_id,
-        prompt=prompt,
-        image_url=image_url,
-        image_data=image_data,
-        meta_data=meta_data or {}
+        **await image_history_values(user_id, prompt, image_url, image_data, meta_data),
+        created_at=utcnow()
     )
     db.add(db_image)
-    db.commit()
-    db.refresh(db_image)
+    await apply_history_change(db, ImageHistory, [rollups.history_row(db_image)])
+    await db.commit()
+    await db.refresh(db_image)
     return db_image
 
-def get_user_image_history(
-    db: Session,
+async def get_user_image_history(
+    db: AsyncSession,
     user_id: int,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    raw_json: bool = False
 ):
-    return db.query(ImageHistory).filter(
-        ImageHistory.user_id == user_id
-    ).order_by(desc(ImageHistory.created_at)).offset(skip).limit(limit).all()
-
-def delete_image_history(db: Session, image_id: int, user_id: int):
-    image = db.query(ImageHistory).filter(
-        ImageHistory.id == image_id,
-        ImageHistory.user_id == user_id
-    ).first()
-    if image:
-        db.delete(image)
-        db.commit()
-        return True
-    return False
-
-def save_refresh_token(db: Session, user_id: int, token: str):
-    db_token = RefreshToken(user_id=user_id, token=token)
-    db.add(db_token)
-    db.commit()
-    db.refresh(db_token)
-    return db_token
-
-def delete_refresh_token(db: Session, token: str):
-    db.query(RefreshToken).filter(RefreshToken.token == token).delete()
-    db.commit()
-
-def get_image_history(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(ImageHistory).filter(ImageHistory.user_id == user_id).offset(skip).limit(limit).all()
+    """List a user's images.
+
+    The ``summary`` view never loads the legacy base64 ``image_data`` column.
+    ``raw_json`` returns rows with ``meta_data`` as its stored text instead
+    of ORM objects.
+    """
+    if raw_json:
+        exclude = ("user_id", "image_data") if view == "summary" else ("user_id",)
+        stmt = select(*_listing_columns(ImageHistory, exclude=exclude))
+        result = await _history_page(db, stmt, ImageHistory, "prompt", user_id, skip, limit, search, cursor)
+        return result.all()
+    stmt = select(ImageHistory)
+    if view == "summary":
+        stmt = stmt.options(defer(ImageHistory.image_data, raiseload=True))
+    result = await _history_page(db, stmt, ImageHistory, "prompt", user_id, skip, limit, search, cursor)
+    return result.scalars().all()
+
+async def get_image_history_item(db: AsyncSession, image_id: int, user_id: int):
+    result = await db.execute(
+        select(ImageHistory).where(
+            ImageHistory.id == image_id,
+            ImageHistory.user_id == user_id
+        )
+    )
+    return result.scalars().first()
+
+async def delete_image_history(db: AsyncSession, image_id: int, user_id: int):
+    deleted = await delete_history_rows(
+        db, ImageHistory, ImageHistory.id == image_id, ImageHistory.user_id == user_id
+    )
+    return deleted > 0
+
+# History retention
+async def purge_history_batch(db: AsyncSession, model, batch_size: int, older_than: datetime) -> int:
+    """Delete up to ``batch_size`` rows created before ``older_than``,
+    oldest ids first. Returns the number deleted."""
+    return await delete_history_rows(db, model, model.created_at < older_than, limit=batch_size)
+
+async def history_row_limit_cutoffs(db: AsyncSession, model, keep_rows: int) -> dict:
+    """``(created_at, id)`` of the newest out-of-policy row of every user
+    with more than ``keep_rows`` rows, by user id.
+
+    One pass over the user/created_at index finds the users; each cutoff is
+    then an index lookup ``keep_rows`` entries into that user's rows.
+    """
+    user_ids = (await db.execute(
+        select(model.user_id).group_by(model.user_id).having(func.count() > keep_rows).order_by(model.user_id)
+    )).scalars().all()
+    cutoffs = {}
+    for user_id in user_ids:
+        cutoff = (await db.execute(
+            select(model.created_at, model.id)
+            .where(model.user_id == user_id)
+            .order_by(desc(model.created_at), desc(model.id))
+            .offset(keep_rows)
+            .limit(1)
+        )).first()
+        if cutoff is not None:
+            cutoffs[user_id] = tuple(cutoff)
+    return cutoffs
+
+async def purge_user_history_batch(
+    db: AsyncSession, model, batch_size: int, user_id: int, cutoff: tuple
+) -> int:
+    """Delete up to ``batch_size`` of the user's rows at or before ``cutoff``
+    (see ``history_row_limit_cutoffs``), oldest first, walking the
+    user/created_at index. Returns the number deleted."""
+    created_at, row_id = cutoff
+    return await delete_history_rows(
+        db,
+        model,
+        model.user_id == user_id,
+        or_(model.created_at < created_at, and_(model.created_at == created_at, model.id <= row_id)),
+        limit=batch_size,
+        order_by=(model.created_at, model.id),
+    )
+
+# Image job operations
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+async def create_image_job(
+    db: AsyncSession, user_id: int, prompt: str, params: dict, max_active: Optional[int] = None
+) -> Optional[ImageJob]:
+    """Record a queued job and commit.
+
+    With ``max_active`` the job is only created while the user has fewer
+    queued or running jobs; returns None otherwise. The check and the insert
+    are one ``INSERT ... SELECT ... WHERE`` statement, and on PostgreSQL the
+    user's row is locked first so concurrent submits queue behind it.
+    """
+    values = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "status": "queued",
+        "progress": 0,
+        "prompt": prompt,
+        "params": params,
+        "attempts": 0,
+        "created_at": utcnow(),
+    }
+    if max_active is None:
+        job = ImageJob(**values)
+        db.add(job)
+        await db.commit()
+        return job
+
+    await db.execute(select(User.id).where(User.id == user_id).with_for_update())
+    table = ImageJob.__table__
+    active = select(func.count(ImageJob.id)).where(
+        ImageJob.user_id == user_id, ImageJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).scalar_subquery()
+    row = select(*(literal(value, table.c[name].type) for name, value in values.items())).where(
+        active < max_active
+    )
+    result = await db.execute(insert(table).from_select(list(values), row))
+    if result.rowcount == 0:
+        await db.rollback()
+        return None
+    await db.commit()
+    return await db.get(ImageJob, values["id"])
+
+async def get_image_job(db: AsyncSession, job_id: str, user_id: Optional[int] = None):
+    stmt = select(ImageJob).where(ImageJob.id == job_id)
+    if user_id is not None:
+        stmt = stmt.where(ImageJob.user_id == user_id)
+    result = await db.execute(stmt.execution_options(populate_existing=True))
+    return result.scalars().first()
+
+async def claim_image_job(db: AsyncSession, job_id: str) -> bool:
+    """Move a queued job to running; False if another worker got it first."""
+    result = await db.execute(
+        update(ImageJob)
+        .where(ImageJob.id == job_id, ImageJob.status == "queued")
+        .values(status="running", started_at=utcnow(), attempts=ImageJob.attempts + 1)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def update_image_job(db: AsyncSession, job_id: str, **values):
+    await db.execute(update(ImageJob).where(ImageJob.id == job_id).values(**values))
+    await db.commit()
+
+async def requeue_unfinished_image_jobs(db: AsyncSession, stale_before: datetime) -> List[str]:
+    """Return queued job ids in submission order, first resetting jobs that
+    have been running since before ``stale_before`` (their worker is gone)."""
+    await db.execute(
+        update(ImageJob)
+        .where(ImageJob.status == "running", ImageJob.started_at < stale_before)
+        .values(status="queued", progress=0)
+    )
+    await db.commit()
+    result = await db.execute(
+        select(ImageJob.id).where(ImageJob.status == "queued").order_by(ImageJob.created_at)
+    )
+    return list(result.scalars().all())
+
+async def save_refresh_token(db: AsyncSession, user_id: int, token_hash: bytes, expires_at: datetime):
+    await db.execute(
+        insert(RefreshToken),
+        [{"user_id": user_id, "token_hash": token_hash, "expires_at": expires_at, "created_at": utcnow()}],
+    )
+    await db.commit()
+
+async def rotate_refresh_token(
+    db: AsyncSession, token_hash: bytes, new_token_hash: bytes, expires_at: datetime
+) -> Optional[User]:
+    """Consume a refresh token and store its replacement in one transaction.
+
+    The DELETE ... RETURNING claims the token, so two concurrent refreshes
+    with the same token cannot both succeed. Returns None, changing nothing,
+    for unknown or expired tokens and inactive users.
+    """
+    result = await db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.token_hash == token_hash, RefreshToken.expires_at > utcnow())
+        .returning(RefreshToken.user_id)
+    )
+    user_id = result.scalar()
+    user = await db.get(User, user_id) if user_id is not None else None
+    if user is None or not user.is_active:
+        await db.rollback()
+        return None
+    await db.execute(
+        insert(RefreshToken),
+        [{"user_id": user.id, "token_hash": new_token_hash, "expires_at": expires_at, "created_at": utcnow()}],
+    )
+    await db.commit()
+    return user
+
+async def purge_expired_refresh_tokens(db: AsyncSession, batch_size: int, now: Optional[datetime] = None) -> int:
+    """Delete up to ``batch_size`` expired refresh tokens; returns the count."""
+    expired = (
+        select(RefreshToken.id)
+        .where(RefreshToken.expires_at <= (now or utcnow()))
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired)))
+    await db.commit()
+    return result.rowcount
+
+async def get_image_history(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(ImageHistory).where(ImageHistory.user_id == user_id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
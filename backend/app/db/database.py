@@ -1,11 +1,33 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+
+# Async drivers for each supported backend; the sync URL in settings stays the
+# source of truth so alembic and scripts keep working unchanged.
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def to_async_url(database_url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return url.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
 
 connect_args = {}
 if settings.database_url.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
+# Sync engine: used by alembic, maintenance scripts and benchmarks.
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
@@ -15,12 +37,25 @@ engine = create_engine(
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: used by every request handler so queries never block the event loop.
+async_engine = create_async_engine(
+    to_async_url(settings.database_url),
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=settings.debug,
+)
+instrument_engine(async_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """Database dependency."""
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Text, Boolean, ForeignKey, JSON, Index, LargeBinary, desc
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
-from datetime import datetime
+from app.db import text_search
+from datetime import datetime, timezone
+
+def utcnow():
+    return datetime.now(timezone.utc)
 
 class User(Base):
     __tablename__ = "users"
@@ -13,6 +17,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
+    # Bumped to revoke every access token issued so far
+    token_epoch = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -25,13 +31,45 @@ class SearchHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     query = Column(String, nullable=False)
+    # Provider response. Once result_count is set, its "results" list is null
+    # here and the entries live in search_documents (see app.db.result_documents).
     results = Column(JSON)
+    result_count = Column(Integer)
     meta_data = Column(JSON)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Stamped in Python so SQLite stores full precision too; keyset cursors
+    # compare these values exactly.
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="searches")
 
+    __table_args__ = (
+        # Serves per-user listings and keyset pagination in (created_at, id) order
+        Index("ix_search_history_user_created", "user_id", desc("created_at"), desc("id")),
+    )
+
+class SearchDocument(Base):
+    """One provider search result, stored once however many searches returned it."""
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True)
+    # SHA-256 of the url, content, title and extra fields
+    digest = Column(String(64), unique=True, nullable=False)
+    url = Column(Text, nullable=False)
+    title = Column(Text, nullable=False)
+    content = Column(Text, nullable=False)
+    # Any other fields of the result, e.g. raw_content
+    extra = Column(JSON)
+
+class SearchHistoryDocument(Base):
+    """The result at ``rank`` of a search history row."""
+    __tablename__ = "search_history_documents"
+
+    history_id = Column(Integer, ForeignKey("search_history.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("search_documents.id"), nullable=False, index=True)
+    score = Column(Float)
+
 class ImageHistory(Base):
     __tablename__ = "image_history"
 
@@ -39,16 +77,100 @@ class ImageHistory(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     prompt = Column(Text, nullable=False)
     image_url = Column(String)
-    image_data = Column(Text)  # Base64 encoded image
+    image_data = Column(Text)  # Legacy base64 images; new rows use the blob store
+    # SHA-256 of the image bytes in the blob store
+    image_digest = Column(String(64), index=True)
+    image_size = Column(Integer)
+    image_mime = Column(String)
     meta_data = Column(JSON)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Stamped in Python so SQLite stores full precision too; keyset cursors
+    # compare these values exactly.
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="images")
 
+    __table_args__ = (
+        # Serves per-user listings and keyset pagination in (created_at, id) order
+        Index("ix_image_history_user_created", "user_id", desc("created_at"), desc("id")),
+    )
+
+# Per-user rollups behind /dashboard/stats. They are kept current by
+# app.db.rollups in the same transaction as every history insert and delete.
+# Rebuild them with ``python -m app.db.rollups``.
+
+class UserDailyActivity(Base):
+    __tablename__ = "user_daily_activity"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC
+    searches = Column(Integer, nullable=False, default=0)
+    images = Column(Integer, nullable=False, default=0)
+
+class UserQueryCount(Base):
+    __tablename__ = "user_query_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Normalized query text (see app.db.rollups.query_key)
+    query = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_user_query_counts_user_count", "user_id", desc("count")),
+    )
+
+class UserImageSizeCount(Base):
+    __tablename__ = "user_image_sizes"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # "<width>x<height>", or "unknown" when the request didn't record one
+    size = Column(String(32), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserCollectionVersion(Base):
+    """Bumped whenever a user's search or image history gains or loses rows;
+    listing ETags are derived from it (see app.db.collection_versions)."""
+    __tablename__ = "user_collection_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    collection = Column(String(16), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 class RefreshToken(Base):
+    """An outstanding refresh token, stored as the SHA-256 digest of the token."""
     __tablename__ = "refresh_tokens"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    token = Column(String, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(LargeBinary(32), unique=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
+class ImageJob(Base):
+    """A queued image generation; the history row is written on success."""
+    __tablename__ = "image_jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # queued -> running -> succeeded | failed
+    status = Column(String(16), nullable=False, default="queued")
+    progress = Column(Integer, nullable=False, default=0)
+    prompt = Column(Text, nullable=False)
+    params = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    image_history_id = Column(Integer, ForeignKey("image_history.id", ondelete="SET NULL"))
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Per-user active job counts
+        Index("ix_image_jobs_user_status", "user_id", "status"),
+        # Requeueing unfinished jobs at startup
+        Index("ix_image_jobs_status_created", "status", "created_at"),
+    )
+
+# Indexed substring search for the dashboard filters
+text_search.install(SearchHistory.__table__, "query")
+text_search.install(ImageHistory.__table__, "prompt")
@@ -0,0 +1,47 @@
+"""Opaque keyset cursors for history listings.
+
+A cursor encodes the ``(created_at, id)`` of the last row of a page. The next
+page is everything strictly after it in ``created_at DESC, id DESC`` order,
+which the ``(user_id, created_at DESC, id DESC)`` indexes serve directly no
+matter how deep the page is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+
+# Response header carrying the cursor for the following page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid pagination cursor") from exc
+
+
+def apply_cursor(stmt, model, cursor: str):
+    """Restrict ``stmt`` to rows after ``cursor`` in (created_at, id) DESC order."""
+    created_at, row_id = decode_cursor(cursor)
+    return stmt.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+
+
+def next_cursor(rows: Sequence, limit: int) -> Optional[str]:
+    """Cursor for the page after ``rows``, or None when this was the last page."""
+    if limit <= 0 or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
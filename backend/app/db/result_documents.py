@@ -0,0 +1,332 @@
+"""Shared storage of search result documents.
+
+Each result in a provider response (``title``, ``url``, ``content``, any
+other fields, and a ``score``) used to be copied into every history row
+that returned it. The same pages come back for many users and for repeated
+queries, so each is now stored once in ``search_documents``, keyed by the
+SHA-256 digest of its fields. ``search_history_documents`` links a history
+row to its documents by ``rank``, with the per-search ``score``. The history
+row keeps the rest of the response with ``"results": null`` and sets
+``result_count``.
+
+Responses whose results are not objects with string ``title``/``url``/
+``content`` stay inline, as do rows written before the migration until
+``backfill`` moves them. Inline rows have ``result_count`` NULL. ``expand``
+and ``expand_raw`` put the list back when history is read, so both kinds
+of row come out in the same shape. Each result is rebuilt as ``title``,
+``url``, ``content``, ``score`` and then any other fields.
+
+History deletes drop the links. Documents no longer linked to any row are
+deleted by ``purge_orphans``, which the history retention task runs; with
+retention off, run it from here::
+
+    python -m app.db.result_documents               # move inline rows over
+    python -m app.db.result_documents --purge-orphans
+"""
+import argparse
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, delete, exists, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from app.db.models import SearchDocument, SearchHistory, SearchHistoryDocument
+from app.db.rollups import dialect_insert
+
+RESULT_FIELDS = ("title", "url", "content")
+# Documents per upsert statement, history ids per IN list
+UPSERT_BATCH_SIZE = 500
+ID_BATCH_SIZE = 500
+BACKFILL_BATCH_SIZE = 1000
+
+# (document columns, score) of each result, in rank order
+Entries = List[Tuple[dict, Optional[float]]]
+
+
+def document_digest(url: str, title: str, content: str, extra: Optional[dict]) -> str:
+    payload = json.dumps([url, title, content, extra], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def split_results(results: Any) -> Tuple[Any, Optional[Entries]]:
+    """Split a provider response into what the history row keeps and its
+    result entries. The entries are None, and the response is kept whole,
+    when it does not have the expected shape."""
+    if not isinstance(results, dict) or not isinstance(results.get("results"), list):
+        return results, None
+    entries = []
+    for item in results["results"]:
+        if not isinstance(item, dict) or not all(isinstance(item.get(name), str) for name in RESULT_FIELDS):
+            return results, None
+        score = item.get("score")
+        if isinstance(score, bool) or not (score is None or isinstance(score, (int, float))):
+            return results, None
+        extra = {key: value for key, value in item.items() if key not in RESULT_FIELDS and key != "score"}
+        document = {"url": item["url"], "title": item["title"], "content": item["content"], "extra": extra or None}
+        document["digest"] = document_digest(**document)
+        entries.append((document, score))
+    envelope = dict(results)
+    envelope["results"] = None
+    return envelope, entries
+
+
+def prepare(rows: Sequence[dict]) -> Tuple[List[dict], List[Optional[Entries]]]:
+    """Copies of search history rows to insert, with their documents split
+    off; pass the entries to ``link`` once the rows have ids."""
+    prepared, entries = [], []
+    for row in rows:
+        envelope, row_entries = split_results(row.get("results"))
+        prepared.append(dict(row, results=envelope, result_count=None if row_entries is None else len(row_entries)))
+        entries.append(row_entries)
+    return prepared, entries
+
+
+def _collect(history: Iterable[Tuple[int, Optional[Entries]]]) -> Tuple[Dict[str, dict], list]:
+    documents, links = {}, []
+    for history_id, entries in history:
+        for rank, (document, score) in enumerate(entries or ()):
+            documents[document["digest"]] = document
+            links.append((history_id, rank, document["digest"], score))
+    return documents, links
+
+
+def _upserts(dialect_name: str, documents: Dict[str, dict]) -> Iterator:
+    """Statements storing ``documents`` and returning (digest, id) for all of them.
+
+    Existing rows are updated to themselves so they stay locked until
+    commit and ``purge_orphans`` skips them. Digests go in sorted order so
+    concurrent transactions lock rows in the same order.
+    """
+    table = SearchDocument.__table__
+    digests = sorted(documents)
+    for start in range(0, len(digests), UPSERT_BATCH_SIZE):
+        stmt = dialect_insert(dialect_name)(table).values(
+            [documents[digest] for digest in digests[start:start + UPSERT_BATCH_SIZE]]
+        )
+        stmt = stmt.on_conflict_do_update(index_elements=["digest"], set_={"digest": stmt.excluded.digest})
+        yield stmt.returning(table.c.digest, table.c.id)
+
+
+def _link_rows(links: list, ids: Dict[str, int]) -> List[dict]:
+    return [
+        {"history_id": history_id, "rank": rank, "document_id": ids[digest], "score": score}
+        for history_id, rank, digest, score in links
+    ]
+
+
+async def link(db: AsyncSession, history: Iterable[Tuple[int, Optional[Entries]]]) -> None:
+    """Store the documents of newly inserted history rows, given as
+    ``(history id, entries)``, and link them; does not commit."""
+    documents, links = _collect(history)
+    if not links:
+        return
+    ids = {}
+    for stmt in _upserts(db.bind.dialect.name, documents):
+        ids.update((await db.execute(stmt)).all())
+    await db.execute(insert(SearchHistoryDocument), _link_rows(links, ids))
+
+
+async def unlink(db: AsyncSession, history_ids: Sequence[int]) -> None:
+    """Drop the links of deleted history rows; does not commit.
+
+    PostgreSQL cascades the delete already, SQLite does not enforce the
+    foreign key.
+    """
+    for start in range(0, len(history_ids), ID_BATCH_SIZE):
+        chunk = history_ids[start:start + ID_BATCH_SIZE]
+        await db.execute(delete(SearchHistoryDocument).where(SearchHistoryDocument.history_id.in_(chunk)))
+
+
+def _documents_query(history_ids: Sequence[int]):
+    return (
+        select(
+            SearchHistoryDocument.history_id,
+            SearchDocument.title,
+            SearchDocument.url,
+            SearchDocument.content,
+            SearchHistoryDocument.score,
+            SearchDocument.extra,
+        )
+        .join(SearchDocument, SearchDocument.id == SearchHistoryDocument.document_id)
+        .where(SearchHistoryDocument.history_id.in_(history_ids))
+        .order_by(SearchHistoryDocument.history_id, SearchHistoryDocument.rank)
+    )
+
+
+def _group(rows) -> Dict[int, List[dict]]:
+    by_history: Dict[int, List[dict]] = {}
+    for history_id, title, url, content, score, extra in rows:
+        result = {"title": title, "url": url, "content": content, "score": score}
+        if extra:
+            result.update(extra)
+        by_history.setdefault(history_id, []).append(result)
+    return by_history
+
+
+async def load(db: AsyncSession, history_ids: Sequence[int]) -> Dict[int, List[dict]]:
+    """The rebuilt ``results`` list of each history row, by history id."""
+    by_history: Dict[int, List[dict]] = {}
+    for start in range(0, len(history_ids), ID_BATCH_SIZE):
+        chunk = history_ids[start:start + ID_BATCH_SIZE]
+        by_history.update(_group(await db.execute(_documents_query(chunk))))
+    return by_history
+
+
+def _merge(envelope: Any, results: List[dict]) -> dict:
+    merged = dict(envelope or {})
+    merged["results"] = results
+    return merged
+
+
+async def expand(db: AsyncSession, searches: Sequence[SearchHistory]) -> None:
+    """Put the ``results`` list back into loaded SearchHistory objects."""
+    normalized = [search for search in searches if search.result_count is not None]
+    if not normalized:
+        return
+    by_history = await load(db, [search.id for search in normalized])
+    for search in normalized:
+        # Not a change to flush
+        set_committed_value(search, "results", _merge(search.results, by_history.get(search.id, [])))
+
+
+class _ExpandedRow(dict):
+    """Stands in for a result row whose ``results`` text was rebuilt."""
+    __getattr__ = dict.__getitem__
+
+    @property
+    def _mapping(self) -> dict:
+        return self
+
+
+async def expand_raw(db: AsyncSession, rows: Sequence) -> list:
+    """``expand`` for result rows whose JSON columns hold the stored text
+    (see ``crud.json_text``)."""
+    normalized = [row.id for row in rows if row.result_count is not None]
+    if not normalized:
+        return rows
+    by_history = await load(db, normalized)
+    expanded = []
+    for row in rows:
+        if row.result_count is not None:
+            row = _ExpandedRow(row._mapping)
+            merged = _merge(json.loads(row["results"]), by_history.get(row["id"], []))
+            row["results"] = json.dumps(merged, ensure_ascii=False)
+        expanded.append(row)
+    return expanded
+
+
+async def purge_orphans(db: AsyncSession, batch_size: int) -> int:
+    """Delete up to ``batch_size`` documents no history row links to and
+    commit. Rows being linked right now are locked, and skipped."""
+    candidates = (
+        select(SearchDocument.id)
+        .where(~exists().where(SearchHistoryDocument.document_id == SearchDocument.id))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    ids = (await db.execute(candidates)).scalars().all()
+    if ids:
+        await db.execute(delete(SearchDocument).where(SearchDocument.id.in_(ids)))
+    await db.commit()
+    return len(ids)
+
+
+def backfill(conn, batch_size: int = BACKFILL_BATCH_SIZE, commit_each_batch: bool = False) -> int:
+    """Move the results of inline history rows into the document store.
+
+    Walks ``search_history`` in id order ``batch_size`` rows at a time and
+    returns the number of rows moved. Rows whose results do not have the
+    expected shape are left inline. The alembic migration runs it inside
+    its own transaction; ``commit_each_batch`` makes every batch a
+    transaction instead, for running it on a live database.
+    """
+    table = SearchHistory.__table__
+    moved, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.results)
+            .where(table.c.id > last_id, table.c.result_count.is_(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates, history = [], []
+        for row_id, results in rows:
+            envelope, entries = split_results(results)
+            if entries is not None:
+                updates.append({"row_id": row_id, "envelope": envelope, "count": len(entries)})
+                history.append((row_id, entries))
+        if updates:
+            documents, links = _collect(history)
+            ids = {}
+            for stmt in _upserts(conn.dialect.name, documents):
+                ids.update(conn.execute(stmt).all())
+            if links:
+                conn.execute(insert(SearchHistoryDocument), _link_rows(links, ids))
+            conn.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(results=bindparam("envelope"), result_count=bindparam("count")),
+                updates,
+            )
+            moved += len(updates)
+        if commit_each_batch:
+            conn.commit()
+    return moved
+
+
+def inline(conn, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Copy stored documents back into ``results`` (the migration downgrade)."""
+    table = SearchHistory.__table__
+    restored, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.results)
+            .where(table.c.id > last_id, table.c.result_count.is_not(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        by_history = _group(conn.execute(_documents_query([row.id for row in rows])))
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(results=bindparam("merged"), result_count=None),
+            [{"row_id": row.id, "merged": _merge(row.results, by_history.get(row.id, []))} for row in rows],
+        )
+        restored += len(rows)
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the shared search result documents.")
+    parser.add_argument("--purge-orphans", action="store_true", help="delete documents no search links to")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.purge_orphans:
+        import asyncio
+        from app.db.database import AsyncSessionLocal
+
+        async def purge() -> int:
+            total = 0
+            async with AsyncSessionLocal() as db:
+                while (deleted := await purge_orphans(db, args.batch_size)):
+                    total += deleted
+            return total
+
+        print(f"Deleted {asyncio.run(purge())} orphaned documents")
+        return
+
+    from app.db.database import engine
+
+    with engine.connect() as conn:
+        print(f"Moved the results of {backfill(conn, args.batch_size, commit_each_batch=True)} searches")
+
+
+if __name__ == "__main__":
+    main()
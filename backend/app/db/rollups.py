@@ -0,0 +1,292 @@
+"""Incrementally maintained per-user activity rollups.
+
+Every history insert and delete in ``app.db.crud`` (and the write-behind
+flush) calls ``count_searches``/``count_images`` before committing. The
+rollup rows therefore change in the same transaction as the history rows
+they summarize. The increments are dialect-specific upserts (SQLite and
+PostgreSQL both support ``INSERT ... ON CONFLICT DO UPDATE``); decrements
+stop at zero and rows left empty are deleted, so deleting history that was
+never counted cannot drive a rollup negative.
+``get_user_stats`` reads only rollup rows, so its cost grows with the number
+of days and distinct queries rather than with history size.
+
+Migration 0008 backfills the rollups from existing history. Rebuild them
+after manual edits with::
+
+    python -m app.db.rollups            # every user
+    python -m app.db.rollups --user-id 42
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import (
+    ImageHistory,
+    SearchHistory,
+    UserDailyActivity,
+    UserImageSizeCount,
+    UserQueryCount,
+    utcnow,
+)
+
+QUERY_KEY_LENGTH = 255
+
+
+def query_key(query: str) -> str:
+    """Queries differing only in case or whitespace count as one."""
+    return " ".join(query.casefold().split())[:QUERY_KEY_LENGTH]
+
+
+def size_key(meta_data: Optional[dict]) -> str:
+    meta_data = meta_data or {}
+    width, height = meta_data.get("width"), meta_data.get("height")
+    if width is None or height is None:
+        return "unknown"
+    return f"{width}x{height}"
+
+
+def utc_day(created_at: Optional[datetime]) -> date:
+    if created_at is None:
+        created_at = utcnow()
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+def dialect_insert(dialect_name: str):
+    """``insert`` construct with ON CONFLICT support for the session's dialect."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def _add(db: AsyncSession, model, keys: Tuple[str, ...], values: Tuple[str, ...], deltas: Dict[tuple, tuple]):
+    """Add ``deltas`` (key tuple -> value tuple) to the rollup rows, creating missing rows."""
+    deltas = {k: v for k, v in deltas.items() if any(v)}
+    if not deltas:
+        return
+    table = model.__table__
+    stmt = dialect_insert(db.bind.dialect.name)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name] for name in values},
+    )
+    # Sorted so concurrent transactions lock rows in the same order
+    await db.execute(stmt, [dict(zip(keys + values, k + v)) for k, v in sorted(deltas.items())])
+
+
+async def _subtract(db: AsyncSession, model, keys: Tuple[str, ...], values: Tuple[str, ...], deltas: Dict[tuple, tuple]):
+    """Take ``deltas`` off existing rollup rows, stopping at zero.
+
+    Rows that were never counted (history older than the rollups) are left
+    alone rather than created with negative counts.
+    """
+    deltas = {k: v for k, v in deltas.items() if any(v)}
+    if not deltas:
+        return
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(*(table.c[name] == bindparam(f"key_{name}") for name in keys))
+        .values({
+            name: case(
+                (table.c[name] < bindparam(f"by_{name}"), 0),
+                else_=table.c[name] - bindparam(f"by_{name}"),
+            )
+            for name in values
+        })
+    )
+    await db.execute(stmt, [
+        {**{f"key_{name}": key for name, key in zip(keys, k)}, **{f"by_{name}": n for name, n in zip(values, v)}}
+        for k, v in sorted(deltas.items())
+    ])
+
+
+async def _drop_empty(db: AsyncSession, model, key_column: str, user_keys: Iterable[Tuple[int, object]],
+                      count_columns: Tuple[str, ...] = ("count",)):
+    by_user: Dict[int, set] = {}
+    for user_id, key in user_keys:
+        by_user.setdefault(user_id, set()).add(key)
+    for user_id, keys in by_user.items():
+        await db.execute(
+            delete(model).where(
+                model.user_id == user_id,
+                getattr(model, key_column).in_(sorted(keys)),
+                *(getattr(model, name) <= 0 for name in count_columns),
+            )
+        )
+
+
+async def count_searches(db: AsyncSession, rows: Iterable[Mapping], sign: int = 1) -> None:
+    """Apply search history rows (``user_id``, ``query``, ``created_at``) to the rollups.
+
+    Pass ``sign=-1`` for rows being deleted. Does not commit.
+    """
+    daily: Counter = Counter()
+    queries: Counter = Counter()
+    for row in rows:
+        daily[(row["user_id"], utc_day(row.get("created_at")))] += 1
+        queries[(row["user_id"], query_key(row["query"]))] += 1
+    apply = _add if sign > 0 else _subtract
+    await apply(db, UserDailyActivity, ("user_id", "day"), ("searches", "images"),
+                {k: (v, 0) for k, v in daily.items()})
+    await apply(db, UserQueryCount, ("user_id", "query"), ("count",), {k: (v,) for k, v in queries.items()})
+    if sign < 0:
+        await _drop_empty(db, UserDailyActivity, "day", daily, ("searches", "images"))
+        await _drop_empty(db, UserQueryCount, "query", queries)
+
+
+async def count_images(db: AsyncSession, rows: Iterable[Mapping], sign: int = 1) -> None:
+    """Apply image history rows (``user_id``, ``meta_data``, ``created_at``) to the rollups.
+
+    Pass ``sign=-1`` for rows being deleted. Does not commit.
+    """
+    daily: Counter = Counter()
+    sizes: Counter = Counter()
+    for row in rows:
+        daily[(row["user_id"], utc_day(row.get("created_at")))] += 1
+        sizes[(row["user_id"], size_key(row.get("meta_data")))] += 1
+    apply = _add if sign > 0 else _subtract
+    await apply(db, UserDailyActivity, ("user_id", "day"), ("searches", "images"),
+                {k: (0, v) for k, v in daily.items()})
+    await apply(db, UserImageSizeCount, ("user_id", "size"), ("count",), {k: (v,) for k, v in sizes.items()})
+    if sign < 0:
+        await _drop_empty(db, UserDailyActivity, "day", daily, ("searches", "images"))
+        await _drop_empty(db, UserImageSizeCount, "size", sizes)
+
+
+def history_row(item) -> dict:
+    """Rollup input for a loaded SearchHistory or ImageHistory object."""
+    return {
+        "id": item.id,
+        "user_id": item.user_id,
+        "query": getattr(item, "query", None),
+        "meta_data": item.meta_data,
+        "created_at": item.created_at,
+    }
+
+
+async def get_user_stats(db: AsyncSession, user_id: int, days: int, top_queries: int) -> dict:
+    today = utc_day(utcnow())
+    first_day = today - timedelta(days=days - 1)
+
+    totals = (await db.execute(
+        select(
+            func.coalesce(func.sum(UserDailyActivity.searches), 0),
+            func.coalesce(func.sum(UserDailyActivity.images), 0),
+        ).where(UserDailyActivity.user_id == user_id)
+    )).one()
+    recent = {
+        row.day: row
+        for row in (await db.execute(
+            select(UserDailyActivity.day, UserDailyActivity.searches, UserDailyActivity.images)
+            .where(UserDailyActivity.user_id == user_id, UserDailyActivity.day >= first_day)
+        )).all()
+    }
+    queries = (await db.execute(
+        select(UserQueryCount.query, UserQueryCount.count)
+        .where(UserQueryCount.user_id == user_id, UserQueryCount.count > 0)
+        .order_by(UserQueryCount.count.desc(), UserQueryCount.query)
+        .limit(top_queries)
+    )).all()
+    sizes = (await db.execute(
+        select(UserImageSizeCount.size, UserImageSizeCount.count)
+        .where(UserImageSizeCount.user_id == user_id, UserImageSizeCount.count > 0)
+        .order_by(UserImageSizeCount.count.desc(), UserImageSizeCount.size)
+    )).all()
+
+    daily = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        row = recent.get(day)
+        daily.append({
+            "day": day,
+            "searches": row.searches if row else 0,
+            "images": row.images if row else 0,
+        })
+    return {
+        "total_searches": totals[0],
+        "total_images": totals[1],
+        "daily": daily,
+        "top_queries": [{"query": q, "count": c} for q, c in queries],
+        "image_sizes": [{"size": s, "count": c} for s, c in sizes],
+    }
+
+
+def rollup_user_ids(conn) -> list:
+    """Users with any search or image history."""
+    return sorted(
+        set(conn.execute(select(SearchHistory.user_id).distinct()).scalars())
+        | set(conn.execute(select(ImageHistory.user_id).distinct()).scalars())
+    )
+
+
+def rebuild_user(conn, user_id: int, batch_size: int = 5000) -> None:
+    """Replace one user's rollup rows with counts from history; does not commit."""
+    from sqlalchemy import insert
+
+    daily: Counter = Counter()
+    daily_images: Counter = Counter()
+    queries: Counter = Counter()
+    sizes: Counter = Counter()
+    for model in (UserDailyActivity, UserQueryCount, UserImageSizeCount):
+        conn.execute(delete(model).where(model.user_id == user_id))
+    searches = conn.execution_options(yield_per=batch_size).execute(
+        select(SearchHistory.query, SearchHistory.created_at).where(SearchHistory.user_id == user_id)
+    )
+    for query, created_at in searches:
+        daily[utc_day(created_at)] += 1
+        queries[query_key(query)] += 1
+    images = conn.execution_options(yield_per=batch_size).execute(
+        select(ImageHistory.meta_data, ImageHistory.created_at).where(ImageHistory.user_id == user_id)
+    )
+    for meta_data, created_at in images:
+        daily_images[utc_day(created_at)] += 1
+        sizes[size_key(meta_data)] += 1
+
+    days = sorted(set(daily) | set(daily_images))
+    if days:
+        conn.execute(insert(UserDailyActivity), [
+            {"user_id": user_id, "day": d, "searches": daily[d], "images": daily_images[d]} for d in days
+        ])
+    if queries:
+        conn.execute(insert(UserQueryCount), [
+            {"user_id": user_id, "query": q, "count": c} for q, c in queries.items()
+        ])
+    if sizes:
+        conn.execute(insert(UserImageSizeCount), [
+            {"user_id": user_id, "size": s, "count": c} for s, c in sizes.items()
+        ])
+
+
+def rebuild(engine, user_id: Optional[int] = None, batch_size: int = 5000) -> int:
+    """Recompute the rollups from the history tables; returns the users rebuilt.
+
+    Each user is rebuilt in its own transaction. History rows written for a
+    user while their rollups are rebuilt may be counted twice or not at all,
+    so run it while writes are quiet.
+    """
+    with engine.connect() as conn:
+        user_ids = [user_id] if user_id is not None else rollup_user_ids(conn)
+    for uid in user_ids:
+        with engine.begin() as conn:
+            rebuild_user(conn, uid, batch_size)
+    return len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard activity rollups.")
+    parser.add_argument("--user-id", type=int, help="rebuild a single user")
+    args = parser.parse_args()
+
+    from app.db.database import engine
+
+    print(f"Rebuilt rollups for {rebuild(engine, args.user_id)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Indexed substring search over history text columns.
+
+PostgreSQL uses a ``pg_trgm`` GIN index, which ``ILIKE '%term%'`` can use
+directly, and ranks matches by trigram similarity. SQLite keeps an FTS5 shadow
+table with the ``trigram`` tokenizer in sync through triggers and ranks by
+bm25. Both give case-insensitive substring semantics; terms shorter than a
+trigram fall back to a plain ``LIKE``.
+"""
+from sqlalchemy import DDL, Table, event, func, literal_column, table, text
+from sqlalchemy import column as sql_column
+
+MIN_TRIGRAM_TERM = 3
+
+
+def fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def trgm_index_name(table_name: str, column: str) -> str:
+    return f"ix_{table_name}_{column}_trgm"
+
+
+def sqlite_create_statements(table_name: str, column: str) -> list:
+    fts = fts_table_name(table_name)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table_name}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    ]
+
+
+def sqlite_drop_statements(table_name: str) -> list:
+    fts = fts_table_name(table_name)
+    return [f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ("ai", "ad", "au")] + [
+        f"DROP TABLE IF EXISTS {fts}"
+    ]
+
+
+def sqlite_rebuild_statement(table_name: str) -> str:
+    """Fill the FTS table from rows that predate it."""
+    fts = fts_table_name(table_name)
+    return f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+
+
+def postgres_create_statements(table_name: str, column: str) -> list:
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS {trgm_index_name(table_name, column)} "
+        f"ON {table_name} USING gin ({column} gin_trgm_ops)",
+    ]
+
+
+def postgres_drop_statements(table_name: str, column: str) -> list:
+    return [f"DROP INDEX IF EXISTS {trgm_index_name(table_name, column)}"]
+
+
+def install(target: Table, column: str) -> None:
+    """Attach the index DDL to ``target`` so ``metadata.create_all`` builds it."""
+    for statement in sqlite_create_statements(target.name, column):
+        event.listen(target, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for statement in postgres_create_statements(target.name, column):
+        event.listen(target, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    for statement in sqlite_drop_statements(target.name):
+        event.listen(target, "after_drop", DDL(statement).execute_if(dialect="sqlite"))
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def ranks_matches(term: str, dialect_name: str) -> bool:
+    """Whether ``apply_text_filter`` orders matches for ``term`` by relevance
+    (otherwise listings stay in time order)."""
+    return dialect_name == "postgresql" or (dialect_name == "sqlite" and len(term) >= MIN_TRIGRAM_TERM)
+
+
+def apply_text_filter(stmt, model, column_name: str, term: str, dialect_name: str):
+    """Restrict ``stmt`` to rows whose column contains ``term``.
+
+    Returns the filtered statement and an ORDER BY expression ranking the
+    best matches first (``None`` when no ranking is available).
+    """
+    column = getattr(model, column_name)
+    if dialect_name == "sqlite" and len(term) >= MIN_TRIGRAM_TERM:
+        fts_name = fts_table_name(model.__tablename__)
+        fts = table(fts_name, sql_column("rowid"))
+        phrase = '"' + term.replace('"', '""') + '"'
+        stmt = stmt.join(fts, fts.c.rowid == model.id).where(
+            text(f"{fts_name} MATCH :fts_term").bindparams(fts_term=phrase)
+        )
+        # bm25() is lower-is-better
+        return stmt, func.bm25(literal_column(fts_name)).asc()
+    if dialect_name == "postgresql":
+        stmt = stmt.where(column.ilike(_like_pattern(term), escape="\\"))
+        return stmt, func.similarity(column, term).desc()
+    return stmt.where(column.ilike(_like_pattern(term), escape="\\")), None
@@ -1,13 +1,92 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routers import auth, search, image, dashboard
+from app.core import fast_json, metrics
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.db.pagination import InvalidCursor, NEXT_CURSOR_HEADER
+from app.services.admission import get_admission_controller
+from app.services.history_retention import history_retention
+from app.services.history_writer import history_writer
+from app.services.image_jobs import image_job_manager
+from app.services.provider_clients import provider_clients
+from app.services.search_cache import get_search_cache
+from app.services.similar_searches import similar_searches
+from app.services.token_purge import refresh_token_purger
+
+cache_events_total = metrics.registry.counter(
+    "search_cache_events_total", "Search cache lookups by outcome", ("event",)
+)
+history_writer_rows_total = metrics.registry.counter(
+    "history_writer_rows_total", "Write-behind history rows by outcome", ("outcome",)
+)
+history_writer_queue_depth = metrics.registry.gauge(
+    "history_writer_queue_depth", "History rows accepted but not yet committed"
+)
+admission_rejections_total = metrics.registry.counter(
+    "admission_rejections_total", "Requests turned away by admission control", ("endpoint_class", "reason")
+)
+image_jobs_active = metrics.registry.gauge(
+    "image_jobs_active", "Image jobs being run by this process"
+)
+
+
+def collect_service_metrics() -> None:
+    """Mirror the services' own counters into the registry at scrape time."""
+    for event, value in get_search_cache().stats().items():
+        cache_events_total.set_total(value, event=event)
+    writer = history_writer.stats()
+    history_writer_rows_total.set_total(writer["rows_flushed"], outcome="flushed")
+    history_writer_rows_total.set_total(writer["overflow_writes"], outcome="overflow")
+    history_writer_rows_total.set_total(writer["dropped_rows"], outcome="dropped")
+    history_writer_queue_depth.set(writer["queue_depth"])
+    image_jobs_active.set(image_job_manager.active_jobs)
+    for (endpoint_class, reason), value in get_admission_controller().stats().items():
+        admission_rejections_total.set_total(value, endpoint_class=endpoint_class, reason=reason)
+
+
+metrics.registry.add_collector(collect_service_metrics)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await provider_clients.start()
+    if settings.history_write_behind:
+        await history_writer.start()
+    await image_job_manager.start()
+    await refresh_token_purger.start()
+    await history_retention.start()
+    await similar_searches.start()
+    flush_task = None
+    if settings.metrics_multiproc_dir:
+        flush_task = asyncio.create_task(
+            metrics.flush_periodically(settings.metrics_multiproc_dir, settings.metrics_flush_seconds)
+        )
+    try:
+        yield
+    finally:
+        await history_retention.stop()
+        await refresh_token_purger.stop()
+        await image_job_manager.stop()
+        # Flush buffered history rows before the process exits
+        await history_writer.stop()
+        # After the writer's last flush, so the saved indexes include it
+        await similar_searches.stop()
+        await provider_clients.aclose()
+        if flush_task is not None:
+            flush_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await flush_task
+            metrics.registry.write_snapshot(settings.metrics_multiproc_dir)
 
 app = FastAPI(
     title="MindCanvas API",
     description="AI-Powered Content & Image Explorer",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=fast_json.default_response_class()
 )
 
 # CORS middleware
@@ -21,7 +100,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+app.add_middleware(CompressionMiddleware)
+# Added last so it wraps everything, CORS preflights included
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
@@ -33,6 +120,11 @@ app.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
 async def root():
     return {"message": "MindCanvas API is running!"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    body = metrics.registry.render(settings.metrics_multiproc_dir)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "environment": settings.environment}
@@ -1,70 +1,89 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.db.models import User, RefreshToken
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.core.security import (
-    create_access_token,
-    create_refresh_token, 
+    create_user_access_token,
+    create_refresh_token,
     get_current_user,
+    hash_refresh_token,
+    refresh_token_expiry,
     security
 )
-from app.core.password import verify_password
+from app.core.password import password_hasher
 from app.db.database import get_db
-from app.db.crud import get_user_by_email, create_user, delete_refresh_token, save_refresh_token
+from app.db.crud import (
+    get_user_by_email,
+    create_user,
+    update_user_password_hash,
+    bump_token_epoch,
+    rotate_refresh_token,
+    save_refresh_token
+)
 from app.schemas.user import UserCreate, UserLogin, Token, User
 
 router = APIRouter()
 
+async def issue_refresh_token(db: AsyncSession, user_id: int) -> str:
+    token = create_refresh_token()
+    await save_refresh_token(db, user_id, hash_refresh_token(token), refresh_token_expiry())
+    return token
+
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
     # Check if user already exists
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
-    # Create new user
-    db_user = create_user(db=db, user=user)
+    # Create new user (bcrypt runs off the event loop)
+    hashed_password = await password_hasher.hash(user.password)
+    db_user = await create_user(db=db, user=user, hashed_password=hashed_password)
 
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": db_user.email}, 
-        expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(db_user, expires_delta=access_token_expires)
 
     return {
         "access_token": access_token,
+        "refresh_token": await issue_refresh_token(db, db_user.id),
         "token_type": "bearer",
         "user": db_user
     }
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Authenticate user and return access token."""
     # Get user from database
-    user = get_user_by_email(db, email=user_credentials.email)
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    user = await get_user_by_email(db, email=user_credentials.email)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(
+            user_credentials.password, user.hashed_password
+        )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade hashes made with an older cost factor
+    if new_hash:
+        await update_user_password_hash(db, user, new_hash)
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.email}, 
-        expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(user, expires_delta=access_token_expires)
 
     return {
         "access_token": access_token,
+        "refresh_token": await issue_refresh_token(db, user.id),
         "token_type": "bearer",
         "user": user
     }
@@ -74,33 +93,40 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     """Get current user information."""
     return current_user
 
+@router.post("/logout")
+async def logout(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke every access and refresh token issued to the current user."""
+    await bump_token_epoch(db, current_user.id)
+    return {"message": "Logged out successfully"}
+
 @router.post("/refresh")
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # Verify old refresh token exists in DB
-    db_token = db.query(RefreshToken).filter(RefreshToken.token == credentials.credentials).first()
-    if not db_token:
-        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    """Exchange a refresh token for a new access token and refresh token.
 
-    user = db.query(User).filter(User.id == db_token.user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-
-    # Remove old refresh token
-    delete_refresh_token(db, credentials.credentials)
+    Each refresh token works once: it is consumed and replaced in a single
+    transaction.
+    """
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    # Create new access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=access_token_expires
+    new_refresh_token = create_refresh_token()
+    user = await rotate_refresh_token(
+        db,
+        hash_refresh_token(credentials.credentials),
+        hash_refresh_token(new_refresh_token),
+        refresh_token_expiry(),
     )
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    # Create new refresh token and save to DB
-    new_refresh_token = create_refresh_token(user.email)
-    save_refresh_token(db, user.id, new_refresh_token)
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_user_access_token(user, expires_delta=access_token_expires)
 
     return {
         "access_token": access_token,
@@ -1,73 +1,191 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from app.core import fast_json
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.db.crud import (
     get_user_search_history, 
     get_user_image_history,
     delete_search_history,
-    delete_image_history
+    delete_image_history,
+    delete_history_rows,
+    history_page_in_time_order,
+    history_range_conditions,
+    json_columns
 )
-from app.schemas.search import SearchHistoryResponse
-from app.schemas.image import ImageHistoryResponse
+from app.schemas.search import SearchHistoryResponse, SearchHistorySummary
+from app.schemas.image import ImageHistoryResponse, ImageHistorySummary
+from app.schemas.dashboard import BulkDeleteResponse, DashboardStats, HistoryBulkDelete
 from app.schemas.user import User
+from app.db.rollups import get_user_stats, utc_day
+from app.db.models import ImageHistory, SearchHistory, utcnow
+from app.db.collection_versions import IMAGES, SEARCHES, conditional_listing, set_listing_headers
+from app.db.pagination import NEXT_CURSOR_HEADER, next_cursor
 from app.services.file_export import export_to_csv, export_to_pdf
 
 router = APIRouter()
 
-@router.get("/search", response_model=List[SearchHistoryResponse])
+@router.get(
+    "/search",
+    response_model=Union[List[SearchHistoryResponse], List[SearchHistorySummary]]
+)
 async def get_dashboard_searches(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get paginated search history for dashboard."""
-    searches = get_user_search_history(
+    """Get paginated search history for dashboard.
+
+    When ``search`` is given, matching is done in the database and the best
+    matches come first (terms too short to rank keep time order). Time-ordered
+    pages carry an ``X-Next-Cursor`` header to pass back as ``cursor``;
+    cursor pages stay in time order even when filtered. ``view=summary`` returns the lightweight list schema.
+    Repeat requests with ``If-None-Match`` get a 304 while nothing changed.
+    """
+    etag, not_modified = await conditional_listing(db, request, current_user.id, [SEARCHES])
+    if not_modified:
+        return not_modified
+    set_listing_headers(response, etag)
+    fast = fast_json.enabled()
+    searches = await get_user_search_history(
         db=db,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        search=search,
+        cursor=cursor,
+        view=view,
+        raw_json=fast
     )
-
-    # Filter by search term if provided
-    if search:
-        searches = [s for s in searches if search.lower() in s.query.lower()]
-
+    token = next_cursor(searches, limit)
+    if token and history_page_in_time_order(db, search, cursor):
+        response.headers[NEXT_CURSOR_HEADER] = token
+    if fast:
+        model = SearchHistorySummary if view == "summary" else SearchHistoryResponse
+        return fast_json.listing_response(model, searches, response, json_columns(SearchHistory))
+    if view == "summary":
+        return [SearchHistorySummary.model_validate(row) for row in searches]
     return searches
 
-@router.get("/images", response_model=List[ImageHistoryResponse])
+@router.get(
+    "/images",
+    response_model=Union[List[ImageHistoryResponse], List[ImageHistorySummary]]
+)
 async def get_dashboard_images(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get paginated image history for dashboard."""
-    images = get_user_image_history(
+    """Get paginated image history for dashboard.
+
+    When ``search`` is given, matching is done in the database and the best
+    matches come first (terms too short to rank keep time order). Time-ordered
+    pages carry an ``X-Next-Cursor`` header to pass back as ``cursor``;
+    cursor pages stay in time order even when filtered. ``view=summary`` returns the lightweight list schema.
+    Repeat requests with ``If-None-Match`` get a 304 while nothing changed.
+    """
+    etag, not_modified = await conditional_listing(db, request, current_user.id, [IMAGES])
+    if not_modified:
+        return not_modified
+    set_listing_headers(response, etag)
+    fast = fast_json.enabled()
+    images = await get_user_image_history(
         db=db,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        search=search,
+        cursor=cursor,
+        view=view,
+        raw_json=fast
     )
+    token = next_cursor(images, limit)
+    if token and history_page_in_time_order(db, search, cursor):
+        response.headers[NEXT_CURSOR_HEADER] = token
+    if fast:
+        model = ImageHistorySummary if view == "summary" else ImageHistoryResponse
+        return fast_json.listing_response(model, images, response, json_columns(ImageHistory))
+    if view == "summary":
+        return [ImageHistorySummary.model_validate(row) for row in images]
+    return images
 
-    # Filter by search term if provided
-    if search:
-        images = [i for i in images if search.lower() in i.prompt.lower()]
+@router.get("/stats", response_model=DashboardStats)
+async def get_dashboard_stats(
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Activity totals, per-day counts for the last ``days`` days, the ``top``
+    most frequent queries and the image size distribution.
 
-    return images
+    Served from the rollup tables, so the cost doesn't grow with history size.
+    """
+    # The per-day window moves at midnight UTC even without new activity
+    etag, not_modified = await conditional_listing(
+        db, request, current_user.id, [SEARCHES, IMAGES], variant=utc_day(utcnow()).isoformat()
+    )
+    if not_modified:
+        return not_modified
+    set_listing_headers(response, etag)
+    return await get_user_stats(db, current_user.id, days=days, top_queries=top)
+
+@router.delete("/search", response_model=BulkDeleteResponse)
+async def delete_searches(
+    selection: HistoryBulkDelete,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete many search history entries in a single statement.
+
+    Entries are selected by ``ids`` and/or a ``before``/``after`` range;
+    returns how many were deleted.
+    """
+    deleted = await delete_history_rows(
+        db, SearchHistory, *history_range_conditions(SearchHistory, current_user.id, **selection.model_dump())
+    )
+    return {"deleted": deleted}
+
+@router.delete("/images", response_model=BulkDeleteResponse)
+async def delete_images(
+    selection: HistoryBulkDelete,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete many image history entries in a single statement.
+
+    Entries are selected by ``ids`` and/or a ``before``/``after`` range;
+    returns how many were deleted.
+    """
+    deleted = await delete_history_rows(
+        db, ImageHistory, *history_range_conditions(ImageHistory, current_user.id, **selection.model_dump())
+    )
+    return {"deleted": deleted}
 
 @router.delete("/search/{search_id}")
 async def delete_search(
     search_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a search history entry."""
-    success = delete_search_history(db=db, search_id=search_id, user_id=current_user.id)
+    success = await delete_search_history(db=db, search_id=search_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Search not found")
     return {"message": "Search deleted successfully"}
@@ -76,10 +194,10 @@ async def delete_search(
 async def delete_image(
     image_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete an image history entry."""
-    success = delete_image_history(db=db, image_id=image_id, user_id=current_user.id)
+    success = await delete_image_history(db=db, image_id=image_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Image not found")
     return {"message": "Image deleted successfully"}
@@ -88,44 +206,24 @@ async def delete_image(
 async def export_data_csv(
     data_type: str = "all",  # "searches", "images", or "all"
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Export user data to CSV."""
-    try:
-        csv_content = await export_to_csv(
-            db=db,
-            user_id=current_user.id,
-            data_type=data_type
-        )
-
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=mindcanvas_data.csv"}
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    """Export user data to CSV, streamed as it is read from the database."""
+    return StreamingResponse(
+        export_to_csv(db=db, user_id=current_user.id, data_type=data_type),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=mindcanvas_data.csv"}
+    )
 
 @router.get("/export/pdf")
 async def export_data_pdf(
     data_type: str = "all",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Export user data to PDF."""
-    try:
-        pdf_content = await export_to_pdf(
-            db=db,
-            user_id=current_user.id,
-            data_type=data_type
-        )
-
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=mindcanvas_data.pdf"}
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
-    
-    
\ No newline at end of file
+    """Export user data to PDF, streamed page by page."""
+    return StreamingResponse(
+        export_to_pdf(db=db, user_id=current_user.id, data_type=data_type),
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=mindcanvas_data.pdf"}
+    )
@@ -1,20 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from app.core import fast_json
 from app.core.security import get_current_user
 from app.db.database import get_db
-from app.db.crud import create_image_history, get_user_image_history
-from app.schemas.image import ImageGenerationRequest, ImageGenerationResponse, ImageHistoryResponse
+from app.db.crud import get_image_history_item, get_image_job, get_user_image_history, json_columns
+from app.db.collection_versions import IMAGES, conditional_listing, set_listing_headers
+from app.db.models import ImageHistory
+from app.db.pagination import NEXT_CURSOR_HEADER, next_cursor
+from app.schemas.image import (
+    ImageGenerationRequest,
+    ImageGenerationResponse,
+    ImageHistoryResponse,
+    ImageHistorySummary,
+    ImageJobResponse
+)
 from app.schemas.user import User
 from app.services.mcp_client import generate_image
+from app.services.blob_store import get_blob_store, is_digest, sniff_mime
+from app.services.admission import IMAGE, admission
+from app.services.blob_response import BlobResponse, CACHE_CONTROL
+from app.services.history_writer import history_writer
+from app.services.image_jobs import image_job_manager
 
 router = APIRouter()
 
-@router.post("/generate", response_model=ImageGenerationResponse)
+@router.post(
+    "/generate", response_model=ImageGenerationResponse, dependencies=[Depends(admission(IMAGE))]
+)
 async def generate_image_endpoint(
     image_request: ImageGenerationRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate image using Flux ImageGen MCP server."""
     try:
@@ -27,7 +47,7 @@ async def generate_image_endpoint(
         )
 
         # Save to database
-        create_image_history(
+        await history_writer.record_image(
             db=db,
             user_id=current_user.id,
             prompt=image_request.prompt,
@@ -45,18 +65,159 @@ async def generate_image_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
-@router.get("/history", response_model=List[ImageHistoryResponse])
+@router.post(
+    "/jobs",
+    response_model=ImageJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admission(IMAGE))]
+)
+async def submit_image_job(
+    image_request: ImageGenerationRequest,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue an image generation and return the job immediately.
+
+    Follow it with ``GET /image/jobs/{id}`` or the ``/events`` stream; the
+    history entry is recorded when the job succeeds.
+    """
+    job = await image_job_manager.submit(
+        db,
+        user_id=current_user.id,
+        prompt=image_request.prompt,
+        params={
+            "width": image_request.width,
+            "height": image_request.height,
+            "steps": image_request.steps
+        }
+    )
+    response.headers["Location"] = f"/image/jobs/{job.id}"
+    return job
+
+@router.get("/jobs/{job_id}", response_model=ImageJobResponse)
+async def get_image_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the state of an image generation job."""
+    job = await get_image_job(db, job_id=job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def _job_event_stream(job_id: str):
+    async for snapshot in image_job_manager.watch(job_id):
+        if snapshot is None:
+            yield ": keep-alive\n\n"
+        else:
+            yield f"event: {snapshot['status']}\ndata: {json.dumps(snapshot)}\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def stream_image_job_events(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-Sent Events with the job's state on every change.
+
+    The stream ends after the ``succeeded`` or ``failed`` event.
+    """
+    if await get_image_job(db, job_id=job_id, user_id=current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _job_event_stream(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get(
+    "/history",
+    response_model=Union[List[ImageHistoryResponse], List[ImageHistorySummary]]
+)
 async def get_image_history(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get user's image generation history."""
-    image_history = get_user_image_history(
+    """Get user's image generation history.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch
+    the following page. ``view=summary`` leaves out inline image data; fetch
+    one entry in full from ``/history/{id}``. Send the ``ETag`` back in
+    ``If-None-Match`` to get a 304 while the history is unchanged.
+    """
+    etag, not_modified = await conditional_listing(db, request, current_user.id, [IMAGES])
+    if not_modified:
+        return not_modified
+    set_listing_headers(response, etag)
+    fast = fast_json.enabled()
+    image_history = await get_user_image_history(
         db=db,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        view=view,
+        raw_json=fast
+    )
+    token = next_cursor(image_history, limit)
+    if token:
+        response.headers[NEXT_CURSOR_HEADER] = token
+    if fast:
+        model = ImageHistorySummary if view == "summary" else ImageHistoryResponse
+        return fast_json.listing_response(model, image_history, response, json_columns(ImageHistory))
+    if view == "summary":
+        return [ImageHistorySummary.model_validate(row) for row in image_history]
+    return image_history
+
+@router.get("/history/{image_id}", response_model=ImageHistoryResponse)
+async def get_image_history_entry(
+    image_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get one image history entry in full."""
+    image = await get_image_history_item(db=db, image_id=image_id, user_id=current_user.id)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return image
+
+def _read_head(store, digest: str, size: int) -> bytes:
+    return b"".join(store.iter_range(digest, 0, min(size, 16) - 1)) if size else b""
+
+@router.api_route("/blob/{digest}", methods=["GET", "HEAD"])
+async def get_image_blob(digest: str, request: Request):
+    """Serve a stored image by its SHA-256 digest.
+
+    Blobs are immutable and addressed by content, so responses are cacheable
+    forever and support conditional and Range requests. The digest itself acts
+    as the capability, which lets plain ``<img>`` tags load images.
+    """
+    if not is_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    store = get_blob_store()
+    size = await run_in_threadpool(store.size, digest)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{digest}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    head = await run_in_threadpool(_read_head, store, digest, size)
+    return BlobResponse(
+        store,
+        digest,
+        size,
+        media_type=sniff_mime(head),
+        range_header=request.headers.get("range"),
+        send_body=request.method != "HEAD",
     )
-    return image_history
\ No newline at end of file
@@ -1,20 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from app.core import fast_json
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.db.database import get_db
-from app.db.crud import create_search_history, get_user_search_history
-from app.schemas.search import SearchRequest, SearchResponse, SearchHistoryResponse
+from app.db.crud import (
+    get_search_history_item,
+    get_search_history_items,
+    get_user_search_history,
+    json_columns
+)
+from app.db.collection_versions import SEARCHES, conditional_listing, set_listing_headers
+from app.db.models import SearchHistory
+from app.db.pagination import NEXT_CURSOR_HEADER, next_cursor
+from app.schemas.search import (
+    SearchBatchItem,
+    SearchBatchRequest,
+    SearchBatchResponse,
+    SearchRequest,
+    SearchResponse,
+    SearchHistoryResponse,
+    SearchHistorySummary,
+    SimilarSearch
+)
 from app.schemas.user import User
+from app.services.admission import SEARCH, admission
+from app.services.history_writer import history_writer
 from app.services.mcp_client import search_web
+from app.services.similar_searches import similar_searches
 
 router = APIRouter()
 
-@router.post("/", response_model=SearchResponse)
+@router.post("/", response_model=SearchResponse, dependencies=[Depends(admission(SEARCH))])
 async def perform_search(
     search_request: SearchRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Perform web search using Tavily MCP server."""
     try:
@@ -25,7 +48,7 @@ async def perform_search(
         )
 
         # Save to database
-        create_search_history(
+        await history_writer.record_search(
             db=db,
             user_id=current_user.id,
             query=search_request.query,
@@ -38,19 +61,145 @@ async def perform_search(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@router.get("/history", response_model=List[SearchHistoryResponse])
+def _batch_cost(body) -> int:
+    return len(SearchBatchRequest.model_validate(body).searches)
+
+@router.post(
+    "/batch",
+    response_model=SearchBatchResponse,
+    dependencies=[Depends(admission(SEARCH, cost=_batch_cost))]
+)
+async def perform_search_batch(
+    batch: SearchBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Run several searches concurrently.
+
+    Results come back in request order, each with its result or error.
+    Successful searches are recorded in one bulk insert.
+    """
+    semaphore = asyncio.Semaphore(settings.search_batch_concurrency)
+
+    async def run(search_request: SearchRequest):
+        async with semaphore:
+            try:
+                return await search_web(
+                    query=search_request.query,
+                    max_results=search_request.max_results
+                )
+            except Exception as e:
+                return e
+
+    outcomes = await asyncio.gather(*(run(search_request) for search_request in batch.searches))
+
+    try:
+        await history_writer.record_searches(
+            db=db,
+            user_id=current_user.id,
+            entries=[
+                {
+                    "query": search_request.query,
+                    "results": outcome,
+                    "meta_data": {"max_results": search_request.max_results}
+                }
+                for search_request, outcome in zip(batch.searches, outcomes)
+                if not isinstance(outcome, Exception)
+            ]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Saving search history failed: {str(e)}")
+
+    return SearchBatchResponse(results=[
+        SearchBatchItem(query=search_request.query, status="error", error=str(outcome))
+        if isinstance(outcome, Exception)
+        else SearchBatchItem(query=search_request.query, status="ok", result=outcome)
+        for search_request, outcome in zip(batch.searches, outcomes)
+    ])
+
+@router.get(
+    "/history",
+    response_model=Union[List[SearchHistoryResponse], List[SearchHistorySummary]]
+)
 async def get_search_history(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "full",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get user's search history."""
-    search_history = get_user_search_history(
-        db=db, 
-        user_id=current_user.id, 
-        skip=skip, 
-        limit=limit
+    """Get user's search history.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch
+    the following page. ``view=summary`` replaces the stored results with
+    ``results_count``; fetch one entry in full from ``/history/{id}``.
+    Send the ``ETag`` back in ``If-None-Match`` to get a 304 while the
+    history is unchanged.
+    """
+    etag, not_modified = await conditional_listing(db, request, current_user.id, [SEARCHES])
+    if not_modified:
+        return not_modified
+    set_listing_headers(response, etag)
+    fast = fast_json.enabled()
+    search_history = await get_user_search_history(
+        db=db,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        view=view,
+        raw_json=fast
     )
+    token = next_cursor(search_history, limit)
+    if token:
+        response.headers[NEXT_CURSOR_HEADER] = token
+    if fast:
+        model = SearchHistorySummary if view == "summary" else SearchHistoryResponse
+        return fast_json.listing_response(model, search_history, response, json_columns(SearchHistory))
+    if view == "summary":
+        return [SearchHistorySummary.model_validate(row) for row in search_history]
     return search_history
 
+@router.get("/history/{search_id}", response_model=SearchHistoryResponse)
+async def get_search_history_entry(
+    search_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get one search history entry with its full results."""
+    search = await get_search_history_item(db=db, search_id=search_id, user_id=current_user.id)
+    if search is None:
+        raise HTTPException(status_code=404, detail="Search not found")
+    return search
+
+
+@router.get("/similar", response_model=List[SimilarSearch])
+async def get_similar_searches(
+    q: str = Query(min_length=1, max_length=500),
+    k: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the user's ``k`` past searches most similar to ``q``, best first,
+    with their stored results.
+
+    ``similarity`` is the cosine similarity of hashed character n-gram
+    vectors of the two queries, from 1 (same wording) down to about 0.
+    """
+    hits = await similar_searches.search(db, current_user.id, q, k)
+    searches = await get_search_history_items(db, current_user.id, [search_id for search_id, _ in hits])
+    return [
+        SimilarSearch(
+            id=search.id,
+            query=search.query,
+            results=search.results,
+            meta_data=search.meta_data,
+            created_at=search.created_at,
+            similarity=similarity
+        )
+        for search_id, similarity in hits
+        if (search := searches.get(search_id)) is not None
+    ]
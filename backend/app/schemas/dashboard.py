@@ -0,0 +1,58 @@
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Optional
+from datetime import date, datetime, timezone
+
+
+class DailyActivity(BaseModel):
+    day: date
+    searches: int
+    images: int
+
+
+class QueryCount(BaseModel):
+    query: str
+    count: int
+
+
+class ImageSizeCount(BaseModel):
+    size: str
+    count: int
+
+
+class DashboardStats(BaseModel):
+    total_searches: int
+    total_images: int
+    # Oldest first, one entry per day including days without activity
+    daily: List[DailyActivity]
+    top_queries: List[QueryCount]
+    image_sizes: List[ImageSizeCount]
+
+
+class HistoryBulkDelete(BaseModel):
+    """Selects history rows to delete by id, by ``created_at`` range, or both.
+
+    ``after`` is inclusive and ``before`` exclusive; times without an offset
+    are taken as UTC.
+    """
+    ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=1000)
+    before: Optional[datetime] = None
+    after: Optional[datetime] = None
+
+    @field_validator("before", "after")
+    @classmethod
+    def as_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    @model_validator(mode="after")
+    def require_selection(self) -> "HistoryBulkDelete":
+        if self.ids is None and self.before is None and self.after is None:
+            raise ValueError("Give ids, before or after")
+        return self
+
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int
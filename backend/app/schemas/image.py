@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from pydantic import ConfigDict
 from typing import Any, Dict, Optional
 from datetime import datetime
@@ -18,14 +18,43 @@ class ImageGenerationResponse(BaseModel):
     meta_data: Dict[str, Any]
 
 
-class ImageHistoryResponse(BaseModel):
+class ImageJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    status: str
+    progress: int
+    prompt: str
+    params: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    image_history_id: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ImageHistorySummary(BaseModel):
+    """List view of a generated image: everything but inline image data."""
     # Enable reading from ORM attributes
     model_config = ConfigDict(from_attributes=True)
 
     id: int
     prompt: str
     image_url: Optional[str] = None
-    image_data: Optional[str] = None
+    image_digest: Optional[str] = None
+    image_size: Optional[int] = None
+    image_mime: Optional[str] = None
     # Read from ORM attribute "metadata", expose as "metadata" in JSON
     meta_data: Optional[Dict[str, Any]] = Field(default=None, alias="meta_data")
     created_at: datetime
+
+    @computed_field
+    @property
+    def blob_url(self) -> Optional[str]:
+        """Path of the stored image under the API root."""
+        return f"/image/blob/{self.image_digest}" if self.image_digest else None
+
+
+class ImageHistoryResponse(ImageHistorySummary):
+    # Only set on rows recorded before images moved to the blob store
+    image_data: Optional[str] = None
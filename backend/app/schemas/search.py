@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from pydantic import ConfigDict
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Literal, Optional, List
 from datetime import datetime
 
 
@@ -23,6 +23,22 @@ class SearchResponse(BaseModel):
     meta_data: Dict[str, Any]
 
 
+class SearchBatchRequest(BaseModel):
+    searches: List[SearchRequest] = Field(min_length=1, max_length=50)
+
+
+class SearchBatchItem(BaseModel):
+    """Outcome of one query in a batch; ``result`` or ``error`` is set."""
+    query: str
+    status: Literal["ok", "error"]
+    result: Optional[SearchResponse] = None
+    error: Optional[str] = None
+
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchBatchItem]
+
+
 class SearchHistoryResponse(BaseModel):
     # Enable reading from ORM attributes
     model_config = ConfigDict(from_attributes=True)
@@ -33,3 +49,19 @@ class SearchHistoryResponse(BaseModel):
     # Read from ORM attribute "metadata", expose as "metadata" in JSON
     meta_data: Optional[Dict[str, Any]] = Field(default=None, alias="meta_data")
     created_at: datetime
+
+
+class SimilarSearch(SearchHistoryResponse):
+    """A past search and the cosine similarity of its query to the one asked."""
+    similarity: float
+
+
+class SearchHistorySummary(BaseModel):
+    """List view of a search: the stored results are only counted."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    query: str
+    results_count: int
+    meta_data: Optional[Dict[str, Any]] = Field(default=None, alias="meta_data")
+    created_at: datetime
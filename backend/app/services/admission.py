@@ -0,0 +1,260 @@
+"""Admission control for the provider-backed endpoints.
+
+Each request to an endpoint class (``search`` or ``image``) passes two
+checks before any work is done:
+
+- A token bucket per user and class, refilled at ``rate_limit_<class>_per_minute``
+  and holding up to ``rate_limit_<class>_burst`` tokens. An empty bucket
+  answers 429 with ``Retry-After`` set to when enough tokens are back. A
+  request costing more than a full bucket (a large batch) can never be
+  admitted and is refused with 413.
+- A per-process cap on requests in flight, ``admission_max_in_flight_<class>``.
+  At the cap, new requests are shed with 503 and ``Retry-After`` instead of
+  queueing behind the provider.
+
+Bucket state lives in a backend: ``memory`` (per process) or ``redis``
+(shared between workers). Any client offering the async ``eval`` subset of
+``redis.asyncio.Redis`` can stand in for the redis backend. A rate of 0
+disables the bucket and a cap of 0 disables shedding.
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from fastapi import Depends, HTTPException, Request, status
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.schemas.user import User
+
+SEARCH = "search"
+IMAGE = "image"
+
+
+@dataclass(frozen=True)
+class ClassLimits:
+    rate_per_second: float
+    burst: int
+    max_in_flight: int
+
+
+class RateLimitBackend(ABC):
+    """Token bucket storage."""
+
+    @abstractmethod
+    async def take(self, key: str, rate_per_second: float, burst: int, cost: int) -> float:
+        """Take ``cost`` tokens from the bucket at ``key``.
+
+        Returns 0 when they were taken, otherwise the seconds until the bucket
+        will hold enough (nothing is taken then).
+        """
+
+    async def clear(self) -> None:
+        """Refill every bucket (used by tests and admin tooling)."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets; the least recently used are dropped beyond
+    ``max_keys``, which only hands those users a full bucket again."""
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def take(self, key: str, rate_per_second: float, burst: int, cost: int) -> float:
+        now = self.clock()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate_per_second)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def clear(self) -> None:
+        self._buckets.clear()
+
+
+# KEYS[1] bucket hash; ARGV rate per second, burst, cost, now (seconds).
+# Returns the wait in milliseconds, 0 when the tokens were taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return wait
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker. A Lua script makes each take atomic;
+    the key expires once the bucket would be full again."""
+
+    def __init__(self, client, prefix: str = "ratelimit:v1:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, rate_per_second: float, burst: int, cost: int) -> float:
+        wait_ms = await self.client.eval(
+            TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, rate_per_second, burst, cost, time.time()
+        )
+        return int(wait_ms) / 1000
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+def _redis_backend() -> RateLimitBackend:
+    try:
+        from redis import asyncio as redis
+    except ImportError:
+        raise ValueError("The 'redis' rate limit backend requires the redis package")
+    if not settings.rate_limit_url:
+        raise ValueError("RATE_LIMIT_URL must be set for the 'redis' rate limit backend")
+    return RedisRateLimitBackend(redis.from_url(settings.rate_limit_url))
+
+
+class AdmissionController:
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, ClassLimits], shed_retry_after: float):
+        self.backend = backend
+        self.limits = limits
+        self.shed_retry_after = shed_retry_after
+        self._in_flight: Dict[str, int] = {name: 0 for name in limits}
+        self.rejections: Dict[tuple, int] = {}
+
+    def in_flight(self, endpoint_class: str) -> int:
+        return self._in_flight[endpoint_class]
+
+    @asynccontextmanager
+    async def admit(self, user_id: int, endpoint_class: str, cost: int = 1):
+        """Hold an admission for the duration of the block, or raise 429/503.
+
+        The in-flight slot is claimed before the rate token, so a request
+        shed with 503 leaves its user's bucket untouched.
+        """
+        limits = self.limits[endpoint_class]
+        if 0 < limits.max_in_flight <= self._in_flight[endpoint_class]:
+            self._reject(endpoint_class, "shed")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again shortly",
+                headers={"Retry-After": str(math.ceil(self.shed_retry_after))},
+            )
+        self._in_flight[endpoint_class] += 1
+        try:
+            if limits.rate_per_second > 0:
+                cost = max(1, cost)
+                if cost > limits.burst:
+                    self._reject(endpoint_class, "too_large")
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Request exceeds the rate limit burst of {limits.burst}",
+                    )
+                wait = await self.backend.take(
+                    f"{endpoint_class}:{user_id}", limits.rate_per_second, limits.burst, cost
+                )
+                if wait > 0:
+                    self._reject(endpoint_class, "rate_limited")
+                    raise HTTPException(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        detail="Rate limit exceeded",
+                        headers={"Retry-After": str(math.ceil(wait))},
+                    )
+            yield
+        finally:
+            self._in_flight[endpoint_class] -= 1
+
+    def stats(self) -> Dict[tuple, int]:
+        """Rejections so far keyed by (endpoint class, reason)."""
+        return dict(self.rejections)
+
+    async def reset(self) -> None:
+        await self.backend.clear()
+        self.rejections.clear()
+
+    def _reject(self, endpoint_class: str, reason: str) -> None:
+        key = (endpoint_class, reason)
+        self.rejections[key] = self.rejections.get(key, 0) + 1
+
+
+def limits_from_settings() -> Dict[str, ClassLimits]:
+    return {
+        SEARCH: ClassLimits(
+            settings.rate_limit_search_per_minute / 60,
+            settings.rate_limit_search_burst,
+            settings.admission_max_in_flight_search,
+        ),
+        IMAGE: ClassLimits(
+            settings.rate_limit_image_per_minute / 60,
+            settings.rate_limit_image_burst,
+            settings.admission_max_in_flight_image,
+        ),
+    }
+
+
+_BACKENDS: Dict[str, Callable[[], RateLimitBackend]] = {
+    "memory": MemoryRateLimitBackend,
+    "redis": _redis_backend,
+}
+_controller: Optional[AdmissionController] = None
+
+
+def register_rate_limit_backend(name: str, factory: Callable[[], RateLimitBackend]) -> None:
+    """Make another backend selectable through ``RATE_LIMIT_BACKEND``."""
+    _BACKENDS[name] = factory
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        try:
+            factory = _BACKENDS[settings.rate_limit_backend]
+        except KeyError:
+            raise ValueError(f"Unknown rate limit backend '{settings.rate_limit_backend}'")
+        _controller = AdmissionController(
+            factory(), limits_from_settings(), settings.admission_shed_retry_after_seconds
+        )
+    return _controller
+
+
+def admission(endpoint_class: str, cost: Optional[Callable[[Any], int]] = None):
+    """Route dependency admitting the current user to ``endpoint_class``.
+
+    ``cost`` maps the JSON request body to the number of tokens to take
+    (one by default), e.g. the number of searches in a batch. Bodies it
+    cannot price are let through uncharged; they fail request validation,
+    so the endpoint never runs.
+    """
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        amount = 1
+        if cost is not None:
+            try:
+                amount = cost(await request.json())
+            except (ValueError, TypeError, KeyError, AttributeError):
+                yield
+                return
+        async with get_admission_controller().admit(current_user.id, endpoint_class, amount):
+            yield
+
+    return dependency
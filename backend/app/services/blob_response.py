@@ -0,0 +1,125 @@
+"""HTTP response that streams a stored blob with Range support.
+
+When the ASGI server advertises the ``http.response.zerocopysend`` extension
+and the blob lives on the local filesystem, the body is handed to the server
+as a file descriptor so the kernel copies it (``sendfile``). Otherwise the file
+is read in chunks on a worker thread.
+"""
+from typing import Optional, Tuple
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.services.blob_store import BlobStore
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive offsets.
+
+    Returns None for a missing or multi-range header (served as a full 200)
+    and raises RangeNotSatisfiable for ranges outside the blob.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class BlobResponse(Response):
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        store: BlobStore,
+        digest: str,
+        size: int,
+        media_type: str,
+        range_header: Optional[str] = None,
+        send_body: bool = True,
+    ):
+        self.store = store
+        self.digest = digest
+        self.send_body = send_body
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+
+        headers = {
+            "etag": f'"{digest}"',
+            "cache-control": CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        }
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self.start, self.end = 0, -1
+            self.status_code = 416
+            self.send_body = False
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+
+        if self.status_code != 416:
+            self.start, self.end = byte_range or (0, size - 1)
+            if byte_range is not None:
+                self.status_code = 206
+                headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+            headers["content-length"] = str(max(0, self.end - self.start + 1))
+
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        length = self.end - self.start + 1 if self.send_body else 0
+        if length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        path = self.store.local_path(self.digest)
+        if path and ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            f = await anyio.to_thread.run_sync(open, path, "rb")
+            try:
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": f,
+                    "offset": self.start,
+                    "count": length,
+                    "more_body": False,
+                })
+            finally:
+                await anyio.to_thread.run_sync(f.close)
+            return
+
+        chunks = self.store.iter_range(self.digest, self.start, self.end, self.chunk_size)
+        done = object()
+        try:
+            while True:
+                chunk = await anyio.to_thread.run_sync(next, chunks, done)
+                if chunk is done:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            chunks.close()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,139 @@
+"""Content-addressed storage for generated images.
+
+Blobs are addressed by the SHA-256 of their bytes, so identical images are
+stored once no matter how many history rows point at them. The local backend
+shards files as ``<root>/ab/cd/<digest>``; other backends (object stores) plug
+in by subclassing ``BlobStore`` and registering a factory.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+from app.core.config import settings
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Magic numbers for the image formats providers return
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_mime(data: bytes) -> str:
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def is_digest(value: str) -> bool:
+    return bool(DIGEST_RE.match(value))
+
+
+@dataclass(frozen=True)
+class BlobInfo:
+    digest: str
+    size: int
+    mime_type: str
+
+
+class BlobStore(ABC):
+    """Interface every blob backend implements."""
+
+    @abstractmethod
+    def put(self, data: bytes, mime_type: Optional[str] = None) -> BlobInfo:
+        """Store ``data`` (a no-op if it already exists) and describe it."""
+
+    @abstractmethod
+    def size(self, digest: str) -> Optional[int]:
+        """Size in bytes, or None if the blob does not exist."""
+
+    @abstractmethod
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield the bytes in ``[start, end]`` (inclusive)."""
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path for zero-copy serving; None for remote backends."""
+        return None
+
+    def read(self, digest: str) -> bytes:
+        size = self.size(digest)
+        if size is None:
+            raise FileNotFoundError(digest)
+        return b"".join(self.iter_range(digest, 0, size - 1)) if size else b""
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data: bytes, mime_type: Optional[str] = None) -> BlobInfo:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temp file and rename so readers never see partial blobs
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return BlobInfo(digest=digest, size=len(data), mime_type=mime_type or sniff_mime(data))
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path_for(digest))
+        except FileNotFoundError:
+            return None
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self.path_for(digest), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self.path_for(digest)
+
+
+_BACKENDS: Dict[str, Callable[[], BlobStore]] = {
+    "local": lambda: LocalBlobStore(settings.blob_store_path),
+}
+_store: Optional[BlobStore] = None
+
+
+def register_blob_store(name: str, factory: Callable[[], BlobStore]) -> None:
+    """Make another backend selectable through ``BLOB_STORE_BACKEND``."""
+    _BACKENDS[name] = factory
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        try:
+            factory = _BACKENDS[settings.blob_store_backend]
+        except KeyError:
+            raise ValueError(f"Unknown blob store backend '{settings.blob_store_backend}'")
+        _store = factory()
+    return _store
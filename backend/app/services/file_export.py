@@ -1,80 +1,159 @@
 import csv
 import io
-from typing import Dict, Any
-from sqlalchemy.orm import Session
-from app.db.crud import get_user_search_history, get_user_image_history
+from typing import Any, AsyncIterator, Callable, List
+from sqlalchemy import desc, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.db.crud import results_count_expr
+from app.db.models import ImageHistory, SearchHistory
+from app.services.pdf_writer import PdfWriter
 from datetime import datetime
 
-async def export_to_csv(db: Session, user_id: int, data_type: str = "all") -> str:
-    """Export user data to CSV format."""
+# Rows fetched per server-side cursor round-trip and bytes buffered per chunk
+EXPORT_FETCH_ROWS = 1000
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+def _search_export_query(dialect_name: str, user_id: int):
+    return (
+        select(
+            SearchHistory.id,
+            SearchHistory.query,
+            results_count_expr(dialect_name).label("results_count"),
+            SearchHistory.created_at,
+        )
+        .where(SearchHistory.user_id == user_id)
+        .order_by(desc(SearchHistory.created_at), desc(SearchHistory.id))
+        .execution_options(yield_per=EXPORT_FETCH_ROWS)
+    )
+
+def _image_export_query(user_id: int):
+    has_image = or_(
+        ImageHistory.image_url.isnot(None),
+        ImageHistory.image_digest.isnot(None),
+        ImageHistory.image_data.isnot(None),
+    )
+    return (
+        select(
+            ImageHistory.id,
+            ImageHistory.prompt,
+            has_image.label("has_image"),
+            ImageHistory.created_at,
+        )
+        .where(ImageHistory.user_id == user_id)
+        .order_by(desc(ImageHistory.created_at), desc(ImageHistory.id))
+        .execution_options(yield_per=EXPORT_FETCH_ROWS)
+    )
+
+async def export_to_csv(db: AsyncSession, user_id: int, data_type: str = "all") -> AsyncIterator[str]:
+    """Stream user data as CSV chunks.
+
+    Rows come from a server-side cursor and only the exported columns are
+    selected, so memory stays flat regardless of the export size. The session
+    must stay open until the generator is exhausted.
+    """
     output = io.StringIO()
     writer = csv.writer(output)
 
+    def take() -> str:
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return chunk
+
+    sections = []
     if data_type in ["all", "searches"]:
-        # Export search history
-        searches = get_user_search_history(db, user_id, limit=1000)
-
-        if searches:
-            writer.writerow(["Search History"])
-            writer.writerow(["ID", "Query", "Results Count", "Created At"])
-
-            for search in searches:
-                results_count = len(search.results.get("results", []))
-                writer.writerow([
-                    search.id,
-                    search.query,
-                    results_count,
-                    search.created_at.isoformat()
-                ])
+        sections.append((
+            ["Search History"],
+            ["ID", "Query", "Results Count", "Created At"],
+            _search_export_query(db.bind.dialect.name, user_id),
+            lambda r: [r.id, r.query, r.results_count, r.created_at.isoformat()],
+        ))
+    if data_type in ["all", "images"]:
+        sections.append((
+            ["Image Generation History"],
+            ["ID", "Prompt", "Has Image", "Created At"],
+            _image_export_query(user_id),
+            lambda r: [r.id, r.prompt, bool(r.has_image), r.created_at.isoformat()],
+        ))
+
+    for title, header, stmt, format_row in sections:
+        result = await db.stream(stmt)
+        wrote_header = False
+        async for row in result:
+            if not wrote_header:
+                writer.writerow(title)
+                writer.writerow(header)
+                wrote_header = True
+            writer.writerow(format_row(row))
+            if output.tell() >= EXPORT_FLUSH_BYTES:
+                yield take()
+        if wrote_header:
             writer.writerow([])  # Empty row separator
 
-    if data_type in ["all", "images"]:
-        # Export image history
-        images = get_user_image_history(db, user_id, limit=1000)
+    chunk = take()
+    if chunk:
+        yield chunk
 
-        if images:
-            writer.writerow(["Image Generation History"])
-            writer.writerow(["ID", "Prompt", "Has Image", "Created At"])
+def _search_pdf_lines(row) -> List[str]:
+    return [
+        f"Query: {row.query}",
+        f"Date: {row.created_at.isoformat()}",
+        f"Results: {row.results_count}",
+        "-" * 30,
+        "",
+    ]
 
-            for image in images:
-                has_image = bool(image.image_url or image.image_data)
-                writer.writerow([
-                    image.id,
-                    image.prompt,
-                    has_image,
-                    image.created_at.isoformat()
-                ])
+def _image_pdf_lines(row) -> List[str]:
+    return [
+        f"Prompt: {row.prompt}",
+        f"Date: {row.created_at.isoformat()}",
+        f"Has Image: {bool(row.has_image)}",
+        "-" * 30,
+        "",
+    ]
 
-    csv_content = output.getvalue()
-    output.close()
-    return csv_content
+def _render_pdf_rows(writer: PdfWriter, rows, format_lines: Callable[[Any], List[str]]) -> bytes:
+    for row in rows:
+        for line in format_lines(row):
+            writer.write_line(line)
+    return writer.take()
 
-async def export_to_pdf(db: Session, user_id: int, data_type: str = "all") -> bytes:
-    """Export user data to PDF format."""
-    # For simplicity, we'll create a text-based PDF
-    # In a real implementation, you'd use libraries like reportlab
+def _render_pdf_heading(writer: PdfWriter, heading: str) -> bytes:
+    writer.write_line(heading)
+    writer.write_line("=" * 50)
+    writer.write_line()
+    return writer.take()
 
-    content = f"MindCanvas Data Export\nGenerated: {datetime.now().isoformat()}\n\n"
+def _finish_pdf(writer: PdfWriter) -> bytes:
+    writer.close()
+    return writer.take()
 
-    if data_type in ["all", "searches"]:
-        searches = get_user_search_history(db, user_id, limit=1000)
-        content += "SEARCH HISTORY\n" + "=" * 50 + "\n\n"
+async def export_to_pdf(db: AsyncSession, user_id: int, data_type: str = "all") -> AsyncIterator[bytes]:
+    """Stream user data as a PDF document.
 
-        for search in searches:
-            content += f"Query: {search.query}\n"
-            content += f"Date: {search.created_at.isoformat()}\n"
-            content += f"Results: {len(search.results.get('results', []))}\n"
-            content += "-" * 30 + "\n\n"
+    Rows are read from a server-side cursor in ``EXPORT_FETCH_ROWS`` batches
+    and laid out on a worker thread; finished pages are yielded as they fill,
+    so memory depends on the page size rather than the export size.
+    """
+    writer = PdfWriter(title="MindCanvas Data Export")
+    writer.write_line("MindCanvas Data Export")
+    writer.write_line(f"Generated: {datetime.now().isoformat()}")
+    writer.write_line()
 
+    sections = []
+    if data_type in ["all", "searches"]:
+        sections.append(("SEARCH HISTORY", _search_export_query(db.bind.dialect.name, user_id), _search_pdf_lines))
     if data_type in ["all", "images"]:
-        images = get_user_image_history(db, user_id, limit=1000)
-        content += "IMAGE GENERATION HISTORY\n" + "=" * 50 + "\n\n"
+        sections.append(("IMAGE GENERATION HISTORY", _image_export_query(user_id), _image_pdf_lines))
 
-        for image in images:
-            content += f"Prompt: {image.prompt}\n"
-            content += f"Date: {image.created_at.isoformat()}\n"
-            content += f"Has Image: {bool(image.image_url or image.image_data)}\n"
-            content += "-" * 30 + "\n\n"
+    for heading, stmt, format_lines in sections:
+        chunk = await run_in_threadpool(_render_pdf_heading, writer, heading)
+        if chunk:
+            yield chunk
+        result = await db.stream(stmt)
+        async for rows in result.partitions(EXPORT_FETCH_ROWS):
+            chunk = await run_in_threadpool(_render_pdf_rows, writer, rows, format_lines)
+            if chunk:
+                yield chunk
 
-    # Convert to bytes (mock PDF)
-    return content.encode('utf-8')
\ No newline at end of file
+    yield await run_in_threadpool(_finish_pdf, writer)
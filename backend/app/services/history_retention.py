@@ -0,0 +1,120 @@
+"""Background enforcement of the search and image history retention policy.
+
+``history_retention_days`` and ``history_retention_max_rows`` (per user)
+bound how much history is kept; 0 leaves that limit off, and the task does
+not start when both are off. Every ``history_retention_interval_seconds``
+it deletes out-of-policy rows ``history_retention_batch_size`` at a time,
+one transaction per batch. Lock hold times therefore stay short however
+large the backlog is. The per-user row limit first finds the users over
+it, then deletes each one's oldest rows by ``(created_at, id)`` range on
+the user index, so no batch sorts the whole table. Rollups and ETag versions are adjusted with each
+batch (see ``crud.delete_history_rows``). Result documents no search links
+to any more, after these or any other deletes, go at the end of each run.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+from app.db import crud, result_documents
+from app.db.database import AsyncSessionLocal
+from app.db.models import ImageHistory, SearchHistory, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryRetention:
+    def __init__(
+        self,
+        keep_days: int,
+        keep_rows: int,
+        interval_seconds: float,
+        batch_size: int,
+        session_factory: Callable = AsyncSessionLocal,
+    ):
+        self.keep_days = keep_days
+        self.keep_rows = keep_rows
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self.purged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.keep_days > 0 or self.keep_rows > 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.enabled and not self.running:
+            self._task = asyncio.create_task(self._run(), name="history-retention")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def purge_once(self) -> Dict[str, int]:
+        """Delete every out-of-policy row, one batch per transaction, then
+        the orphaned result documents."""
+        older_than = utcnow() - timedelta(days=self.keep_days) if self.keep_days > 0 else None
+        keep_rows = self.keep_rows if self.keep_rows > 0 else None
+        counts = {}
+        async with self.session_factory() as db:
+            for name, model in (("searches", SearchHistory), ("images", ImageHistory)):
+                total = 0
+                if older_than is not None:
+                    total += await self._drain(
+                        lambda: crud.purge_history_batch(db, model, self.batch_size, older_than)
+                    )
+                if keep_rows is not None:
+                    cutoffs = await crud.history_row_limit_cutoffs(db, model, keep_rows)
+                    # Release the read transaction before deleting
+                    await db.commit()
+                    for user_id, cutoff in cutoffs.items():
+                        total += await self._drain(
+                            lambda: crud.purge_user_history_batch(db, model, self.batch_size, user_id, cutoff)
+                        )
+                counts[name] = total
+            counts["documents"] = await self._drain(
+                lambda: result_documents.purge_orphans(db, self.batch_size)
+            )
+        self.purged += counts["searches"] + counts["images"]
+        return counts
+
+    async def _drain(self, purge_batch: Callable[[], Awaitable[int]]) -> int:
+        """Run ``purge_batch`` until a batch comes back short; returns the total."""
+        total = 0
+        while True:
+            deleted = await purge_batch()
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+            # Let request handlers in between batches
+            await asyncio.sleep(0)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                counts = await self.purge_once()
+                if any(counts.values()):
+                    logger.info(
+                        "Retention removed %d searches, %d images and %d result documents",
+                        counts["searches"], counts["images"], counts["documents"],
+                    )
+            except Exception:
+                logger.exception("History retention purge failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+history_retention = HistoryRetention(
+    keep_days=settings.history_retention_days,
+    keep_rows=settings.history_retention_max_rows,
+    interval_seconds=settings.history_retention_interval_seconds,
+    batch_size=settings.history_retention_batch_size,
+)
@@ -0,0 +1,224 @@
+"""Optional write-behind buffering for history inserts.
+
+With ``HISTORY_WRITE_BEHIND`` enabled, search and image history rows are put
+on a bounded in-process queue instead of being committed on the request path.
+A background task started in the app lifespan flushes them with one
+multi-row INSERT per table every ``history_write_behind_flush_ms`` or
+``history_write_behind_flush_rows`` rows, whichever comes first, and the
+lifespan drains the queue on shutdown.
+
+Rows become visible in history listings after the next flush (milliseconds
+later), and rows still queued are lost if the process is killed outright.
+When the queue stays full for ``history_write_behind_put_timeout_seconds``
+the caller writes its row directly instead, so a slow database pushes back
+on request latency rather than growing memory.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core import metrics
+from app.core.config import settings
+from app.db import crud
+from app.db.database import AsyncSessionLocal
+from app.db.models import ImageHistory, SearchHistory, utcnow
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+FLUSH_ATTEMPTS = 3
+
+
+class HistoryWriter:
+    def __init__(
+        self,
+        max_queue: int,
+        flush_rows: int,
+        flush_interval_ms: int,
+        put_timeout_seconds: float,
+        session_factory: Callable = AsyncSessionLocal,
+    ):
+        self.max_queue = max_queue
+        self.flush_rows = flush_rows
+        self.flush_interval_ms = flush_interval_ms
+        self.put_timeout_seconds = put_timeout_seconds
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Rows accepted but not yet committed (queued or in the current batch)
+        self._unflushed = 0
+
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.overflow_writes = 0
+        self.dropped_rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def depth(self) -> int:
+        return self._unflushed
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.depth,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "flush_seconds_total": round(self.flush_seconds_total, 6),
+            "flush_seconds_max": round(self.flush_seconds_max, 6),
+            "overflow_writes": self.overflow_writes,
+            "dropped_rows": self.dropped_rows,
+        }
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="history-writer")
+
+    async def stop(self) -> None:
+        """Flush everything queued so far, then stop the background task."""
+        if not self.running:
+            return
+        task, queue = self._task, self._queue
+        # New records take the direct path from here on
+        self._task = None
+        await queue.put(_STOP)
+        await task
+        # Producers that were blocked on a full queue may have landed behind
+        # the sentinel
+        leftover = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            await self._flush(leftover)
+        self._queue = None
+
+    async def record_search(
+        self, db, user_id: int, query: str, results: dict, meta_data: dict = None
+    ) -> None:
+        values = {
+            "user_id": user_id,
+            "query": query,
+            "results": results,
+            "meta_data": meta_data or {},
+            "created_at": utcnow(),
+        }
+        if not await self._enqueue(SearchHistory, values):
+            await self._write_direct(db, SearchHistory, values)
+
+    async def record_searches(self, db, user_id: int, entries: List[dict]) -> None:
+        if not self.running:
+            await crud.create_search_history_bulk(db, user_id, entries)
+            return
+        for entry in entries:
+            await self.record_search(db, user_id, **entry)
+
+    async def record_image(
+        self,
+        db,
+        user_id: int,
+        prompt: str,
+        image_url: str = None,
+        image_data: str = None,
+        meta_data: dict = None,
+    ) -> None:
+        if not self.running:
+            await crud.create_image_history(db, user_id, prompt, image_url, image_data, meta_data)
+            return
+        values = await crud.image_history_values(user_id, prompt, image_url, image_data, meta_data)
+        values["created_at"] = utcnow()
+        if not await self._enqueue(ImageHistory, values):
+            await self._write_direct(db, ImageHistory, values)
+
+    async def _enqueue(self, model, values: dict) -> bool:
+        """Queue a row; False means the caller must write it directly."""
+        if not self.running:
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put((model, values)), self.put_timeout_seconds)
+            self._unflushed += 1
+            return True
+        except asyncio.TimeoutError:
+            self.overflow_writes += 1
+            return False
+
+    @staticmethod
+    async def _write(db, model, rows: List[dict]) -> None:
+        """Insert rows along with their rollup, version and document updates; does not commit."""
+        await crud.insert_history_rows(db, model, rows)
+
+    async def _write_direct(self, db, model, values: dict) -> None:
+        await self._write(db, model, [values])
+        await db.commit()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval_ms / 1000
+            while len(batch) < self.flush_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[type, dict]]) -> None:
+        try:
+            await self._insert(batch)
+        finally:
+            self._unflushed -= len(batch)
+
+    async def _insert(self, batch: List[Tuple[type, dict]]) -> None:
+        by_model: Dict[type, List[dict]] = {}
+        for model, values in batch:
+            by_model.setdefault(model, []).append(values)
+
+        started = time.perf_counter()
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            try:
+                async with self.session_factory() as db:
+                    for model, rows in by_model.items():
+                        await self._write(db, model, rows)
+                    await db.commit()
+                break
+            except Exception:
+                if attempt == FLUSH_ATTEMPTS:
+                    self.dropped_rows += len(batch)
+                    logger.exception("Dropping %d history rows after %d attempts", len(batch), attempt)
+                    return
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.rows_flushed += len(batch)
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+        metrics.history_writer_flush_seconds.observe(elapsed)
+
+
+history_writer = HistoryWriter(
+    max_queue=settings.history_write_behind_max_queue,
+    flush_rows=settings.history_write_behind_flush_rows,
+    flush_interval_ms=settings.history_write_behind_flush_ms,
+    put_timeout_seconds=settings.history_write_behind_put_timeout_seconds,
+)
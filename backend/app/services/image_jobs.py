@@ -0,0 +1,255 @@
+"""Background image generation jobs.
+
+``POST /image/jobs`` records a job row and returns immediately; a fixed pool
+of worker tasks started in the app lifespan runs the provider call, writes the
+``ImageHistory`` row and marks the job finished. Job state lives in the
+``image_jobs`` table, so queued work survives a restart, and progress changes
+are pushed to in-process subscribers (the SSE endpoint), which fall back to
+polling the table for jobs run by another worker process.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.db import crud
+from app.db.database import AsyncSessionLocal
+from app.db.models import utcnow
+from app.services.mcp_client import generate_image
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+# How often a watcher re-reads the job row when no local event arrives
+POLL_SECONDS = 1.0
+
+
+def job_snapshot(job) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "image_history_id": job.image_history_id,
+    }
+
+
+class ImageJobManager:
+    """Bounded worker pool for image generation jobs.
+
+    At most ``workers`` provider calls run at once per process, each user may
+    have ``max_active_per_user`` queued or running jobs, and the in-memory
+    queue holds at most ``max_queue`` job ids before submissions get a 503.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_active_per_user: int,
+        max_queue: int,
+        session_factory: Callable = AsyncSessionLocal,
+    ):
+        self.workers = workers
+        self.max_active_per_user = max_active_per_user
+        self.max_queue = max_queue
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        # Queue slots held by submissions still inserting their job row
+        self._reserved = 0
+        self._tasks: list = []
+        # Jobs being run right now; shielded from worker cancellation
+        self._active: Set[asyncio.Task] = set()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def active_jobs(self) -> int:
+        return len(self._active)
+
+    def _has_room(self) -> bool:
+        return self._queue.qsize() + self._reserved < self.max_queue
+
+    async def start(self) -> None:
+        """Start the workers and requeue jobs left unfinished by a previous run."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"image-job-worker-{n}")
+            for n in range(self.workers)
+        ]
+        stale_before = utcnow() - timedelta(seconds=settings.image_job_stale_seconds)
+        try:
+            async with self.session_factory() as db:
+                pending = await crud.requeue_unfinished_image_jobs(db, stale_before)
+        except Exception:
+            logger.exception("Could not requeue unfinished image jobs")
+            return
+        for job_id in pending:
+            if not self._has_room():
+                # Left queued in the table; the next restart picks them up
+                break
+            self._queue.put_nowait(job_id)
+
+    async def stop(self, grace_seconds: Optional[float] = None) -> None:
+        """Stop taking jobs and give running ones ``grace_seconds`` to finish.
+
+        Jobs still running after that are cancelled and stay "running" in the
+        table until a later start requeues them as stale.
+        """
+        if grace_seconds is None:
+            grace_seconds = settings.image_job_shutdown_grace_seconds
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if self._active:
+            _, unfinished = await asyncio.wait(set(self._active), timeout=grace_seconds)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def submit(self, db, user_id: int, prompt: str, params: dict):
+        """Record a job and queue it; raises 429/503 when over capacity."""
+        if not self.running:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image generation workers are not running",
+            )
+        if not self._has_room():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image generation is busy, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+        # Hold a slot while the row is inserted so other submits cannot fill
+        # the queue in the meantime
+        queue = self._queue
+        self._reserved += 1
+        try:
+            # The cap is checked in the INSERT itself, so concurrent submits
+            # cannot all slip under it
+            job = await crud.create_image_job(db, user_id, prompt, params, max_active=self.max_active_per_user)
+        finally:
+            self._reserved -= 1
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many image jobs in progress",
+                headers={"Retry-After": "5"},
+            )
+        # If the workers stopped meanwhile the job stays queued in the table
+        # for the next start to pick up
+        queue.put_nowait(job.id)
+        return job
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        events: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(events)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    async def watch(self, job_id: str) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's state now and on every change until it finishes.
+
+        Yields None roughly every ``POLL_SECONDS`` while nothing changes, so
+        callers can send keep-alives.
+        """
+        events = self.subscribe(job_id)
+        try:
+            last = None
+            while True:
+                snapshot = None
+                if last is not None:
+                    try:
+                        snapshot = await asyncio.wait_for(events.get(), timeout=POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                if snapshot is None:
+                    # Jobs run by another worker process only show up in the table
+                    async with self.session_factory() as db:
+                        job = await crud.get_image_job(db, job_id)
+                    if job is None:
+                        return
+                    snapshot = job_snapshot(job)
+                if snapshot == last:
+                    yield None
+                    continue
+                last = snapshot
+                yield snapshot
+                if snapshot["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            self.unsubscribe(job_id, events)
+
+    async def _update(self, db, job_id: str, **values) -> None:
+        await crud.update_image_job(db, job_id, **values)
+        job = await crud.get_image_job(db, job_id)
+        snapshot = job_snapshot(job)
+        for events in self._subscribers.get(job_id, ()):
+            events.put_nowait(snapshot)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            task = asyncio.create_task(self._run(job_id))
+            self._active.add(task)
+            task.add_done_callback(self._active.discard)
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Image job %s crashed", job_id)
+
+    async def _run(self, job_id: str) -> None:
+        async with self.session_factory() as db:
+            if not await crud.claim_image_job(db, job_id):
+                return
+            await self._update(db, job_id, progress=5)
+            job = await crud.get_image_job(db, job_id)
+            params = job.params or {}
+            try:
+                result = await generate_image(prompt=job.prompt, **params)
+                await self._update(db, job_id, progress=80)
+                image = await crud.create_image_history(
+                    db=db,
+                    user_id=job.user_id,
+                    prompt=job.prompt,
+                    image_url=result.get("image_url"),
+                    image_data=result.get("image_data"),
+                    meta_data=params,
+                )
+            except Exception as e:
+                await db.rollback()
+                logger.warning("Image job %s failed: %s", job_id, e)
+                await self._update(
+                    db, job_id, status="failed", error=str(e), finished_at=utcnow()
+                )
+                return
+            await self._update(
+                db,
+                job_id,
+                status="succeeded",
+                progress=100,
+                image_history_id=image.id,
+                finished_at=utcnow(),
+            )
+
+
+image_job_manager = ImageJobManager(
+    workers=settings.image_job_workers,
+    max_active_per_user=settings.image_job_max_active_per_user,
+    max_queue=settings.image_job_max_queue,
+)
@@ -1,15 +1,27 @@
-import httpx
-import json
-import base64
 from typing import Dict, Any, List
 from app.core.config import settings
+from app.core.metrics import observe_provider
+from app.services.provider_clients import provider_clients
+from app.services.search_cache import get_search_cache
 
-# Mock MCP client - replace with actual MCP client implementation
 async def search_web(query: str, max_results: int = 10) -> Dict[str, Any]:
+    """
+    Search the web, answering repeated searches from the result cache.
+    """
+    return await get_search_cache().get_or_fetch(query, max_results, fetch_search_results)
+
+# Mock MCP client - replace with actual MCP client implementation
+async def fetch_search_results(query: str, max_results: int = 10) -> Dict[str, Any]:
     """
     Search web using Tavily MCP server.
-    This is a mock implementation - replace with actual MCP client.
+    Falls back to mock results when no search MCP URL is configured.
     """
+    if provider_clients.configured("search"):
+        async with observe_provider("search"):
+            return await provider_clients.call_tool(
+                "search", "search", {"query": query, "max_results": max_results}
+            )
+
     # Mock response for development
     mock_results = [
         {
@@ -40,8 +52,16 @@ async def generate_image(
 ) -> Dict[str, Any]:
     """
     Generate image using Flux ImageGen MCP server.
-    This is a mock implementation - replace with actual MCP client.
+    Falls back to a mock image when no image MCP URL is configured.
     """
+    if provider_clients.configured("image"):
+        async with observe_provider("image"):
+            return await provider_clients.call_tool(
+                "image",
+                "generate_image",
+                {"prompt": prompt, "width": width, "height": height, "steps": steps},
+            )
+
     # Create a simple mock base64 image (1x1 pixel PNG)
     mock_image_data = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
 
@@ -0,0 +1,154 @@
+"""Minimal streaming PDF writer for text exports.
+
+Objects are serialized as soon as they are complete: each page's content
+stream and page dictionary are emitted when the page fills up, and only the
+byte offsets needed for the cross-reference table are kept until ``close()``
+writes the page tree, xref and trailer. Apart from those offsets (a few bytes
+per page) memory depends on the page size, not on the number of pages.
+
+Text uses the standard Helvetica font with WinAnsiEncoding, so no font data is
+embedded; characters outside cp1252 are replaced.
+"""
+import textwrap
+import zlib
+from array import array
+from typing import List, Optional
+
+# Object numbers reserved for the fixed objects; pages start after them
+_CATALOG, _PAGES, _FONT, _INFO = 1, 2, 3, 4
+_FIRST_PAGE_OBJECT = 5
+
+
+def _escape(text: str) -> bytes:
+    data = text.encode("cp1252", errors="replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class PdfWriter:
+    """Write a text document page by page.
+
+    Call ``write_line`` for every line, ``take`` to collect the bytes produced
+    so far, and ``close`` once at the end to emit the trailer.
+    """
+
+    def __init__(
+        self,
+        title: Optional[str] = None,
+        page_width: int = 612,
+        page_height: int = 792,
+        margin: int = 50,
+        font_size: float = 9,
+        leading: float = 12,
+    ):
+        self.page_width = page_width
+        self.page_height = page_height
+        self.margin = margin
+        self.font_size = font_size
+        self.leading = leading
+        self.lines_per_page = max(1, int((page_height - 2 * margin) // leading))
+        # Helvetica averages a little over half an em per character
+        self.wrap_width = max(10, int((page_width - 2 * margin) / (font_size * 0.55)))
+
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self._offsets = array("q", [0] * (_FIRST_PAGE_OBJECT - 1))
+        self._page_objects = array("q")
+        self._page_lines: List[bytes] = []
+        self._closed = False
+
+        self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(_CATALOG, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(
+            _FONT,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        )
+        info = b"<< /Producer (MindCanvas)"
+        if title:
+            info += b" /Title (" + _escape(title) + b")"
+        self._write_object(_INFO, info + b" >>")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_objects)
+
+    def write_line(self, text: str = "") -> None:
+        """Add a line of text, wrapping it to the page width."""
+        lines = textwrap.wrap(text, self.wrap_width) if len(text) > self.wrap_width else (text,)
+        for line in lines:
+            self._page_lines.append(_escape(line))
+            if len(self._page_lines) >= self.lines_per_page:
+                self._flush_page()
+
+    def take(self) -> bytes:
+        """Return (and forget) the bytes written since the last call."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+    def close(self) -> None:
+        """Finish the last page and write the page tree, xref and trailer."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._page_lines or not self._page_objects:
+            self._flush_page()
+
+        kids = bytearray()
+        for number in self._page_objects:
+            kids += b"%d 0 R " % number
+        self._write_object(
+            _PAGES,
+            b"<< /Type /Pages /Kids [" + bytes(kids) + b"] /Count %d >>" % len(self._page_objects),
+        )
+
+        xref_offset = self._position
+        self._emit(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        entries = bytearray()
+        for offset in self._offsets:
+            entries += b"%010d 00000 n \n" % offset
+        self._emit(entries)
+        self._emit(
+            b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets) + 1, xref_offset)
+        )
+
+    def _emit(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self._position += len(data)
+
+    def _write_object(self, number: int, body: bytes) -> None:
+        if number > len(self._offsets):
+            self._offsets.append(self._position)
+        else:
+            self._offsets[number - 1] = self._position
+        self._emit(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def _write_stream(self, number: int, data: bytes) -> None:
+        compressed = zlib.compress(data, 6)
+        self._write_object(
+            number,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(compressed)
+            + compressed
+            + b"\nendstream",
+        )
+
+    def _flush_page(self) -> None:
+        # The ' operator advances one line before drawing, so start at the margin
+        top = self.page_height - self.margin
+        content = [
+            b"BT\n/F1 %g Tf\n%g TL\n%g %g Td\n" % (self.font_size, self.leading, self.margin, top)
+        ]
+        content.extend(b"(" + line + b") '\n" for line in self._page_lines)
+        content.append(b"ET\n")
+        self._page_lines.clear()
+
+        content_number = len(self._offsets) + 1
+        page_number = content_number + 1
+        self._write_stream(content_number, b"".join(content))
+        self._write_object(
+            page_number,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (self.page_width, self.page_height, content_number),
+        )
+        self._page_objects.append(page_number)
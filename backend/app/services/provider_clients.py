@@ -0,0 +1,170 @@
+"""Long-lived HTTP clients for the MCP providers.
+
+One ``httpx.AsyncClient`` per configured provider is opened in the app
+lifespan and closed on shutdown, so calls reuse pooled keep-alive connections
+(and HTTP/2, from the ``httpx[http2]`` extra) instead of paying a TCP and
+TLS handshake each time. Providers without a configured URL have no client and
+``app.services.mcp_client`` falls back to its mock responses.
+
+Calls use MCP's JSON-RPC ``tools/call`` over streamable HTTP; servers may
+answer with a JSON body or a ``text/event-stream`` carrying the response
+message. Anything else fails with ``ProviderError``. httpx is
+imported when the first client is built, so processes with no provider
+configured never load it.
+"""
+import asyncio
+import importlib.util
+import itertools
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class ProviderError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    name: str
+    url: Optional[str]
+    token: Optional[str]
+
+
+def provider_configs() -> Dict[str, ProviderConfig]:
+    return {
+        "search": ProviderConfig("search", settings.search_mcp_url, settings.tavily_api_key),
+        "image": ProviderConfig("image", settings.image_mcp_url, settings.replicate_api_token),
+    }
+
+
+def http2_available() -> bool:
+    """``h2`` ships with the ``httpx[http2]`` requirement; checked so a
+    bare httpx install still works, over HTTP/1.1."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _event_stream_messages(text: str) -> list:
+    """JSON ``data`` payloads of the events in an SSE body."""
+    messages = []
+    for event in text.replace("\r\n", "\n").split("\n\n"):
+        data = [
+            line[5:].lstrip(" ") for line in event.split("\n") if line.startswith("data:")
+        ]
+        if data:
+            messages.append(json.loads("\n".join(data)))
+    return messages
+
+
+def _rpc_response(response: "httpx.Response", request_id: int) -> Any:
+    """The JSON-RPC response to ``request_id`` carried by ``response``."""
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        for message in _event_stream_messages(response.text):
+            if isinstance(message, dict) and message.get("id") == request_id:
+                return message
+        raise ValueError("no response message in the event stream")
+    return response.json()
+
+
+def _tool_output(name: str, body: Any) -> Dict[str, Any]:
+    if not isinstance(body, dict):
+        raise ValueError("response is not a JSON-RPC message")
+    error = body.get("error")
+    if error is not None:
+        message = error.get("message") if isinstance(error, dict) else error
+        raise ProviderError(f"{name} provider error: {message}")
+    result = body.get("result") or {}
+    if result.get("isError"):
+        raise ProviderError(f"{name} provider tool error")
+    if "structuredContent" in result:
+        output = result["structuredContent"]
+    else:
+        texts = [item["text"] for item in result.get("content", []) if item.get("type") == "text"]
+        if not texts:
+            raise ProviderError(f"{name} provider returned no content")
+        output = json.loads(texts[0])
+    if not isinstance(output, dict):
+        raise ValueError("tool output is not an object")
+    return output
+
+
+class ProviderClients:
+    """Owns the per-provider clients; ``start``/``aclose`` run in the lifespan."""
+
+    def __init__(self):
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
+        self._ids = itertools.count(1)
+
+    def build_client(self, config: ProviderConfig) -> "httpx.AsyncClient":
+        import httpx
+
+        headers = {"Accept": "application/json, text/event-stream"}
+        if config.token:
+            headers["Authorization"] = f"Bearer {config.token}"
+        return httpx.AsyncClient(
+            headers=headers,
+            http2=settings.provider_http2 and http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.provider_max_connections,
+                max_keepalive_connections=settings.provider_max_keepalive_connections,
+                keepalive_expiry=settings.provider_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(
+                settings.provider_read_timeout_seconds,
+                connect=settings.provider_connect_timeout_seconds,
+                pool=settings.provider_connect_timeout_seconds,
+            ),
+        )
+
+    async def start(self) -> None:
+        for name, config in provider_configs().items():
+            if config.url and name not in self._clients:
+                self._clients[name] = self.build_client(config)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+    def get(self, name: str) -> Optional["httpx.AsyncClient"]:
+        return self._clients.get(name)
+
+    def configured(self, name: str) -> bool:
+        return bool(provider_configs()[name].url)
+
+    async def call_tool(self, name: str, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Invoke an MCP tool and return its structured result.
+
+        The whole exchange is bounded by ``provider_total_timeout_seconds`` on
+        top of the per-phase connect/read timeouts.
+        """
+        client = self.get(name)
+        if client is None:
+            raise ProviderError(f"Provider '{name}' is not started")
+        import httpx
+
+        url = provider_configs()[name].url
+        payload = {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": "tools/call",
+            "params": {"name": tool, "arguments": arguments},
+        }
+        try:
+            response = await asyncio.wait_for(
+                client.post(url, json=payload), timeout=settings.provider_total_timeout_seconds
+            )
+            response.raise_for_status()
+        except (asyncio.TimeoutError, httpx.HTTPError) as e:
+            raise ProviderError(f"{name} provider request failed: {e!r}") from e
+
+        try:
+            return _tool_output(name, _rpc_response(response, payload["id"]))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ProviderError(f"{name} provider returned a malformed response: {e!r}") from e
+
+
+provider_clients = ProviderClients()
@@ -0,0 +1,250 @@
+"""Cache for web search results.
+
+Keys are built from the normalized query (Unicode NFKC, case-folded,
+whitespace collapsed) and ``max_results``, so trivially different spellings of
+the same search share an entry across users. Values are the provider response
+serialized as JSON bytes.
+
+Two backends ship: ``memory`` (per process, TTL plus LRU eviction under a
+byte budget) and ``redis`` (shared between workers; any client exposing the
+async ``get``/``set(..., ex=)`` subset of ``redis.asyncio.Redis`` can stand in
+for it). Concurrent misses for the same key are coalesced so only one provider
+call per key is in flight in a process; if that call is cancelled, a waiting
+caller takes it over.
+
+The cache fails open: a backend error is logged and counted, and the search
+goes to the provider (or its result is returned unstored) as if the entry
+were missing.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def cache_key(query: str, max_results: int) -> str:
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"search:v1:{max_results}:{digest}"
+
+
+class CacheBackend(ABC):
+    """Storage for serialized search responses."""
+
+    evictions = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the stored value, or None when missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        """Store ``value`` for ``ttl_seconds``."""
+
+    async def clear(self) -> None:
+        """Drop every entry (used by tests and admin tooling)."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process TTL cache that evicts least recently used entries once the
+    stored keys and values exceed ``max_bytes``."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._discard(key)
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl_seconds)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(key) + len(entry[0])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared cache for multi-worker deployments; Redis handles TTL and
+    eviction (configure ``maxmemory-policy allkeys-lru`` on the server)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self.client.set(key, value, ex=max(1, int(ttl_seconds)))
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match="search:v1:*"):
+            await self.client.delete(key)
+
+
+def _redis_backend() -> CacheBackend:
+    try:
+        from redis import asyncio as redis
+    except ImportError:
+        raise ValueError("The 'redis' search cache backend requires the redis package")
+    if not settings.search_cache_url:
+        raise ValueError("SEARCH_CACHE_URL must be set for the 'redis' search cache backend")
+    return RedisCacheBackend(redis.from_url(settings.search_cache_url))
+
+
+class SearchCache:
+    """Read-through cache with single-flight coalescing of concurrent misses."""
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.backend_errors = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_or_fetch(
+        self,
+        query: str,
+        max_results: int,
+        fetch: Callable[[str, int], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Return the cached response for this search or call ``fetch`` once.
+
+        ``meta_data.cached`` is True when the caller did not trigger the
+        provider call itself (a stored entry or a coalesced in-flight one).
+        """
+        key = cache_key(query, max_results)
+        stored = await self._backend_get(key)
+        if stored is not None:
+            self.hits += 1
+            return self._decode(stored, query, cached=True)
+
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return self._decode(await asyncio.shield(inflight), query, cached=True)
+            except asyncio.CancelledError:
+                # Only the call this caller waited on was cancelled (its own
+                # client went away): take over instead of failing too
+                task = asyncio.current_task()
+                if not inflight.cancelled() or (task is not None and task.cancelling()):
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch(query, max_results)
+            encoded = json.dumps(result, separators=(",", ":")).encode("utf-8")
+            await self._backend_set(key, encoded)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure is not logged as lost
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(encoded)
+        finally:
+            self._inflight.pop(key, None)
+        return self._decode(encoded, query, cached=False)
+
+    async def _backend_get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.backend.get(key)
+        except Exception:
+            self.backend_errors += 1
+            logger.warning("Search cache read failed; calling the provider", exc_info=True)
+            return None
+
+    async def _backend_set(self, key: str, value: bytes) -> None:
+        try:
+            await self.backend.set(key, value, self.ttl_seconds)
+        except Exception:
+            self.backend_errors += 1
+            logger.warning("Search cache write failed; result not cached", exc_info=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.backend.evictions,
+            "backend_errors": self.backend_errors,
+        }
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.hits = self.misses = self.coalesced = self.backend_errors = 0
+
+    @staticmethod
+    def _decode(encoded: bytes, query: str, cached: bool) -> Dict[str, Any]:
+        # Every caller gets its own copy, echoing the query as it was typed
+        result = json.loads(encoded)
+        result["query"] = query
+        result.setdefault("meta_data", {})["cached"] = cached
+        return result
+
+
+_BACKENDS: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": lambda: MemoryCacheBackend(settings.search_cache_max_bytes),
+    "redis": _redis_backend,
+}
+_cache: Optional[SearchCache] = None
+
+
+def register_search_cache_backend(name: str, factory: Callable[[], CacheBackend]) -> None:
+    """Make another backend selectable through ``SEARCH_CACHE_BACKEND``."""
+    _BACKENDS[name] = factory
+
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        try:
+            factory = _BACKENDS[settings.search_cache_backend]
+        except KeyError:
+            raise ValueError(f"Unknown search cache backend '{settings.search_cache_backend}'")
+        _cache = SearchCache(factory(), settings.search_cache_ttl_seconds)
+    return _cache
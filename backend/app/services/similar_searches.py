@@ -0,0 +1,348 @@
+"""In-process vector index behind ``GET /search/similar``.
+
+Queries are embedded locally, with no model. The features of a lowercased
+query are its character n-grams (``similar_search_ngram`` long) and its
+words. Each feature is hashed to one of ``similar_search_dimensions``
+buckets with a sign, and the vector is scaled to unit length. A user's
+vectors sit in one contiguous float32 matrix with a row per dimension and a
+column per past search. A query only touches a few dozen buckets, so a
+lookup sums just those rows, each scaled by the query's weight, and then
+takes a top-k partition. Long queries that touch most buckets use the full
+vector-matrix product instead. The sums are cosine similarities.
+
+The index follows the search history incrementally.
+``crud.apply_history_change`` stages the rows a session inserts or deletes,
+and they are applied once that session commits. Each such change also
+bumps the user's ``searches`` collection version
+(``app.db.collection_versions``), and the index counts the changes it
+applies the same way. A lookup that finds the two counts differ (another
+worker or a script changed the history) rebuilds that user's index from the
+database.
+
+Indexes are saved under ``similar_search_index_dir``, one file per user,
+whenever they are rebuilt and again at shutdown. Each save replaces the old
+file atomically. At startup every file is memory-mapped copy-on-write:
+pages load on first use and changes stay private to the process until the
+next save. Workers may share the directory, because the version check
+catches whatever a saved file is missing.
+"""
+import logging
+import os
+import re
+import struct
+import tempfile
+import zlib
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db import collection_versions
+from app.db.models import SearchHistory
+
+logger = logging.getLogger(__name__)
+
+# File layout: header, then ``capacity`` int64 ids, then a
+# (dimensions, capacity) float32 matrix; columns past ``count`` are spare
+MAGIC = b"SIMIDX01"
+HEADER = struct.Struct("<8s5q")  # magic, dimensions, ngram, count, capacity, version
+# Room left for appends after a save or rebuild, so the matrix is not copied
+# on the next insert
+SPARE_COLUMNS = 1024
+PENDING_KEY = "similar_searches_pending"
+_WORD = re.compile(r"\w+")
+
+
+def _np():
+    import numpy
+    return numpy
+
+
+def features(text: str, ngram: int) -> List[str]:
+    """Character n-grams of the normalized query, plus its words."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return []
+    padded = " " + " ".join(words) + " "
+    grams = [padded[i:i + ngram] for i in range(max(1, len(padded) - ngram + 1))]
+    return grams + ["#" + word for word in words]
+
+
+def embed(texts: Sequence[str], dimensions: int, ngram: int):
+    """A (len(texts), dimensions) float32 matrix of unit-length query vectors.
+
+    Texts without a word embed as zero vectors.
+    """
+    np = _np()
+    rows, buckets, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in features(text, ngram):
+            digest = zlib.crc32(feature.encode())
+            rows.append(row)
+            buckets.append(digest % dimensions)
+            signs.append(1.0 if digest & 0x80000000 else -1.0)
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    np.add.at(matrix, (rows, buckets), signs)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class UserIndex:
+    """One user's vectors. Columns ``[0, count)`` of ``vectors`` are live and
+    ``ids[column]`` is the search history id of each; deletes move the last
+    column into the gap so the live ones stay contiguous."""
+
+    def __init__(self, vectors, ids, count: int, version: int, ngram: int):
+        self.vectors = vectors
+        self.ids = ids
+        self.count = count
+        self.version = version
+        self.ngram = ngram
+        self.dirty = False
+        self._columns = {search_id: column for column, search_id in enumerate(ids[:count].tolist())}
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[0]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, search_id: int, vector) -> None:
+        if search_id in self._columns:
+            return
+        if self.count == len(self.ids):
+            self._grow()
+        self.vectors[:, self.count] = vector
+        self.ids[self.count] = search_id
+        self._columns[search_id] = self.count
+        self.count += 1
+
+    def remove(self, search_id: int) -> None:
+        column = self._columns.pop(search_id, None)
+        if column is None:
+            return
+        last = self.count - 1
+        if column != last:
+            moved = int(self.ids[last])
+            self.vectors[:, column] = self.vectors[:, last]
+            self.ids[column] = moved
+            self._columns[moved] = column
+        self.count = last
+
+    def scores(self, vector):
+        """Cosine similarity of ``vector`` to every live entry."""
+        np = _np()
+        n = self.count
+        buckets = np.flatnonzero(vector)
+        if len(buckets) * 3 > self.dimensions:
+            return vector @ self.vectors[:, :n]
+        scores = np.zeros(n, dtype=np.float32)
+        scaled = np.empty(n, dtype=np.float32)
+        for bucket in buckets:
+            np.multiply(self.vectors[bucket, :n], vector[bucket], out=scaled)
+            scores += scaled
+        return scores
+
+    def top(self, vector, k: int) -> List[Tuple[int, float]]:
+        """``(search id, similarity)`` of the ``k`` entries closest to ``vector``, best first."""
+        np = _np()
+        n = self.count
+        k = min(k, n)
+        if k <= 0:
+            return []
+        scores = self.scores(vector)
+        best = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(self.ids[column]), float(scores[column])) for column in best]
+
+    def _grow(self) -> None:
+        np = _np()
+        capacity = len(self.ids) + max(SPARE_COLUMNS, len(self.ids) // 4)
+        vectors = np.zeros((self.dimensions, capacity), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        vectors[:, :self.count] = self.vectors[:, :self.count]
+        ids[:self.count] = self.ids[:self.count]
+        self.vectors, self.ids = vectors, ids
+
+    def save(self, path: Path) -> None:
+        """Write the index to ``path``, replacing any previous file atomically."""
+        np = _np()
+        count, capacity = self.count, self.count + SPARE_COLUMNS
+        ids = np.zeros(capacity, dtype="<i8")
+        ids[:count] = self.ids[:count]
+        vectors = np.zeros((self.dimensions, capacity), dtype="<f4")
+        vectors[:, :count] = self.vectors[:, :count]
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, self.dimensions, self.ngram, count, capacity, self.version))
+                ids.tofile(f)
+                vectors.tofile(f)
+            os.replace(tmp, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp)
+            raise
+        self.dirty = False
+
+
+def load_index(path: Path) -> UserIndex:
+    """Memory-map a saved index copy-on-write."""
+    np = _np()
+    with open(path, "rb") as f:
+        magic, dimensions, ngram, count, capacity, version = HEADER.unpack(f.read(HEADER.size))
+    expected = HEADER.size + capacity * (8 + 4 * dimensions)
+    if magic != MAGIC or not 0 <= count <= capacity or os.path.getsize(path) != expected:
+        raise ValueError(f"{path} is not a similar-search index")
+    ids = np.memmap(path, dtype="<i8", mode="c", offset=HEADER.size, shape=(capacity,))
+    vectors = np.memmap(
+        path, dtype="<f4", mode="c", offset=HEADER.size + 8 * capacity, shape=(dimensions, capacity)
+    )
+    return UserIndex(vectors, ids, count, version, ngram)
+
+
+class SimilarSearchIndex:
+    def __init__(self, directory: str, dimensions: int, ngram: int):
+        self.directory = Path(directory)
+        self.dimensions = dimensions
+        self.ngram = ngram
+        self._indexes: Dict[int, UserIndex] = {}
+        self.rebuilds = 0
+
+    def embed(self, texts: Sequence[str]):
+        return embed(texts, self.dimensions, self.ngram)
+
+    async def start(self) -> None:
+        """Memory-map every saved index built with the current settings."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob("*.idx"):
+            try:
+                user_id = int(path.stem)
+                index = load_index(path)
+            except (ValueError, OSError, struct.error):
+                logger.warning("Ignoring unreadable similar-search index %s", path)
+                continue
+            if (index.dimensions, index.ngram) == (self.dimensions, self.ngram):
+                self._indexes[user_id] = index
+
+    async def stop(self) -> None:
+        """Save the indexes changed since they were loaded or rebuilt."""
+        for user_id, index in list(self._indexes.items()):
+            if index.dirty:
+                try:
+                    index.save(self._path(user_id))
+                except OSError:
+                    logger.exception("Could not save the similar-search index of user %s", user_id)
+        self._indexes.clear()
+
+    def loaded(self, user_id: int) -> Optional[UserIndex]:
+        """The user's index if this process holds one, current or not."""
+        return self._indexes.get(user_id)
+
+    def reset(self) -> None:
+        """Forget every index, in memory and on disk (used by tests)."""
+        self._indexes.clear()
+        if self.directory.is_dir():
+            for path in self.directory.glob("*.idx"):
+                path.unlink()
+
+    async def search(self, db, user_id: int, text: str, k: int) -> List[Tuple[int, float]]:
+        """``(search id, similarity)`` of the user's ``k`` past searches closest
+        to ``text``, best first."""
+        vector = self.embed([text])[0]
+        if not vector.any():
+            return []
+        index = await self._current(db, user_id)
+        return index.top(vector, k)
+
+    async def _current(self, db, user_id: int) -> UserIndex:
+        versions = await collection_versions.get_versions(db, user_id, [collection_versions.SEARCHES])
+        version = versions[collection_versions.SEARCHES]
+        index = self._indexes.get(user_id)
+        if index is not None and index.version == version:
+            return index
+        result = await db.execute(
+            select(SearchHistory.id, SearchHistory.query)
+            .where(SearchHistory.user_id == user_id)
+            .order_by(SearchHistory.id)
+        )
+        index = await run_in_threadpool(self._build, user_id, result.all(), version)
+        self._indexes[user_id] = index
+        self.rebuilds += 1
+        return index
+
+    def _build(self, user_id: int, rows: Sequence[Tuple[int, str]], version: int) -> UserIndex:
+        np = _np()
+        count = len(rows)
+        vectors = np.zeros((self.dimensions, count + SPARE_COLUMNS), dtype=np.float32)
+        ids = np.zeros(count + SPARE_COLUMNS, dtype=np.int64)
+        if rows:
+            vectors[:, :count] = self.embed([query for _, query in rows]).T
+            ids[:count] = [search_id for search_id, _ in rows]
+        index = UserIndex(vectors, ids, count, version, self.ngram)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            index.save(self._path(user_id))
+        except OSError:
+            index.dirty = True
+            logger.exception("Could not save the similar-search index of user %s", user_id)
+        return index
+
+    def stage(self, db, rows: Iterable[Mapping], sign: int) -> None:
+        """Queue search history rows (``id``, ``user_id``, ``query``) being
+        inserted (``sign=1``) or deleted (``sign=-1``) in ``db``'s transaction.
+        They reach the index when it commits."""
+        entries = [(row["user_id"], row.get("id"), row["query"]) for row in rows]
+        db.info.setdefault(PENDING_KEY, []).append((entries, sign))
+
+    def apply(self, entries: Sequence[Tuple[int, Optional[int], str]], sign: int) -> None:
+        """Apply one committed change, which bumped each user's version once."""
+        by_user: Dict[int, list] = {}
+        for user_id, search_id, query in entries:
+            by_user.setdefault(user_id, []).append((search_id, query))
+        for user_id, changes in by_user.items():
+            index = self._indexes.get(user_id)
+            if index is None:
+                continue
+            if any(search_id is None for search_id, _ in changes):
+                # Cannot follow rows without ids; rebuild on the next lookup
+                del self._indexes[user_id]
+                continue
+            try:
+                if sign > 0:
+                    for (search_id, _), vector in zip(changes, self.embed([query for _, query in changes])):
+                        index.add(search_id, vector)
+                else:
+                    for search_id, _ in changes:
+                        index.remove(search_id)
+            except Exception:
+                logger.exception("Could not update the similar-search index of user %s", user_id)
+                del self._indexes[user_id]
+                continue
+            index.version += 1
+            index.dirty = True
+
+    def _path(self, user_id: int) -> Path:
+        return self.directory / f"{user_id}.idx"
+
+
+similar_searches = SimilarSearchIndex(
+    directory=settings.similar_search_index_dir,
+    dimensions=settings.similar_search_dimensions,
+    ngram=settings.similar_search_ngram,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session) -> None:
+    for entries, sign in session.info.pop(PENDING_KEY, ()):
+        similar_searches.apply(entries, sign)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session) -> None:
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,76 @@
+"""Background purge of expired refresh tokens.
+
+Expired tokens can no longer be used, but their rows stay until this task
+deletes them. It runs in the app lifespan every
+``refresh_token_purge_interval_seconds`` and deletes in batches of
+``refresh_token_purge_batch_size``, committing each batch. That keeps lock
+hold times and transaction size bounded however large the backlog is.
+Several worker processes may purge at once; they just share the work.
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+from app.core.config import settings
+from app.db import crud
+from app.db.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenPurger:
+    def __init__(
+        self,
+        interval_seconds: float,
+        batch_size: int,
+        session_factory: Callable = AsyncSessionLocal,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self.purged = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="refresh-token-purge")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def purge_once(self) -> int:
+        """Delete every token expired by now, one batch per transaction."""
+        total = 0
+        async with self.session_factory() as db:
+            while True:
+                deleted = await crud.purge_expired_refresh_tokens(db, self.batch_size)
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+                # Let request handlers in between batches
+                await asyncio.sleep(0)
+        self.purged += total
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await self.purge_once()
+                if deleted:
+                    logger.info("Purged %d expired refresh tokens", deleted)
+            except Exception:
+                logger.exception("Refresh token purge failed")
+            await asyncio.sleep(self.interval_seconds)
+
+
+refresh_token_purger = RefreshTokenPurger(
+    interval_seconds=settings.refresh_token_purge_interval_seconds,
+    batch_size=settings.refresh_token_purge_batch_size,
+)
@@ -0,0 +1,257 @@
+"""Search latency for well-behaved users while one user floods the API.
+
+The app runs under uvicorn in a child process. The load generator runs in
+this one, so the flood competes for the server's CPU the way a remote
+client would. The provider is simulated inside the server with
+``--provider-capacity`` concurrent slots and ``--provider-ms`` of latency
+per call. Every search uses a distinct query, so the result cache never
+answers.
+
+One abusive user fires ``POST /search/`` at ``--abuse-rps`` requests per
+second. It ignores ``Retry-After`` and never waits for earlier responses.
+The flood goes through a bare keep-alive HTTP/1.1 client so the load
+generator does not eat the CPU the server needs. Meanwhile ``--users`` regular users each
+search once every ``--interval`` seconds, for ``--duration`` seconds. The
+run happens twice: once with admission control off and once with the
+limits from ``Settings``. It reports the regular users' latency
+percentiles and the status codes each side got.
+
+    python -m benchmarks.admission
+    python -m benchmarks.admission --abuse-rps 300 --duration 30
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_users, summarize
+
+# Environment that turns every admission check off
+UNLIMITED = {
+    "RATE_LIMIT_SEARCH_PER_MINUTE": "0",
+    "RATE_LIMIT_IMAGE_PER_MINUTE": "0",
+    "ADMISSION_MAX_IN_FLIGHT_SEARCH": "0",
+    "ADMISSION_MAX_IN_FLIGHT_IMAGE": "0",
+}
+
+
+def serve(args) -> None:
+    """Child process: the app with a simulated provider."""
+    import uvicorn
+    from app.main import app
+    from app.services import mcp_client
+
+    slots = None
+    latency = args.provider_ms / 1000
+
+    async def fetch(query: str, max_results: int = 10):
+        nonlocal slots
+        if slots is None:
+            slots = asyncio.Semaphore(args.provider_capacity)
+        async with slots:
+            await asyncio.sleep(latency)
+        return {"query": query, "results": [], "total_results": 0, "meta_data": {}}
+
+    mcp_client.fetch_search_results = fetch
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+class FloodClient:
+    """Keep-alive HTTP/1.1 POSTs over raw asyncio streams.
+
+    Opens another connection whenever none is idle. It knows only enough of
+    the protocol to read this app's Content-Length responses.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._idle = []
+
+    async def post(self, path: str, body: bytes, authorization: str) -> int:
+        if self._idle:
+            try:
+                return await self._send(self._idle.pop(), path, body, authorization)
+            except ConnectionError:
+                # The server closed the idle connection; retry on a new one
+                pass
+        connection = await asyncio.open_connection(self.host, self.port)
+        return await self._send(connection, path, body, authorization)
+
+    async def _send(self, connection, path: str, body: bytes, authorization: str) -> int:
+        reader, writer = connection
+        try:
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nAuthorization: {authorization}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed")
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+        except asyncio.IncompleteReadError as exc:
+            writer.close()
+            raise ConnectionError("connection closed") from exc
+        except Exception:
+            writer.close()
+            raise
+        self._idle.append(connection)
+        return int(status_line.split()[1])
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+async def wait_until_up(client, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            if time.perf_counter() > deadline:
+                raise
+        await asyncio.sleep(0.1)
+
+
+async def drive(users, args) -> dict:
+    import httpx
+    from app.core.security import create_user_access_token
+
+    headers = {user.id: {"Authorization": f"Bearer {create_user_access_token(user)}"} for user in users}
+    abuser, regulars = users[0], users[1:]
+    counter = itertools.count()
+    latencies = []
+    statuses = {"regular": Counter(), "abuser": Counter()}
+    limits = httpx.Limits(max_connections=None)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits
+    ) as client:
+        await wait_until_up(client)
+        deadline = time.perf_counter() + args.duration
+
+        async def search(user):
+            """Status code of one search, or "connection_error" when the server dropped it."""
+            query = f"admission benchmark {next(counter)}"
+            try:
+                response = await client.post(
+                    "/search/", json={"query": query, "max_results": 1}, headers=headers[user.id]
+                )
+            except httpx.TransportError:
+                return "connection_error"
+            return response.status_code
+
+        flood = FloodClient("127.0.0.1", args.port)
+
+        async def abusive_request():
+            body = json.dumps({"query": f"admission benchmark {next(counter)}", "max_results": 1}).encode()
+            try:
+                status = await flood.post("/search/", body, headers[abuser.id]["Authorization"])
+            except OSError:
+                status = "connection_error"
+            statuses["abuser"][status] += 1
+
+        async def abuse():
+            pending = set()
+            next_at = time.perf_counter()
+            while next_at < deadline:
+                task = asyncio.create_task(abusive_request())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                next_at += 1 / args.abuse_rps
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await asyncio.gather(*pending)
+            flood.close()
+
+        async def regular(user, offset: float):
+            await asyncio.sleep(offset)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                status = await search(user)
+                latencies.append(time.perf_counter() - started)
+                statuses["regular"][status] += 1
+                await asyncio.sleep(max(0.0, args.interval - (time.perf_counter() - started)))
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            abuse(),
+            *(regular(user, n * args.interval / len(regulars)) for n, user in enumerate(regulars)),
+        )
+        elapsed = time.perf_counter() - started
+    result = summarize("regular_users", latencies, elapsed)
+    result["statuses"] = {side: dict(codes) for side, codes in statuses.items()}
+    return result
+
+
+def run_once(users, args, limited: bool) -> dict:
+    env = dict(os.environ)
+    if not limited:
+        env.update(UNLIMITED)
+    command = [sys.executable, "-m", "benchmarks.admission", "--serve"] + [
+        f"--port={args.port}",
+        f"--database-url={args.database_url}",
+        f"--provider-capacity={args.provider_capacity}",
+        f"--provider-ms={args.provider_ms}",
+    ]
+    server = subprocess.Popen(command, env=env)
+    try:
+        return asyncio.run(drive(users, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=10, help="well-behaved users")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between a regular user's searches")
+    parser.add_argument("--abuse-rps", type=float, default=100.0)
+    parser.add_argument("--provider-capacity", type=int, default=32)
+    parser.add_argument("--provider-ms", type=float, default=50.0)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    if args.serve:
+        serve(args)
+        return
+
+    from app.db.database import engine
+    from app.db.models import User
+
+    reset_schema(engine)
+    seed_users(engine, args.users + 1)
+    with engine.connect() as conn:
+        users = conn.execute(
+            User.__table__.select().with_only_columns(
+                User.id, User.email, User.is_active, User.is_admin, User.token_epoch
+            ).order_by(User.id)
+        ).all()
+
+    result = {
+        "unlimited": run_once(users, args, limited=False),
+        "admission_control": run_once(users, args, limited=True),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
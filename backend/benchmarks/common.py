@@ -0,0 +1,116 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway database (SQLite by default, or any URL
+passed with ``--database-url``) so they never touch the configured one.
+"""
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_DATABASE_URL = "sqlite:///./benchmark.db"
+
+
+def configure(database_url: str) -> None:
+    """Point the app settings at the benchmark database.
+
+    Must run before anything under ``app`` is imported.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("DEBUG", "false")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    os.environ.setdefault("REPLICATE_API_TOKEN", "benchmark")
+
+
+def reset_schema(engine) -> None:
+    from app.db.database import Base
+    from app.db import models  # noqa: F401  (registers tables)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def seed_users(engine, count: int, hashed_password: str = "x") -> list:
+    from app.db.models import User
+
+    rows = [
+        {
+            "email": f"bench{i}@example.com",
+            "full_name": f"Bench User {i}",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_admin": False,
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), rows)
+        return [r[0] for r in conn.execute(User.__table__.select().with_only_columns(User.id))]
+
+
+def seed_search_history(engine, user_ids, rows_per_user: int, seed: int = 42, batch: int = 5000) -> None:
+    """Insert deterministic search history rows for every user."""
+    from app.db.models import SearchHistory
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    buffer = []
+    with engine.begin() as conn:
+        for user_id in user_ids:
+            for n in range(rows_per_user):
+                query = f"benchmark query {rng.randrange(10_000)}"
+                buffer.append({
+                    "user_id": user_id,
+                    "query": query,
+                    "results": {"query": query, "results": [], "total_results": 0, "meta_data": {}},
+                    "meta_data": {"max_results": 10},
+                    "created_at": start + timedelta(seconds=n * 60 + rng.randrange(60)),
+                })
+                if len(buffer) >= batch:
+                    conn.execute(SearchHistory.__table__.insert(), buffer)
+                    buffer.clear()
+        if buffer:
+            conn.execute(SearchHistory.__table__.insert(), buffer)
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label: str, latencies, elapsed: float) -> dict:
+    """Return throughput and latency percentiles (milliseconds)."""
+    return {
+        "label": label,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+class LoopLagProbe:
+    """Measures how late the event loop wakes a sleeping coroutine."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags = []
+        self._running = False
+
+    async def run(self):
+        import asyncio
+
+        self._running = True
+        while self._running:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,112 @@
+"""Compare the blocking Session layer with the AsyncSession layer.
+
+Each simulated request reads one page of search history and, for a share of
+requests, records a new search -- the same work ``/search/history`` and
+``/search/`` do. The "sync" mode runs the queries on a regular ``Session``
+inside a coroutine (what the handlers used to do); the "async" mode goes through
+``app.db.crud``. A probe coroutine measures event loop lag while both run.
+
+    python -m benchmarks.db_layer --requests 2000 --concurrency 50
+    python -m benchmarks.db_layer --database-url postgresql://user:pw@localhost/bench
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import (
+    DEFAULT_DATABASE_URL,
+    LoopLagProbe,
+    configure,
+    percentile,
+    reset_schema,
+    seed_search_history,
+    seed_users,
+    summarize,
+)
+
+
+async def run_mode(mode: str, user_ids, requests: int, concurrency: int, write_ratio: float) -> dict:
+    from sqlalchemy import desc, select
+    from app.db import crud
+    from app.db.database import AsyncSessionLocal, SessionLocal
+    from app.db.models import SearchHistory
+
+    rng = random.Random(7)
+    plan = [(rng.choice(user_ids), rng.random() < write_ratio) for _ in range(requests)]
+    queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+    latencies = []
+
+    async def sync_request(user_id, write):
+        with SessionLocal() as db:
+            db.execute(
+                select(SearchHistory)
+                .where(SearchHistory.user_id == user_id)
+                .order_by(desc(SearchHistory.created_at))
+                .limit(10)
+            ).scalars().all()
+            if write:
+                db.add(SearchHistory(user_id=user_id, query="bench", results={}, meta_data={}))
+                db.commit()
+
+    async def async_request(user_id, write):
+        async with AsyncSessionLocal() as db:
+            await crud.get_user_search_history(db, user_id=user_id, limit=10)
+            if write:
+                await crud.create_search_history(db, user_id=user_id, query="bench", results={})
+
+    handler = sync_request if mode == "sync" else async_request
+
+    async def worker():
+        while not queue.empty():
+            user_id, write = queue.get_nowait()
+            started = time.perf_counter()
+            await handler(user_id, write)
+            latencies.append(time.perf_counter() - started)
+
+    probe = LoopLagProbe()
+    probe_task = asyncio.create_task(probe.run())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    probe.stop()
+    await probe_task
+
+    result = summarize(mode, latencies, elapsed)
+    result["loop_lag_p99_ms"] = round(percentile(probe.lags, 99) * 1000, 2)
+    result["loop_lag_max_ms"] = round(max(probe.lags, default=0.0) * 1000, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rows-per-user", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.db.database import async_engine, engine
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, args.users)
+    seed_search_history(engine, user_ids, args.rows_per_user)
+
+    async def run_all():
+        results = []
+        for mode in ("sync", "async"):
+            results.append(await run_mode(mode, user_ids, args.requests, args.concurrency, args.write_ratio))
+        await async_engine.dispose()
+        return results
+
+    print(json.dumps(asyncio.run(run_all()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""List-endpoint serialization: validated path vs. the fast JSON path.
+
+Seeds one user with ``--rows`` search and image history rows. Each search
+row stores ``--results`` provider results of about ``--content-bytes``
+bytes each. Pages of ``--limit`` rows (100 by default) are then fetched
+from each listing endpoint ``--requests`` times. It alternates between the
+default response path and ``fast_json_responses`` and reports latency per
+endpoint and mode. Responses are requested uncompressed so the timings
+cover serialization only.
+
+    python -m benchmarks.fast_json
+    python -m benchmarks.fast_json --rows 500 --results 50 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_users, summarize
+
+ENDPOINTS = ("/search/history", "/dashboard/search", "/image/history", "/dashboard/images")
+
+
+def seed_history(engine, user_id: int, rows: int, results: int, content_bytes: int, seed: int = 42) -> None:
+    from app.db.models import ImageHistory, SearchHistory, utcnow
+
+    rng = random.Random(seed)
+    now = utcnow()
+    words = ["vector", "index", "latency", "cache", "query", "model", "token", "stream"]
+
+    def content() -> str:
+        text = []
+        while sum(len(w) + 1 for w in text) < content_bytes:
+            text.append(rng.choice(words))
+        return " ".join(text)
+
+    searches, images = [], []
+    for n in range(rows):
+        query = f"benchmark query {n}"
+        searches.append({
+            "user_id": user_id,
+            "query": query,
+            "results": {
+                "query": query,
+                "results": [
+                    {"title": f"Result {i}", "url": f"https://example.com/{n}/{i}", "content": content(),
+                     "score": round(rng.random(), 4)}
+                    for i in range(results)
+                ],
+                "total_results": results,
+                "meta_data": {"provider": "benchmark"},
+            },
+            "meta_data": {"max_results": results},
+            "created_at": now,
+        })
+        images.append({
+            "user_id": user_id,
+            "prompt": f"benchmark prompt {n}",
+            "image_url": f"https://example.com/{n}.png",
+            "meta_data": {"width": 512, "height": 512, "steps": 20, "model": "benchmark"},
+            "created_at": now,
+        })
+    with engine.begin() as conn:
+        conn.execute(SearchHistory.__table__.insert(), searches)
+        conn.execute(ImageHistory.__table__.insert(), images)
+
+
+async def run(user, limit: int, requests: int) -> dict:
+    import httpx
+    from app.core.config import settings
+    from app.core.security import create_user_access_token
+    from app.db.database import async_engine
+    from app.main import app
+
+    headers = {"Authorization": f"Bearer {create_user_access_token(user)}", "Accept-Encoding": "identity"}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for endpoint in ENDPOINTS:
+            url = f"{endpoint}?limit={limit}"
+            latencies = {False: [], True: []}
+            sizes = {}
+            for n in range(requests + 5):
+                fast = bool(n % 2)
+                settings.fast_json_responses = fast
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                elapsed = time.perf_counter() - started
+                response.raise_for_status()
+                sizes[fast] = len(response.content)
+                # The first few requests only warm up both paths
+                if n >= 5:
+                    latencies[fast].append(elapsed)
+            validated = summarize("validated", latencies[False], sum(latencies[False]))
+            fast = summarize("fast", latencies[True], sum(latencies[True]))
+            results[endpoint] = {
+                "validated": validated,
+                "fast": fast,
+                "response_bytes": sizes[True],
+                "speedup_p50": round(validated["p50_ms"] / fast["p50_ms"], 2) if fast["p50_ms"] else None,
+            }
+    settings.fast_json_responses = False
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--results", type=int, default=20, help="provider results stored per search")
+    parser.add_argument("--content-bytes", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=100, help="rows per page")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint and mode")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.core.fast_json import orjson_available
+    from app.db.database import engine
+    from app.db.models import User
+
+    reset_schema(engine)
+    user_id = seed_users(engine, 1)[0]
+    seed_history(engine, user_id, args.rows, args.results, args.content_bytes)
+    with engine.connect() as conn:
+        user = conn.execute(
+            User.__table__.select().with_only_columns(
+                User.id, User.email, User.is_active, User.is_admin, User.token_epoch
+            ).where(User.id == user_id)
+        ).one()
+
+    result = asyncio.run(run(user, args.limit, args.requests))
+    result["orjson"] = orjson_available()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Per-page latency of offset vs keyset (cursor) pagination at depth.
+
+Seeds one user with ``--rows`` search history rows (1M by default) and times
+fetching a page starting at increasing depths, once with ``skip`` and once
+with the equivalent cursor. Cursor latency should stay flat; offset latency
+grows with depth.
+
+    python -m benchmarks.history_pagination --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_search_history, seed_users
+
+
+def cursor_at(engine, user_id: int, depth: int):
+    from sqlalchemy import desc, select
+    from app.db.models import SearchHistory
+    from app.db.pagination import encode_cursor
+
+    if depth == 0:
+        return None
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(SearchHistory.created_at, SearchHistory.id)
+            .where(SearchHistory.user_id == user_id)
+            .order_by(desc(SearchHistory.created_at), desc(SearchHistory.id))
+            .offset(depth - 1)
+            .limit(1)
+        ).first()
+    return encode_cursor(row.created_at, row.id)
+
+
+async def time_page(fetch, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fetch()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+async def run(engine, user_id: int, depths, page_size: int, repeats: int) -> list:
+    from app.db import crud
+    from app.db.database import AsyncSessionLocal, async_engine
+
+    results = []
+    async with AsyncSessionLocal() as db:
+        for depth in depths:
+            cursor = cursor_at(engine, user_id, depth)
+            offset_ms = await time_page(
+                lambda: crud.get_user_search_history(db, user_id, skip=depth, limit=page_size), repeats
+            )
+            cursor_ms = await time_page(
+                lambda: crud.get_user_search_history(db, user_id, limit=page_size, cursor=cursor), repeats
+            )
+            results.append({"depth": depth, "offset_ms": offset_ms, "cursor_ms": cursor_ms})
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--other-users", type=int, default=10, help="users with 1%% of the rows each")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.db.database import engine
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, 1 + args.other_users)
+    seed_search_history(engine, user_ids[:1], args.rows)
+    seed_search_history(engine, user_ids[1:], max(1, args.rows // 100), seed=1)
+
+    depths = sorted({d for d in (0, 1_000, 10_000, 100_000, args.rows // 2, args.rows - args.page_size) if 0 <= d < args.rows})
+    print(json.dumps(asyncio.run(run(engine, user_ids[0], depths, args.page_size, args.repeats)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cold-start profile of ``import app.main``.
+
+Runs ``--runs`` fresh interpreters with ``python -X importtime``. It
+reports the median wall time of the import and the ``--top`` modules by
+cumulative and by self time, taken from the median run. Use it to find
+what a worker pays for at boot. ``tests/test_startup.py`` enforces the
+budget.
+
+    python -m benchmarks.import_time --runs 5 --top 25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure
+
+PROBE = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def profile_once() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ.copy(),
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return {"seconds": float(completed.stdout.strip().splitlines()[-1]), "modules": modules}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    runs = sorted((profile_once() for _ in range(args.runs)), key=lambda run: run["seconds"])
+    median = runs[len(runs) // 2]
+    heavy = [
+        name for name in ("httpx", "jose", "passlib", "trio")
+        if any(m["module"] == name for m in median["modules"])
+    ]
+    print(json.dumps({
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(run["seconds"] for run in runs), 3),
+        "min_seconds": round(runs[0]["seconds"], 3),
+        "eagerly_imported_heavy_modules": heavy,
+        "top_cumulative": sorted(median["modules"], key=lambda m: -m["cumulative_ms"])[:args.top],
+        "top_self": sorted(median["modules"], key=lambda m: -m["self_ms"])[:args.top],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
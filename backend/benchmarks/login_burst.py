@@ -0,0 +1,102 @@
+"""Search-history latency while a burst of logins runs in parallel.
+
+Drives the ASGI app in-process through ``httpx.ASGITransport``. A set of
+workers logs in continuously while a single client repeatedly fetches
+``/search/history``; the history latency is reported for an idle baseline and
+under the login burst. ``--inline`` runs bcrypt on the event loop (the old
+behaviour) for comparison.
+
+    python -m benchmarks.login_burst --logins 8 --duration 5
+    python -m benchmarks.login_burst --inline
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import (
+    DEFAULT_DATABASE_URL,
+    configure,
+    reset_schema,
+    seed_search_history,
+    seed_users,
+    summarize,
+)
+
+PASSWORD = "benchmark-password"
+
+
+async def measure_history(client, headers, duration: float, label: str) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        t0 = time.perf_counter()
+        response = await client.get("/search/history", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(label, latencies, time.perf_counter() - started)
+
+
+async def login_worker(client, email: str, stop: asyncio.Event, counter: list):
+    while not stop.is_set():
+        response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        counter.append(response.status_code)
+
+
+async def run(args, user_count: int) -> list:
+    import httpx
+    from app.db.database import async_engine
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/auth/login", json={"email": "bench0@example.com", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = [await measure_history(client, headers, args.duration, "history_idle")]
+
+        stop = asyncio.Event()
+        statuses = []
+        workers = [
+            asyncio.create_task(
+                login_worker(client, f"bench{(i % (user_count - 1)) + 1}@example.com", stop, statuses)
+            )
+            for i in range(args.logins)
+        ]
+        under_load = await measure_history(client, headers, args.duration, "history_during_logins")
+        stop.set()
+        await asyncio.gather(*workers)
+        under_load["logins_completed"] = statuses.count(200)
+        under_load["logins_rejected_503"] = statuses.count(503)
+        results.append(under_load)
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login workers")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per phase")
+    parser.add_argument("--inline", action="store_true", help="run bcrypt on the event loop")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.core.password import get_password_hash, password_hasher
+    from app.db.database import engine
+
+    reset_schema(engine)
+    user_count = max(2, args.logins + 1)
+    user_ids = seed_users(engine, user_count, hashed_password=get_password_hash(PASSWORD))
+    seed_search_history(engine, user_ids[:1], 50)
+
+    if args.inline:
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+        password_hasher._run = run_inline
+
+    print(json.dumps(asyncio.run(run(args, user_count)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
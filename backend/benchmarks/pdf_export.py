@@ -0,0 +1,67 @@
+"""Export time and peak memory of the streaming PDF export.
+
+Seeds one user per size in ``--rows`` (10k and 100k by default) and drains
+``export_to_pdf`` for each, discarding the output. Peak memory is the
+``tracemalloc`` high-water mark during the export, so it only counts Python
+allocations; it should stay roughly constant as the row count grows.
+
+    python -m benchmarks.pdf_export --rows 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_search_history, seed_users
+
+
+async def export_once(user_id: int) -> dict:
+    from app.db.database import AsyncSessionLocal
+    from app.services.file_export import export_to_pdf
+
+    size = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        async for chunk in export_to_pdf(db, user_id, data_type="searches"):
+            size += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(elapsed, 2),
+        "peak_mib": round(peak / 2**20, 2),
+        "output_mib": round(size / 2**20, 2),
+    }
+
+
+async def run(plan) -> list:
+    from app.db.database import async_engine
+
+    results = []
+    for rows, user_id in plan:
+        results.append({"rows": rows, **await export_once(user_id)})
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.db.database import engine
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, len(args.rows))
+    for rows, user_id in zip(args.rows, user_ids):
+        seed_search_history(engine, [user_id], rows)
+
+    print(json.dumps(asyncio.run(run(list(zip(args.rows, user_ids)))), indent=2))
+
+
+if __name__ == "__main__":
+    main()
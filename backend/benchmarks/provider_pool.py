@@ -0,0 +1,82 @@
+"""Provider call latency with a shared client vs a new client per call.
+
+Starts the local MCP stand-in (``tests/mcp_stub.py``) and issues ``--calls``
+search tool calls at ``--concurrency``, once through the lifespan-managed
+``provider_clients`` and once opening a fresh ``httpx.AsyncClient`` per call
+(what a naive implementation would do). Reports latency percentiles and the
+number of TCP connections the stub accepted.
+
+    python -m benchmarks.provider_pool --calls 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, summarize
+
+
+async def drive(call, calls: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(n):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(n)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(calls)))
+    return latencies, time.perf_counter() - started
+
+
+async def run(stub, calls: int, concurrency: int) -> list:
+    import httpx
+    from app.services.provider_clients import provider_clients
+
+    def payload(n):
+        return {"jsonrpc": "2.0", "id": n, "method": "tools/call",
+                "params": {"name": "search", "arguments": {"query": f"q{n}", "max_results": 3}}}
+
+    async def fresh_client(n):
+        async with httpx.AsyncClient() as client:
+            (await client.post(stub.url, json=payload(n))).raise_for_status()
+
+    async def shared_client(n):
+        await provider_clients.call_tool("search", "search", {"query": f"q{n}", "max_results": 3})
+
+    results = []
+    stub.reset()
+    latencies, elapsed = await drive(fresh_client, calls, concurrency)
+    results.append({**summarize("client_per_call", latencies, elapsed), "connections": len(stub.connections)})
+
+    await provider_clients.start()
+    stub.reset()
+    try:
+        latencies, elapsed = await drive(shared_client, calls, concurrency)
+    finally:
+        await provider_clients.aclose()
+    results.append({**summarize("shared_client", latencies, elapsed), "connections": len(stub.connections)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.0, help="artificial provider latency (seconds)")
+    args = parser.parse_args()
+
+    configure(DEFAULT_DATABASE_URL)
+    from app.core.config import settings
+    from tests.mcp_stub import run_stub
+
+    with run_stub() as stub:
+        stub.delay = args.delay
+        settings.search_mcp_url = stub.url
+        print(json.dumps(asyncio.run(run(stub, args.calls, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
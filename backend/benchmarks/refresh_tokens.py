@@ -0,0 +1,126 @@
+"""Refresh-token rotation throughput with a large token table.
+
+Seeds ``--tokens`` refresh-token rows (10M by default). ``--expired-pct``
+percent of them are already expired. Then ``--clients`` concurrent clients
+each rotate their own token chain through ``POST /auth/refresh`` for
+``--duration`` seconds, driving the ASGI app in-process. Afterwards it
+times a full purge of the expired rows using the lifespan job's batching.
+
+    python -m benchmarks.refresh_tokens --tokens 10000000 --clients 16
+    python -m benchmarks.refresh_tokens --tokens 100000 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_users, summarize
+
+
+def seed_tokens(engine, user_ids, count: int, expired_pct: float, seed: int = 42, batch: int = 20_000) -> None:
+    from app.db.models import RefreshToken, utcnow
+
+    rng = random.Random(seed)
+    now = utcnow()
+    buffer = []
+    with engine.begin() as conn:
+        for n in range(count):
+            expired = rng.random() * 100 < expired_pct
+            buffer.append({
+                "user_id": user_ids[n % len(user_ids)],
+                "token_hash": rng.randbytes(32),
+                "expires_at": now + timedelta(days=-1 if expired else 7),
+                "created_at": now,
+            })
+            if len(buffer) >= batch:
+                conn.execute(RefreshToken.__table__.insert(), buffer)
+                buffer.clear()
+        if buffer:
+            conn.execute(RefreshToken.__table__.insert(), buffer)
+
+
+def issue_tokens(engine, user_ids) -> list:
+    from app.core.security import create_refresh_token, hash_refresh_token, refresh_token_expiry
+    from app.db.models import RefreshToken
+
+    tokens = [create_refresh_token() for _ in user_ids]
+    with engine.begin() as conn:
+        conn.execute(RefreshToken.__table__.insert(), [
+            {"user_id": user_id, "token_hash": hash_refresh_token(token), "expires_at": refresh_token_expiry()}
+            for user_id, token in zip(user_ids, tokens)
+        ])
+    return tokens
+
+
+async def run(tokens, duration: float, batch_size: int) -> dict:
+    import httpx
+    from app.db.database import async_engine
+    from app.main import app
+    from app.services.token_purge import RefreshTokenPurger
+
+    latencies = []
+    failures = 0
+
+    async def rotate(token):
+        nonlocal failures
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post("/auth/refresh", headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+                return
+            token = response.json()["refresh_token"]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(rotate(token) for token in tokens))
+        result = summarize("refresh", latencies, time.perf_counter() - started)
+    result["failures"] = failures
+
+    purger = RefreshTokenPurger(interval_seconds=0, batch_size=batch_size)
+    started = time.perf_counter()
+    purged = await purger.purge_once()
+    elapsed = time.perf_counter() - started
+    result["purge"] = {
+        "rows": purged,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(purged / elapsed) if elapsed else 0,
+    }
+    await async_engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--tokens", type=int, default=10_000_000)
+    parser.add_argument("--expired-pct", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent rotating clients")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--purge-batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.db.database import engine
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, max(args.users, args.clients))
+    started = time.perf_counter()
+    seed_tokens(engine, user_ids, args.tokens, args.expired_pct)
+    seeded = time.perf_counter() - started
+    tokens = issue_tokens(engine, user_ids[:args.clients])
+
+    result = asyncio.run(run(tokens, args.duration, args.purge_batch_size))
+    result["stored_tokens"] = args.tokens
+    result["seed_seconds"] = round(seeded, 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
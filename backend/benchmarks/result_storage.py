@@ -0,0 +1,207 @@
+"""Storage of search results inline versus in the shared document store.
+
+Seeds ``--rows`` searches by ``--users`` users the way they were stored
+before ``search_documents`` existed, with the whole provider response in
+``search_history.results``. Queries follow a Zipf distribution over
+``--topics`` topics. Each topic returns ``--results`` pages drawn from a
+shared pool in which popular pages recur across topics, with 300-1500
+bytes of content and a score per search. It then:
+
+- measures the size of every table, indexes included, after a VACUUM
+- fetches ``/search/history`` and a few ``/search/history/{id}`` entries
+  of ``--check-users`` users through the ASGI app
+- moves the results over with ``result_documents.backfill`` (timed)
+- measures again and checks the same requests return the same documents
+
+Listing latencies are reported for both layouts.
+
+    python -m benchmarks.result_storage
+    python -m benchmarks.result_storage --rows 200000 --users 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_users, summarize
+
+WORDS = (
+    "python async database index vector latency cache query model token stream chocolate cake "
+    "recipe garden travel budget flight hotel camera lens review football score weather forecast "
+    "mortgage rate guitar chord history rome physics quantum protein diet running shoes the of and "
+    "to in is for with on how what best guide free new"
+).split()
+TABLES = ("search_history", "search_documents", "search_history_documents")
+
+
+def text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def build_topics(args, rng: random.Random) -> list:
+    """``(query, [page index, ...])`` per topic; pages are drawn with a
+    Zipf skew so the popular ones show up under many topics."""
+    weights = [1 / (n + 1) for n in range(args.pages)]
+    topics = []
+    for n in range(args.topics):
+        pages = []
+        while len(pages) < args.results:
+            page = rng.choices(range(args.pages), weights)[0]
+            if page not in pages:
+                pages.append(page)
+        topics.append((f"{text(rng, 20)} {n}", pages))
+    return topics
+
+
+def seed_inline(engine, user_ids, args) -> None:
+    from app.db.models import SearchHistory
+
+    rng = random.Random(42)
+    pages = [
+        {
+            "title": text(rng, rng.randint(30, 80)),
+            "url": f"https://site{rng.randrange(500)}.example.com/{n}",
+            "content": text(rng, rng.randint(300, 1500)),
+            "raw_content": None,
+        }
+        for n in range(args.pages)
+    ]
+    topics = build_topics(args, rng)
+    weights = [1 / (n + 1) ** 1.1 for n in range(len(topics))]
+    start = datetime(2024, 1, 1)
+    buffer = []
+    with engine.begin() as conn:
+        for n in range(args.rows):
+            query, topic_pages = rng.choices(topics, weights)[0]
+            results = [
+                {**pages[page], "score": round(0.95 - rank * 0.05 + rng.uniform(-0.02, 0.02), 6)}
+                for rank, page in enumerate(topic_pages)
+            ]
+            buffer.append({
+                "user_id": rng.choice(user_ids),
+                "query": query,
+                "results": {
+                    "query": query,
+                    "results": results,
+                    "total_results": len(results),
+                    "meta_data": {"source": "tavily_mcp", "max_results": args.results, "cached": False},
+                },
+                "meta_data": {"max_results": args.results},
+                "created_at": start + timedelta(seconds=n * 30),
+            })
+            if len(buffer) >= 5000:
+                conn.execute(SearchHistory.__table__.insert(), buffer)
+                buffer.clear()
+        if buffer:
+            conn.execute(SearchHistory.__table__.insert(), buffer)
+
+
+def vacuum(engine) -> None:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM FULL" if engine.dialect.name == "postgresql" else "VACUUM")
+
+
+def table_sizes(engine) -> dict:
+    """Bytes used per table, its indexes included."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            sizes = {
+                name: conn.exec_driver_sql(f"SELECT pg_total_relation_size('{name}')").scalar()
+                for name in TABLES
+            }
+        else:
+            rows = conn.exec_driver_sql(
+                "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                "GROUP BY m.tbl_name"
+            ).all()
+            sizes = {name: dict(rows).get(name, 0) for name in TABLES}
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+async def snapshot(users, args) -> tuple:
+    """The checked users' history listings and entries, and listing latencies."""
+    import httpx
+    from app.core.security import create_user_access_token
+    from app.main import app
+
+    documents, latencies = {}, []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for user in users:
+            headers = {"Authorization": f"Bearer {create_user_access_token(user)}"}
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = await client.get("/search/history", params={"limit": args.limit}, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+            listing = response.json()
+            documents[f"{user.id}:history"] = listing
+            for entry in listing[:3]:
+                response = await client.get(f"/search/history/{entry['id']}", headers=headers)
+                response.raise_for_status()
+                documents[f"{user.id}:{entry['id']}"] = response.json()
+    return documents, summarize("history listing", latencies, sum(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=50_000, help="searches across all users")
+    parser.add_argument("--topics", type=int, default=5000, help="distinct queries")
+    parser.add_argument("--pages", type=int, default=20_000, help="distinct result pages")
+    parser.add_argument("--results", type=int, default=10, help="results per search")
+    parser.add_argument("--check-users", type=int, default=20, help="users whose responses are compared")
+    parser.add_argument("--limit", type=int, default=20, help="history page size")
+    parser.add_argument("--repeat", type=int, default=10, help="listing requests per checked user")
+    parser.add_argument("--batch-size", type=int, default=1000, help="backfill batch size")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    from app.db import result_documents
+    from app.db.database import async_engine, engine
+    from app.db.models import User
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, args.users)
+    seed_inline(engine, user_ids, args)
+    vacuum(engine)
+    with engine.connect() as conn:
+        users = conn.execute(
+            User.__table__.select().with_only_columns(
+                User.id, User.email, User.is_active, User.is_admin, User.token_epoch
+            ).where(User.id.in_(user_ids[:args.check_users]))
+        ).all()
+
+    result = {"rows": args.rows, "users": args.users, "before_bytes": table_sizes(engine)}
+    before, result["before_listing"] = asyncio.run(snapshot(users, args))
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        result["backfilled_rows"] = result_documents.backfill(conn, args.batch_size, commit_each_batch=True)
+    result["backfill_seconds"] = round(time.perf_counter() - started, 2)
+    vacuum(engine)
+    with engine.connect() as conn:
+        result["documents"] = conn.exec_driver_sql("SELECT COUNT(*) FROM search_documents").scalar()
+    result["after_bytes"] = table_sizes(engine)
+    result["total_ratio"] = round(result["after_bytes"]["total"] / result["before_bytes"]["total"], 3)
+
+    after, result["after_listing"] = asyncio.run(snapshot(users, args))
+    asyncio.run(async_engine.dispose())
+    result["responses_identical"] = after == before
+    print(json.dumps(result, indent=2))
+    if after != before:
+        raise SystemExit("responses changed after the backfill")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Lookup cost of the similar-search index at ``--rows`` entries per user.
+
+Seeds one user with ``--rows`` search history rows whose queries are drawn
+from a fixed vocabulary, then measures:
+
+- ``rebuild``: the first lookup, which embeds every past query and saves
+  the index file
+- ``load``: memory-mapping the saved files again, as at startup
+- ``lookup``: ``--lookups`` in-process lookups, query embedding and top-k
+  included (the database version check is not part of this one)
+- ``insert``: applying one committed search to the index
+- ``endpoint``: ``GET /search/similar`` through the ASGI app, with the
+  version check and the loading of the matched rows
+
+The index files go to a temporary directory.
+
+    python -m benchmarks.similar_searches
+    python -m benchmarks.similar_searches --rows 200000 --k 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_users, summarize
+
+WORDS = (
+    "python async database index vector latency cache query model token stream chocolate cake "
+    "recipe garden travel budget flight hotel camera lens review football score weather forecast "
+    "mortgage rate guitar chord history rome physics quantum protein diet running shoes"
+).split()
+
+
+def random_query(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def seed_queries(engine, user_id: int, rows: int, seed: int = 42, batch: int = 10_000) -> None:
+    from app.db.models import SearchHistory, utcnow
+
+    rng = random.Random(seed)
+    now = utcnow()
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(SearchHistory.__table__.insert(), [
+                {"user_id": user_id, "query": random_query(rng), "results": {}, "meta_data": {}, "created_at": now}
+                for _ in range(min(batch, rows - start))
+            ])
+
+
+async def run(user, args) -> dict:
+    import httpx
+    from app.core.security import create_user_access_token
+    from app.db.database import AsyncSessionLocal, async_engine
+    from app.main import app
+    from app.services.similar_searches import similar_searches
+
+    rng = random.Random(7)
+    result = {}
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        await similar_searches.search(db, user.id, "warm up", args.k)
+        result["rebuild_seconds"] = round(time.perf_counter() - started, 3)
+
+    await similar_searches.stop()
+    started = time.perf_counter()
+    await similar_searches.start()
+    result["load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    index = similar_searches.loaded(user.id)
+    result["entries"] = len(index)
+
+    latencies = []
+    for _ in range(args.lookups):
+        text = random_query(rng)
+        started = time.perf_counter()
+        index.top(similar_searches.embed([text])[0], args.k)
+        latencies.append(time.perf_counter() - started)
+    result["lookup"] = summarize("lookup", latencies, sum(latencies))
+
+    latencies = []
+    for n in range(args.lookups):
+        started = time.perf_counter()
+        similar_searches.apply([(user.id, 10_000_000 + n, random_query(rng))], 1)
+        latencies.append(time.perf_counter() - started)
+    result["insert"] = summarize("insert", latencies, sum(latencies))
+
+    headers = {"Authorization": f"Bearer {create_user_access_token(user)}"}
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in range(args.requests + 5):
+            started = time.perf_counter()
+            response = await client.get(
+                "/search/similar", params={"q": random_query(rng), "k": args.k}, headers=headers
+            )
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            if n >= 5:
+                latencies.append(elapsed)
+    result["endpoint"] = summarize("endpoint", latencies, sum(latencies))
+    # The first lookup, plus one by the endpoint: the inserts above never
+    # reached the database, so the versions disagree
+    result["rebuilds"] = similar_searches.rebuilds
+    await async_engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=100_000, help="past searches of the user")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=1000, help="in-process lookups and inserts")
+    parser.add_argument("--requests", type=int, default=200, help="endpoint requests")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    os.environ["SIMILAR_SEARCH_INDEX_DIR"] = tempfile.mkdtemp(prefix="similar-search-bench-")
+    from app.db.database import engine
+    from app.db.models import User
+
+    reset_schema(engine)
+    user_id = seed_users(engine, 1)[0]
+    seed_queries(engine, user_id, args.rows)
+    with engine.connect() as conn:
+        user = conn.execute(
+            User.__table__.select().with_only_columns(
+                User.id, User.email, User.is_active, User.is_admin, User.token_epoch
+            ).where(User.id == user_id)
+        ).one()
+
+    print(json.dumps(asyncio.run(run(user, args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
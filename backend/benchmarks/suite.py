@@ -0,0 +1,296 @@
+"""End-to-end benchmark suite for the API hot paths.
+
+``run`` seeds a throwaway database deterministically (``--users`` users
+sharing ``--history-rows`` search history rows), then drives the ASGI app
+in-process through ``httpx.ASGITransport``. Each scenario gets a warm-up,
+then ``--requests`` requests at ``--concurrency``. It reports latency
+percentiles, throughput and error counts. A second, shorter pass under
+``tracemalloc`` records the peak Python memory of each scenario. Results
+are written as JSON.
+
+The ``search`` scenario inserts history rows. With ``--skip-seed``, later
+runs therefore see a slightly larger table. Re-seed when comparing runs
+that have to match exactly.
+
+``compare`` reads a stored baseline and a new result file and flags any
+scenario whose p50/p95/p99 grew, or whose throughput fell, by more than
+``--threshold`` percent. It exits with status 1 when anything regressed,
+so it can gate CI.
+
+    python -m benchmarks.suite run --users 10000 --history-rows 1000000 --output new.json
+    python -m benchmarks.suite run --database-url postgresql://bench@localhost/bench
+    python -m benchmarks.suite run --skip-seed --scenarios search dashboard_search
+    python -m benchmarks.suite compare baseline.json new.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from benchmarks.common import DEFAULT_DATABASE_URL, configure, reset_schema, seed_search_history, seed_users, summarize
+
+PASSWORD = "benchmark-password"
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+# Scenarios: each takes (client, headers, email, rng) and issues one request.
+
+async def search(client, headers, email, rng):
+    query = f"benchmark topic {rng.randrange(500)}"
+    return await client.post("/search/", json={"query": query, "max_results": 5}, headers=headers)
+
+
+async def dashboard_history(client, headers, email, rng):
+    return await client.get("/dashboard/search", params={"limit": 20}, headers=headers)
+
+
+async def dashboard_search(client, headers, email, rng):
+    term = f"query {rng.randrange(10_000)}"
+    return await client.get("/dashboard/search", params={"search": term, "limit": 20}, headers=headers)
+
+
+async def dashboard_stats(client, headers, email, rng):
+    return await client.get("/dashboard/stats", params={"days": 30}, headers=headers)
+
+
+async def login(client, headers, email, rng):
+    return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+
+async def export_csv(client, headers, email, rng):
+    return await client.get("/dashboard/export/csv", params={"data_type": "searches"}, headers=headers)
+
+
+async def export_pdf(client, headers, email, rng):
+    return await client.get("/dashboard/export/pdf", params={"data_type": "searches"}, headers=headers)
+
+
+SCENARIOS = {
+    "search": search,
+    "dashboard_history": dashboard_history,
+    "dashboard_search": dashboard_search,
+    "dashboard_stats": dashboard_stats,
+    "login": login,
+    "export_csv": export_csv,
+    "export_pdf": export_pdf,
+}
+# Whole-history exports are much slower per request than the rest
+HEAVY_SCENARIOS = {"export_csv", "export_pdf"}
+
+
+def seed(engine, users: int, history_rows: int, seed_value: int) -> None:
+    from app.core.password import get_password_hash
+    from app.db.rollups import rebuild
+
+    reset_schema(engine)
+    user_ids = seed_users(engine, users, hashed_password=get_password_hash(PASSWORD))
+    seed_search_history(engine, user_ids, max(1, history_rows // users), seed=seed_value)
+    rebuild(engine)
+
+
+def load_users(engine, limit: int) -> list:
+    from sqlalchemy import select
+    from app.db.models import User
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(User.id, User.email, User.is_active, User.is_admin, User.token_epoch)
+            .order_by(User.id)
+            .limit(limit)
+        ).all()
+    if not rows:
+        raise SystemExit("The benchmark database has no users; run without --skip-seed first")
+    return [SimpleNamespace(**row._mapping) for row in rows]
+
+
+def count_rows(engine) -> dict:
+    from sqlalchemy import func, select
+    from app.db.models import SearchHistory, User
+
+    with engine.connect() as conn:
+        return {
+            "users": conn.execute(select(func.count()).select_from(User)).scalar_one(),
+            "history_rows": conn.execute(select(func.count()).select_from(SearchHistory)).scalar_one(),
+        }
+
+
+async def drive(client, scenario, identities, requests: int, concurrency: int, rng_seed: int):
+    """Issue ``requests`` requests at ``concurrency``; returns latencies, errors, elapsed."""
+    rng = random.Random(rng_seed)
+    plan = [(identities[rng.randrange(len(identities))], rng.randrange(2**32)) for _ in range(requests)]
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(identity, request_seed):
+        nonlocal errors
+        headers, email = identity
+        async with semaphore:
+            started = time.perf_counter()
+            response = await scenario(client, headers, email, random.Random(request_seed))
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(identity, request_seed) for identity, request_seed in plan))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_scenarios(args, users) -> dict:
+    import httpx
+    from app.core.security import create_user_access_token
+    from app.db.database import async_engine
+    from app.main import app
+    from app.services.search_cache import get_search_cache
+
+    identities = [
+        ({"Authorization": f"Bearer {create_user_access_token(user)}"}, user.email) for user in users
+    ]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in args.scenarios:
+                scenario = SCENARIOS[name]
+                requests = args.heavy_requests if name in HEAVY_SCENARIOS else args.requests
+                await get_search_cache().clear()
+                await drive(client, scenario, identities, args.warmup, args.concurrency, args.seed)
+
+                latencies, errors, elapsed = await drive(
+                    client, scenario, identities, requests, args.concurrency, args.seed + 1
+                )
+                result = summarize(name, latencies, elapsed)
+                result["errors"] = errors
+
+                tracemalloc.start()
+                await drive(
+                    client, scenario, identities, min(requests, args.memory_requests), args.concurrency, args.seed + 2
+                )
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                result["peak_mib"] = round(peak / 2**20, 2)
+
+                results[name] = result
+                print(f"{name}: p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                      f"{result['throughput_rps']} req/s", file=sys.stderr)
+    await async_engine.dispose()
+    return results
+
+
+def run(args) -> None:
+    configure(args.database_url)
+    from sqlalchemy.engine import make_url
+    from app.db.database import engine
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(engine, args.users, args.history_rows, args.seed)
+        print(f"seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": make_url(args.database_url).get_backend_name(),
+            **count_rows(engine),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "heavy_requests": args.heavy_requests,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": asyncio.run(run_scenarios(args, load_users(engine, args.active_users))),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+def change_pct(old: float, new: float) -> float:
+    if not old:
+        return 0.0
+    return round((new - old) / old * 100, 1)
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float, min_ms: float) -> dict:
+    """Per-scenario changes, with regressions listed separately."""
+    scenarios = {}
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        changes = {}
+        for key in LATENCY_KEYS:
+            pct = change_pct(old[key], new[key])
+            changes[key] = pct
+            # Ignore sub-millisecond jitter on very fast endpoints
+            if pct > threshold and new[key] - old[key] > min_ms:
+                regressions.append(f"{name} {key} {old[key]} -> {new[key]} (+{pct}%)")
+        pct = change_pct(old["throughput_rps"], new["throughput_rps"])
+        changes["throughput_rps"] = pct
+        if pct < -threshold:
+            regressions.append(f"{name} throughput_rps {old['throughput_rps']} -> {new['throughput_rps']} ({pct}%)")
+        if new.get("errors", 0) > old.get("errors", 0):
+            regressions.append(f"{name} errors {old.get('errors', 0)} -> {new['errors']}")
+        scenarios[name] = changes
+    return {"threshold_pct": threshold, "scenarios": scenarios, "regressions": regressions}
+
+
+def compare(args) -> None:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("database", "users", "history_rows", "concurrency"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: {key} differs ({baseline['meta'].get(key)} vs {current['meta'].get(key)})",
+                  file=sys.stderr)
+    report = compare_reports(baseline, current, args.threshold, args.min_ms)
+    print(json.dumps(report, indent=2))
+    if report["regressions"]:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed the database and benchmark the scenarios")
+    run_parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    run_parser.add_argument("--users", type=int, default=1_000)
+    run_parser.add_argument("--history-rows", type=int, default=100_000, help="spread evenly over the users")
+    run_parser.add_argument("--active-users", type=int, default=100, help="users the requests are spread over")
+    run_parser.add_argument("--skip-seed", action="store_true", help="reuse the already seeded database")
+    run_parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    run_parser.add_argument("--heavy-requests", type=int, default=20, help="measured requests per export scenario")
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--memory-requests", type=int, default=50, help="requests in the tracemalloc pass")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", help="also write the JSON report to this file")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline report")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    compare_parser.add_argument("--min-ms", type=float, default=1.0, help="ignore latency changes below this")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
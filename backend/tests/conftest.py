@@ -1,11 +1,28 @@
+import os
+import tempfile
 import pytest
 import asyncio
+
+# Keep generated images out of the working tree
+os.environ["BLOB_STORE_PATH"] = tempfile.mkdtemp(prefix="mindcanvas-blobs-")
+os.environ["SIMILAR_SEARCH_INDEX_DIR"] = tempfile.mkdtemp(prefix="mindcanvas-similar-")
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from fastapi.testclient import TestClient
 from app.main import app
-from app.db.database import get_db, Base
-from app.core.security import create_access_token
+from app.core.metrics import instrument_engine
+from app.db.database import get_db, Base, to_async_url
+from app.core.security import create_user_access_token
+from app.core.principal_cache import principal_cache
+from app.services.search_cache import get_search_cache
+from app.services.image_jobs import image_job_manager
+from app.services.history_writer import history_writer
+from app.services.token_purge import refresh_token_purger
+from app.services.history_retention import history_retention
+from app.services.admission import get_admission_controller
+from app.services.similar_searches import similar_searches
 from app.db.models import User
 from app.core.password import get_password_hash
 
@@ -14,14 +31,23 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+# The app talks to the same file through the async driver
+async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL))
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+instrument_engine(async_engine, pool_label="test")
+
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+# Background tasks open their own sessions
+image_job_manager.session_factory = TestingAsyncSessionLocal
+history_writer.session_factory = TestingAsyncSessionLocal
+refresh_token_purger.session_factory = TestingAsyncSessionLocal
+history_retention.session_factory = TestingAsyncSessionLocal
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -30,6 +56,31 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """Principals are cached per process; start every test cold."""
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+@pytest.fixture(autouse=True)
+def clear_search_cache():
+    """Search results are cached per process; start every test cold."""
+    asyncio.run(get_search_cache().clear())
+    yield
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Rate limit buckets are per process; give every test full buckets."""
+    asyncio.run(get_admission_controller().reset())
+    yield
+
+@pytest.fixture(autouse=True)
+def clear_similar_search_index():
+    """Test databases reuse user ids; start every test without indexes."""
+    similar_searches.reset()
+    yield
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database session for each test."""
@@ -52,6 +103,13 @@ def client():
     from fastapi.testclient import TestClient
     return TestClient(app)
 
+@pytest.fixture
+def live_client():
+    """Client that runs the app lifespan (background workers included)."""
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
+
 @pytest.fixture
 def test_user(db_session):
     """Create a test user."""
@@ -69,5 +127,5 @@ def test_user(db_session):
 @pytest.fixture
 def auth_headers(test_user):
     """Create authentication headers for test user."""
-    access_token = create_access_token(data={"sub": test_user.email})
+    access_token = create_user_access_token(test_user)
     return {"Authorization": f"Bearer {access_token}"}
\ No newline at end of file
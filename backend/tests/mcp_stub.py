@@ -0,0 +1,111 @@
+"""Local stand-in for the search and image MCP servers.
+
+Serves MCP ``tools/call`` requests over HTTP on 127.0.0.1 from a background
+uvicorn thread, and records how many TCP connections and requests it saw so
+tests and benchmarks can check connection reuse without network access.
+
+    with run_stub() as stub:
+        settings.search_mcp_url = stub.url
+"""
+import asyncio
+import contextlib
+import json
+import socket
+import threading
+import time
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+PIXEL_PNG = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
+
+
+class StubState:
+    def __init__(self):
+        self.url = None
+        self.requests = 0
+        self.connections = set()
+        # Artificial provider latency in seconds
+        self.delay = 0.0
+        # Answer as a text/event-stream, as streamable HTTP servers may
+        self.event_stream = False
+        # (content type, body) sent instead of the tool result
+        self.raw_reply = None
+
+    def reset(self):
+        self.requests = 0
+        self.connections.clear()
+
+
+def _tool_result(name: str, arguments: dict) -> dict:
+    if name == "search":
+        query = arguments["query"]
+        results = [
+            {"title": f"Stub result {i + 1} for: {query}", "url": f"https://stub.local/{i + 1}",
+             "content": f"Stub content about {query}.", "score": 1.0 - i * 0.1}
+            for i in range(min(arguments.get("max_results", 10), 5))
+        ]
+        return {"query": query, "results": results, "total_results": len(results),
+                "meta_data": {"source": "mcp_stub"}}
+    if name == "generate_image":
+        return {"prompt": arguments["prompt"], "image_url": None, "image_data": PIXEL_PNG,
+                "meta_data": {"source": "mcp_stub", "width": arguments.get("width"),
+                              "height": arguments.get("height"), "steps": arguments.get("steps")}}
+    raise KeyError(name)
+
+
+def build_app(state: StubState) -> Starlette:
+    async def rpc(request: Request):
+        state.requests += 1
+        state.connections.add(request.client)
+        if state.delay:
+            await asyncio.sleep(state.delay)
+        if state.raw_reply is not None:
+            content_type, raw = state.raw_reply
+            return Response(raw, media_type=content_type)
+        body = await request.json()
+        params = body.get("params", {})
+        try:
+            structured = _tool_result(params.get("name"), params.get("arguments", {}))
+        except KeyError:
+            message = {"jsonrpc": "2.0", "id": body.get("id"),
+                       "error": {"code": -32602, "message": "Unknown tool"}}
+        else:
+            message = {
+                "jsonrpc": "2.0",
+                "id": body.get("id"),
+                "result": {"content": [{"type": "text", "text": json.dumps(structured)}]},
+            }
+        if state.event_stream:
+            notice = {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progress": 1}}
+            events = f"event: message\ndata: {json.dumps(notice)}\n\nevent: message\ndata: {json.dumps(message)}\n\n"
+            return Response(events, media_type="text/event-stream")
+        return JSONResponse(message)
+
+    return Starlette(routes=[Route("/mcp", rpc, methods=["POST"])])
+
+
+@contextlib.contextmanager
+def run_stub():
+    """Serve the stub on a free local port for the duration of the block."""
+    state = StubState()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(build_app(state), log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("MCP stub did not start")
+        time.sleep(0.01)
+    state.url = f"http://127.0.0.1:{port}/mcp"
+    try:
+        yield state
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        sock.close()
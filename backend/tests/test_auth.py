@@ -65,4 +65,140 @@ def test_get_current_user(client: TestClient, auth_headers):
 def test_get_current_user_unauthorized(client: TestClient):
     """Test getting current user without authentication."""
     response = client.get("/auth/me")
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+
+def test_login_rehashes_outdated_cost_factor(client: TestClient, db_session):
+    """Hashes made with another bcrypt cost are upgraded on login."""
+    from passlib.context import CryptContext
+    from app.core.config import settings
+    from app.db.models import User
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("oldcost123")
+    user = User(email="oldcost@example.com", full_name="Old Cost", hashed_password=old_hash)
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post(
+        "/auth/login",
+        json={"email": "oldcost@example.com", "password": "oldcost123"}
+    )
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    new_hash = db_session.get(User, user.id).hashed_password
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+
+def test_login_returns_503_when_hasher_saturated(client: TestClient, test_user, monkeypatch):
+    """Logins are shed with 503 once the bcrypt queue is full."""
+    from app.core.password import password_hasher
+
+    monkeypatch.setattr(
+        password_hasher, "pending", password_hasher.max_workers + password_hasher.max_queue
+    )
+    response = client.post(
+        "/auth/login",
+        json={"email": test_user.email, "password": "testpassword123"}
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+def test_token_without_user_claims_rejected(client: TestClient, test_user):
+    """Tokens must carry the user id and epoch claims."""
+    from app.core.security import create_access_token
+
+    token = create_access_token(data={"sub": test_user.email})
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+def test_logout_revokes_access_token(client: TestClient, auth_headers):
+    """Logging out bumps the token epoch so earlier tokens stop working."""
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+    response = client.post("/auth/logout", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = client.get("/auth/me", headers=auth_headers)
+    assert response.status_code == 401
+
+def test_deactivated_user_token_rejected(client: TestClient, test_user, auth_headers):
+    """Deactivating a user invalidates their cached principal and tokens."""
+    import asyncio
+    from app.db.crud import deactivate_user
+    from tests.conftest import TestingAsyncSessionLocal
+
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+    async def deactivate():
+        async with TestingAsyncSessionLocal() as db:
+            await deactivate_user(db, test_user.id)
+
+    asyncio.run(deactivate())
+    assert client.get("/auth/me", headers=auth_headers).status_code == 401
+
+def login_tokens(client: TestClient, user) -> dict:
+    response = client.post("/auth/login", json={"email": user.email, "password": "testpassword123"})
+    assert response.status_code == 200
+    return response.json()
+
+def test_refresh_token_rotates_once(client: TestClient, test_user, db_session):
+    """A refresh token is stored hashed and can be exchanged exactly once."""
+    from app.core.security import hash_refresh_token
+    from app.db.models import RefreshToken
+
+    refresh = login_tokens(client, test_user)["refresh_token"]
+    stored = db_session.query(RefreshToken).one()
+    assert stored.token_hash == hash_refresh_token(refresh)
+    assert stored.expires_at is not None
+
+    response = client.post("/auth/refresh", headers={"Authorization": f"Bearer {refresh}"})
+    assert response.status_code == 200
+    rotated = response.json()["refresh_token"]
+    assert rotated != refresh
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"}).status_code == 200
+
+    # The old token was consumed
+    response = client.post("/auth/refresh", headers={"Authorization": f"Bearer {refresh}"})
+    assert response.status_code == 401
+    response = client.post("/auth/refresh", headers={"Authorization": f"Bearer {rotated}"})
+    assert response.status_code == 200
+
+def test_refresh_rejects_expired_and_revoked_tokens(client: TestClient, test_user, db_session):
+    from app.db.models import RefreshToken, utcnow
+    from datetime import timedelta
+
+    expired = login_tokens(client, test_user)["refresh_token"]
+    db_session.query(RefreshToken).update({"expires_at": utcnow() - timedelta(minutes=1)})
+    db_session.commit()
+    response = client.post("/auth/refresh", headers={"Authorization": f"Bearer {expired}"})
+    assert response.status_code == 401
+
+    tokens = login_tokens(client, test_user)
+    client.post("/auth/logout", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    response = client.post("/auth/refresh", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+
+def test_purge_deletes_expired_tokens_in_batches(test_user, db_session):
+    """The purge job removes expired rows only, one bounded batch at a time."""
+    import asyncio
+    import os
+    from datetime import timedelta
+    from app.db.models import RefreshToken, utcnow
+    from app.services.token_purge import RefreshTokenPurger
+    from tests.conftest import TestingAsyncSessionLocal
+
+    now = utcnow()
+    db_session.bulk_insert_mappings(RefreshToken, [
+        {
+            "user_id": test_user.id,
+            "token_hash": os.urandom(32),
+            "expires_at": now + timedelta(days=-1 if n < 25 else 1),
+        }
+        for n in range(30)
+    ])
+    db_session.commit()
+
+    purger = RefreshTokenPurger(interval_seconds=3600, batch_size=10, session_factory=TestingAsyncSessionLocal)
+    assert asyncio.run(purger.purge_once()) == 25
+    assert db_session.query(RefreshToken).count() == 5
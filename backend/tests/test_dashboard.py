@@ -1,3 +1,7 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timezone
 import pytest
 from fastapi.testclient import TestClient
 
@@ -35,4 +39,417 @@ def test_delete_search_unauthorized(client: TestClient):
 def test_delete_image_unauthorized(client: TestClient):
     """Test deleting image without authentication."""
     response = client.delete("/dashboard/image/1")
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+
+def _record_searches(client: TestClient, auth_headers, queries):
+    for query in queries:
+        response = client.post(
+            "/search/", json={"query": query, "max_results": 1}, headers=auth_headers
+        )
+        assert response.status_code == 200
+
+def test_dashboard_search_filter_runs_in_database(client: TestClient, auth_headers):
+    """The text filter applies before pagination, not to a single page."""
+    _record_searches(client, auth_headers, ["Python asyncio"] + [f"unrelated {i}" for i in range(5)])
+
+    response = client.get(
+        "/dashboard/search?search=ASYNC&skip=0&limit=2", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert [s["query"] for s in response.json()] == ["Python asyncio"]
+
+def test_dashboard_search_filter_short_and_special_terms(client: TestClient, auth_headers):
+    """Short terms and LIKE wildcards are matched literally."""
+    _record_searches(client, auth_headers, ["50% off deals", "go lang", "golang"])
+
+    response = client.get("/dashboard/search?search=go", headers=auth_headers)
+    assert sorted(s["query"] for s in response.json()) == ["go lang", "golang"]
+
+    response = client.get("/dashboard/search?search=%25", headers=auth_headers)
+    assert [s["query"] for s in response.json()] == ["50% off deals"]
+
+def test_dashboard_short_term_pages_by_cursor(client: TestClient, auth_headers):
+    """Terms too short to rank keep time order, so their pages carry a cursor."""
+    _record_searches(client, auth_headers, [f"go {n}" for n in range(3)] + ["other"])
+
+    response = client.get("/dashboard/search?search=go&limit=2", headers=auth_headers)
+    assert [s["query"] for s in response.json()] == ["go 2", "go 1"]
+    cursor = response.headers["x-next-cursor"]
+    response = client.get(f"/dashboard/search?search=go&limit=2&cursor={cursor}", headers=auth_headers)
+    assert [s["query"] for s in response.json()] == ["go 0"]
+    assert "x-next-cursor" not in response.headers
+
+    # Ranked matches still have no cursor
+    response = client.get("/dashboard/search?search=other&limit=1", headers=auth_headers)
+    assert [s["query"] for s in response.json()] == ["other"]
+    assert "x-next-cursor" not in response.headers
+
+def test_dashboard_images_filter(client: TestClient, auth_headers):
+    """Image prompts are filtered in the database as well."""
+    for prompt in ["A red fox at dawn", "blue ocean"]:
+        client.post("/image/generate", json={"prompt": prompt}, headers=auth_headers)
+
+    response = client.get("/dashboard/images?search=fox", headers=auth_headers)
+    assert response.status_code == 200
+    assert [i["prompt"] for i in response.json()] == ["A red fox at dawn"]
+
+def test_dashboard_summary_view(client: TestClient, auth_headers):
+    """Dashboard listings support the summary view with filtering."""
+    _record_searches(client, auth_headers, ["summary dashboard"])
+
+    response = client.get(
+        "/dashboard/search?view=summary&search=dashboard", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["results_count"] == 1
+    assert "results" not in response.json()[0]
+
+    response = client.get("/dashboard/images?view=summary", headers=auth_headers)
+    assert response.status_code == 200
+
+# Set EXPORT_TEST_ROWS (e.g. 500000) to export a large table and check
+# that peak memory stays flat; the default run only checks completeness
+EXPORT_TEST_ROWS = int(os.environ.get("EXPORT_TEST_ROWS", "5000"))
+MEASURE_EXPORT_MEMORY = "EXPORT_TEST_ROWS" in os.environ
+
+
+def _rss_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"{field}:\s+(\d+)", f.read()).group(1))
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def test_export_csv_streams_without_row_cap(db_session, test_user, auth_headers):
+    """Large exports are complete and stream (with flat memory, when measured)."""
+    from sqlalchemy import insert
+    from app.db.models import SearchHistory
+    from app.main import app
+
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    batch = 50_000
+    for start in range(0, EXPORT_TEST_ROWS, batch):
+        db_session.execute(insert(SearchHistory), [
+            {"user_id": test_user.id, "query": f"export query {n}",
+             "results": {"results": [{}, {}]}, "meta_data": {}, "created_at": created_at}
+            for n in range(start, min(start + batch, EXPORT_TEST_ROWS))
+        ])
+        db_session.commit()
+
+    stats = {"status": None, "bytes": 0, "lines": 0, "chunks": 0}
+
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client never disconnects; block until the response completes
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            stats["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            stats["bytes"] += len(message["body"])
+            stats["lines"] += message["body"].count(b"\n")
+            stats["chunks"] += 1
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/dashboard/export/csv",
+        "raw_path": b"/dashboard/export/csv", "query_string": b"data_type=searches",
+        "root_path": "", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(b"authorization", auth_headers["Authorization"].encode())],
+    }
+
+    measured = MEASURE_EXPORT_MEMORY and _reset_peak_rss()
+    rss_before = _rss_kb("VmRSS")
+    asyncio.run(app(scope, receive, send))
+    peak_growth_mb = (_rss_kb("VmHWM") - rss_before) / 1024
+
+    assert stats["status"] == 200
+    # Title, header, one line per row and the trailing separator
+    assert stats["lines"] == EXPORT_TEST_ROWS + 3
+    assert stats["chunks"] > 1
+    if measured:
+        assert peak_growth_mb < 32, (
+            f"exported {stats['bytes'] / 2**20:.1f} MiB, peak RSS grew {peak_growth_mb:.1f} MiB"
+        )
+
+
+def test_export_pdf_is_well_formed(client: TestClient, db_session, test_user, auth_headers):
+    """The PDF export spans pages and its xref points at every object."""
+    import zlib
+    from sqlalchemy import insert
+    from app.db.models import SearchHistory
+
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    db_session.execute(insert(SearchHistory), [
+        {"user_id": test_user.id, "query": f"pdf query {n} (draft)",
+         "results": {"results": [{}]}, "meta_data": {}, "created_at": created_at}
+        for n in range(300)
+    ])
+    db_session.commit()
+
+    response = client.get("/dashboard/export/pdf?data_type=searches", headers=auth_headers)
+    assert response.status_code == 200
+    pdf = response.content
+    assert pdf.startswith(b"%PDF-1.4")
+    assert pdf.rstrip().endswith(b"%%EOF")
+
+    xref_offset = int(re.search(rb"startxref\n(\d+)\n", pdf).group(1))
+    assert pdf[xref_offset:].startswith(b"xref\n")
+    count = int(re.match(rb"xref\n0 (\d+)\n", pdf[xref_offset:]).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", pdf[xref_offset:])
+    assert len(entries) == count - 1
+    for number, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(b"%d 0 obj\n" % number)
+
+    # Five lines per search at 57 lines per page
+    pages = int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", pdf).group(1))
+    assert pages > 20
+    text = b"".join(
+        zlib.decompress(stream)
+        for stream in re.findall(rb"stream\n(.*?)\nendstream", pdf, re.S)
+    )
+    assert b"(Query: pdf query 299 \\(draft\\)) '" in text
+    assert b"(Query: pdf query 0 \\(draft\\)) '" in text
+
+def test_dashboard_stats_follow_inserts_and_deletes(client: TestClient, auth_headers):
+    """Rollups change with every history insert and delete."""
+    _record_searches(client, auth_headers, ["Rust async", "rust  ASYNC", "python"])
+    response = client.post(
+        "/search/batch",
+        json={"searches": [{"query": "python", "max_results": 1}, {"query": "go", "max_results": 1}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    for width in (512, 512, 1024):
+        response = client.post(
+            "/image/generate", json={"prompt": "a cat", "width": width, "height": width}, headers=auth_headers
+        )
+        assert response.status_code == 200
+
+    stats = client.get("/dashboard/stats?days=7&top=2", headers=auth_headers).json()
+    assert stats["total_searches"] == 5
+    assert stats["total_images"] == 3
+    assert len(stats["daily"]) == 7
+    assert stats["daily"][-1]["day"] == datetime.now(timezone.utc).date().isoformat()
+    assert stats["daily"][-1] == {"day": stats["daily"][-1]["day"], "searches": 5, "images": 3}
+    assert stats["top_queries"] == [{"query": "python", "count": 2}, {"query": "rust async", "count": 2}]
+    assert stats["image_sizes"] == [{"size": "512x512", "count": 2}, {"size": "1024x1024", "count": 1}]
+
+    searches = client.get("/dashboard/search?search=go", headers=auth_headers).json()
+    go = next(s for s in searches if s["query"] == "go")
+    assert client.delete(f"/dashboard/search/{go['id']}", headers=auth_headers).status_code == 200
+    images = client.get("/dashboard/images", headers=auth_headers).json()
+    big = next(i for i in images if i["meta_data"]["width"] == 1024)
+    assert client.delete(f"/dashboard/image/{big['id']}", headers=auth_headers).status_code == 200
+
+    stats = client.get("/dashboard/stats", headers=auth_headers).json()
+    assert stats["total_searches"] == 4
+    assert stats["total_images"] == 2
+    assert {"query": "go", "count": 1} not in stats["top_queries"]
+    assert stats["image_sizes"] == [{"size": "512x512", "count": 2}]
+
+def test_rollup_rebuild_matches_incremental(client: TestClient, auth_headers, test_user):
+    """Rebuilding from history reproduces the incrementally maintained rollups."""
+    from app.db.rollups import rebuild
+    from tests.conftest import engine
+
+    _record_searches(client, auth_headers, ["alpha", "Alpha", "beta"])
+    client.post("/image/generate", json={"prompt": "x", "width": 256, "height": 256}, headers=auth_headers)
+    before = client.get("/dashboard/stats", headers=auth_headers).json()
+
+    assert rebuild(engine, test_user.id) == 1
+    assert client.get("/dashboard/stats", headers=auth_headers).json() == before
+    assert before["top_queries"][0] == {"query": "alpha", "count": 2}
+
+def test_deleting_uncounted_history_keeps_rollups_non_negative(client: TestClient, db_session, test_user, auth_headers):
+    """History written before the rollups existed is deleted without driving them negative."""
+    from sqlalchemy import func, insert, select
+    from app.db.models import ImageHistory, SearchHistory, UserDailyActivity, UserImageSizeCount, UserQueryCount
+
+    _record_searches(client, auth_headers, ["counted"])
+    now = datetime.now(timezone.utc)
+    db_session.execute(insert(SearchHistory), [
+        {"user_id": test_user.id, "query": q, "results": {}, "meta_data": {}, "created_at": now}
+        for q in ("counted", "uncounted", "uncounted")
+    ])
+    db_session.execute(insert(ImageHistory), [
+        {"user_id": test_user.id, "prompt": "uncounted", "meta_data": {"width": 8, "height": 8}, "created_at": now}
+    ])
+    db_session.commit()
+
+    for kind in ("search", "images"):
+        response = client.request(
+            "DELETE", f"/dashboard/{kind}", json={"after": "2000-01-01T00:00:00Z"}, headers=auth_headers
+        )
+        assert response.status_code == 200
+    stats = client.get("/dashboard/stats", headers=auth_headers).json()
+    assert (stats["total_searches"], stats["total_images"]) == (0, 0)
+    assert stats["top_queries"] == [] and stats["image_sizes"] == []
+    # Emptied rows are removed rather than left at zero or below
+    db_session.expire_all()
+    for model in (UserDailyActivity, UserQueryCount, UserImageSizeCount):
+        assert db_session.scalar(select(func.count()).select_from(model)) == 0
+
+def test_dashboard_stats_etag(client: TestClient, auth_headers):
+    """Stats revalidate against both history collections."""
+    response = client.get("/dashboard/stats", headers=auth_headers)
+    etag = response.headers["etag"]
+    assert client.get("/dashboard/stats", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    client.post("/image/generate", json={"prompt": "x", "width": 256, "height": 256}, headers=auth_headers)
+    response = client.get("/dashboard/stats", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_images"] == 1
+
+def test_fast_json_listings_match_validated_output(client: TestClient, auth_headers, monkeypatch):
+    """The opt-in fast path returns the same documents and headers as the validated one."""
+    from app.core.config import settings
+
+    _record_searches(client, auth_headers, ["fast one", "fast two", "fast three"])
+    client.post("/image/generate", json={"prompt": "fast", "width": 256, "height": 256}, headers=auth_headers)
+    urls = [
+        "/search/history?limit=2",
+        "/search/history?view=summary",
+        "/image/history",
+        "/image/history?view=summary",
+        "/dashboard/search?search=fast",
+        "/dashboard/images?limit=1",
+    ]
+    validated = {url: client.get(url, headers=auth_headers) for url in urls}
+    monkeypatch.setattr(settings, "fast_json_responses", True)
+    for url in urls:
+        fast = client.get(url, headers=auth_headers)
+        assert fast.status_code == 200, url
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.json() == validated[url].json(), url
+        for header in ("etag", "x-next-cursor"):
+            assert fast.headers.get(header) == validated[url].headers.get(header), (url, header)
+    assert validated["/search/history?limit=2"].headers["x-next-cursor"]
+
+def test_bulk_delete_by_ids_and_range(client: TestClient, auth_headers):
+    """Bulk deletes remove the selected rows only and keep the stats in step."""
+    _record_searches(client, auth_headers, ["bulk a", "bulk b", "bulk c", "bulk d"])
+    searches = client.get("/dashboard/search", headers=auth_headers).json()
+    ids = [s["id"] for s in searches if s["query"] in ("bulk a", "bulk b")]
+
+    response = client.request("DELETE", "/dashboard/search", json={"ids": ids + [10**9]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 2}
+    remaining = {s["query"] for s in client.get("/dashboard/search", headers=auth_headers).json()}
+    assert remaining == {"bulk c", "bulk d"}
+    assert client.get("/dashboard/stats", headers=auth_headers).json()["total_searches"] == 2
+
+    response = client.request(
+        "DELETE", "/dashboard/search", json={"before": "2000-01-01T00:00:00Z"}, headers=auth_headers
+    )
+    assert response.json() == {"deleted": 0}
+    response = client.request(
+        "DELETE", "/dashboard/search", json={"after": "2000-01-01T00:00:00+02:00"}, headers=auth_headers
+    )
+    assert response.json() == {"deleted": 2}
+    assert client.get("/dashboard/stats", headers=auth_headers).json()["total_searches"] == 0
+
+    client.post("/image/generate", json={"prompt": "bulk", "width": 64, "height": 64}, headers=auth_headers)
+    response = client.request("DELETE", "/dashboard/images", json={"after": "2000-01-01T00:00:00"}, headers=auth_headers)
+    assert response.json() == {"deleted": 1}
+    assert client.request("DELETE", "/dashboard/images", json={}, headers=auth_headers).status_code == 422
+    assert client.request("DELETE", "/dashboard/images", json={"ids": []}, headers=auth_headers).status_code == 422
+
+def test_history_retention_purges_in_batches(client: TestClient, db_session, test_user, auth_headers):
+    """Retention deletes rows past the age and per-user row limits, batch by batch."""
+    from datetime import timedelta
+    from sqlalchemy import insert
+    from app.db.models import ImageHistory, SearchHistory
+    from app.db.rollups import rebuild
+    from app.services.history_retention import HistoryRetention
+    from tests.conftest import TestingAsyncSessionLocal, engine
+
+    now = datetime.now(timezone.utc)
+    db_session.execute(insert(SearchHistory), [
+        {"user_id": test_user.id, "query": f"kept {n}", "results": {}, "meta_data": {},
+         "created_at": now - timedelta(hours=n)}
+        for n in range(8)
+    ] + [
+        {"user_id": test_user.id, "query": f"old {n}", "results": {}, "meta_data": {},
+         "created_at": now - timedelta(days=40 + n)}
+        for n in range(3)
+    ])
+    db_session.execute(insert(ImageHistory), [
+        {"user_id": test_user.id, "prompt": f"old {n}", "meta_data": {"width": 8, "height": 8},
+         "created_at": now - timedelta(days=40 + n)}
+        for n in range(3)
+    ])
+    db_session.commit()
+    rebuild(engine, test_user.id)
+
+    retention = HistoryRetention(
+        keep_days=30, keep_rows=5, interval_seconds=0, batch_size=2, session_factory=TestingAsyncSessionLocal
+    )
+    assert asyncio.run(retention.purge_once()) == {"searches": 6, "images": 3, "documents": 0}
+    queries = {s["query"] for s in client.get("/dashboard/search", headers=auth_headers).json()}
+    assert queries == {f"kept {n}" for n in range(5)}
+
+    stats = client.get("/dashboard/stats?days=60", headers=auth_headers).json()
+    assert (stats["total_searches"], stats["total_images"]) == (5, 0)
+    rebuild(engine, test_user.id)
+    assert client.get("/dashboard/stats?days=60", headers=auth_headers).json() == stats
+    assert asyncio.run(retention.purge_once()) == {"searches": 0, "images": 0, "documents": 0}
+
+def test_history_row_limit_is_per_user_and_index_driven(db_session, test_user):
+    """The row limit trims each user's oldest rows without ranking the whole table."""
+    from datetime import timedelta
+    from sqlalchemy import event, func, insert, select
+    from app.db.models import SearchHistory, User
+    from app.services.history_retention import HistoryRetention
+    from tests.conftest import TestingAsyncSessionLocal, async_engine
+
+    other = User(email="other@example.com", full_name="Other", hashed_password="x", is_active=True)
+    db_session.add(other)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    db_session.execute(insert(SearchHistory), [
+        {"user_id": user_id, "query": f"q {n}", "results": {}, "meta_data": {},
+         "created_at": now - timedelta(minutes=n // 2)}  # pairs share a timestamp
+        for user_id, rows in ((test_user.id, 9), (other.id, 3))
+        for n in range(rows)
+    ])
+    db_session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    retention = HistoryRetention(
+        keep_days=0, keep_rows=4, interval_seconds=0, batch_size=2, session_factory=TestingAsyncSessionLocal
+    )
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert asyncio.run(retention.purge_once())["searches"] == 5
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert not any("OVER" in statement for statement in statements)
+
+    kept = db_session.execute(
+        select(SearchHistory.user_id, func.group_concat(SearchHistory.query))
+        .group_by(SearchHistory.user_id)
+        .order_by(SearchHistory.user_id)
+    ).all()
+    assert [(user_id, sorted(queries.split(","))) for user_id, queries in kept] == [
+        (test_user.id, ["q 0", "q 1", "q 2", "q 3"]),
+        (other.id, ["q 0", "q 1", "q 2"]),
+    ]
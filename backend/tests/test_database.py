@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db, to_async_url
+
+def test_to_async_url_postgres():
+    """Postgres URLs are rewritten to the asyncpg driver."""
+    assert to_async_url("postgresql://u:p@db/mc") == "postgresql+asyncpg://u:p@db/mc"
+    assert to_async_url("postgresql+psycopg2://u:p@db/mc") == "postgresql+asyncpg://u:p@db/mc"
+
+def test_to_async_url_sqlite():
+    """SQLite URLs are rewritten to the aiosqlite driver."""
+    assert to_async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+
+def test_to_async_url_unsupported():
+    """Backends without an async driver are rejected."""
+    with pytest.raises(ValueError):
+        to_async_url("mysql://u:p@db/mc")
+
+@pytest.mark.asyncio
+async def test_get_db_yields_async_session():
+    """The request dependency hands out AsyncSession objects."""
+    gen = get_db()
+    db = await gen.__anext__()
+    assert isinstance(db, AsyncSession)
+    await gen.aclose()
@@ -61,4 +61,270 @@ def test_get_image_history_pagination(client: TestClient, auth_headers):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
-    assert len(data) <= 5
\ No newline at end of file
+    assert len(data) <= 5
+
+
+def _generate_and_fetch_history(client: TestClient, auth_headers, prompt: str):
+    client.post("/image/generate", json={"prompt": prompt}, headers=auth_headers)
+    response = client.get("/image/history", headers=auth_headers)
+    return next(item for item in response.json() if item["prompt"] == prompt)
+
+def test_generated_image_stored_as_blob(client: TestClient, auth_headers):
+    """History rows reference the blob store instead of embedding base64."""
+    import base64
+    from app.services.mcp_client import generate_image
+    import asyncio
+
+    item = _generate_and_fetch_history(client, auth_headers, "blob test")
+    assert item["image_data"] is None
+    assert len(item["image_digest"]) == 64
+    assert item["image_mime"] == "image/png"
+    assert item["blob_url"] == f"/image/blob/{item['image_digest']}"
+
+    expected = base64.b64decode(asyncio.run(generate_image("blob test"))["image_data"])
+    response = client.get(item["blob_url"])
+    assert response.status_code == 200
+    assert response.content == expected
+    assert item["image_size"] == len(expected)
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{item["image_digest"]}"'
+    assert "immutable" in response.headers["cache-control"]
+
+def test_identical_images_deduplicated(client: TestClient, auth_headers):
+    """Identical bytes are stored once and shared by every row."""
+    import os
+    from app.services.blob_store import get_blob_store
+
+    first = _generate_and_fetch_history(client, auth_headers, "dedupe one")
+    second = _generate_and_fetch_history(client, auth_headers, "dedupe two")
+    assert first["image_digest"] == second["image_digest"]
+
+    path = get_blob_store().local_path(first["image_digest"])
+    assert os.listdir(os.path.dirname(path)) == [first["image_digest"]]
+
+def test_image_blob_conditional_and_range(client: TestClient, auth_headers):
+    """Blobs answer If-None-Match with 304 and serve byte ranges."""
+    item = _generate_and_fetch_history(client, auth_headers, "range test")
+    url = item["blob_url"]
+    full = client.get(url).content
+
+    response = client.get(url, headers={"If-None-Match": f'"{item["image_digest"]}"'})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == full[:8]
+    assert response.headers["content-range"] == f"bytes 0-7/{len(full)}"
+
+    response = client.get(url, headers={"Range": "bytes=-4"})
+    assert response.content == full[-4:]
+
+    response = client.get(url, headers={"Range": f"bytes={len(full)}-"})
+    assert response.status_code == 416
+
+def test_image_blob_unknown_digest(client: TestClient):
+    """Unknown or malformed digests are 404s."""
+    assert client.get("/image/blob/" + "0" * 64).status_code == 404
+    assert client.get("/image/blob/not-a-digest").status_code == 404
+
+def test_image_blob_zero_copy_when_server_supports_it(tmp_path):
+    """With the zerocopysend extension the file is handed to the server."""
+    import asyncio
+    from app.services.blob_store import LocalBlobStore
+    from app.services.blob_response import BlobResponse, ZEROCOPY_EXTENSION
+
+    store = LocalBlobStore(str(tmp_path))
+    blob = store.put(b"0123456789")
+    messages = []
+
+    async def send(message):
+        if message["type"] == ZEROCOPY_EXTENSION:
+            message = dict(message, data=message["file"].read())
+        messages.append(message)
+
+    response = BlobResponse(store, blob.digest, blob.size, "image/png", range_header="bytes=2-5")
+    scope = {"type": "http", "extensions": {ZEROCOPY_EXTENSION: {}}}
+    asyncio.run(response(scope, None, send))
+
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == ZEROCOPY_EXTENSION
+    assert (messages[1]["offset"], messages[1]["count"]) == (2, 4)
+
+def test_image_history_summary_view(client: TestClient, auth_headers):
+    """The summary view leaves out inline image data."""
+    item = _generate_and_fetch_history(client, auth_headers, "summary image")
+
+    response = client.get("/image/history?view=summary", headers=auth_headers)
+    assert response.status_code == 200
+    summary = response.json()[0]
+    assert summary["id"] == item["id"]
+    assert summary["blob_url"] == item["blob_url"]
+    assert "image_data" not in summary
+
+    response = client.get(f"/image/history/{item['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["image_digest"] == item["image_digest"]
+
+def _wait_for_job(client: TestClient, auth_headers, job_id: str, timeout: float = 5.0) -> dict:
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/image/jobs/{job_id}", headers=auth_headers).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_image_job_records_history_on_completion(live_client: TestClient, auth_headers):
+    """Submitting returns a job at once; the history row appears when it succeeds."""
+    response = live_client.post(
+        "/image/jobs", json={"prompt": "a queued sunset", "width": 256}, headers=auth_headers
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running")
+    assert response.headers["location"] == f"/image/jobs/{job['id']}"
+
+    job = _wait_for_job(live_client, auth_headers, job["id"])
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 100
+
+    entry = live_client.get(f"/image/history/{job['image_history_id']}", headers=auth_headers).json()
+    assert entry["prompt"] == "a queued sunset"
+    assert entry["meta_data"]["width"] == 256
+    assert entry["blob_url"]
+
+def test_image_job_event_stream(live_client: TestClient, auth_headers):
+    """The SSE stream reports progress and ends with the terminal state."""
+    import json
+
+    job = live_client.post("/image/jobs", json={"prompt": "streamed"}, headers=auth_headers).json()
+    with live_client.stream("GET", f"/image/jobs/{job['id']}/events", headers=auth_headers) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = [
+        json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")
+    ]
+    assert events[-1]["status"] == "succeeded"
+    assert events[-1]["image_history_id"] is not None
+    assert [e["progress"] for e in events] == sorted(e["progress"] for e in events)
+
+def test_image_job_not_found(live_client: TestClient, auth_headers):
+    assert live_client.get("/image/jobs/missing", headers=auth_headers).status_code == 404
+    assert live_client.get("/image/jobs/missing/events", headers=auth_headers).status_code == 404
+
+def test_image_jobs_per_user_cap(live_client: TestClient, auth_headers, monkeypatch):
+    """Users over their active job cap get a 429 until a job finishes."""
+    import asyncio
+    from app.services import image_jobs
+
+    release = asyncio.Event()
+
+    async def slow_generate(prompt, **params):
+        await release.wait()
+        return {"prompt": prompt, "image_url": "https://example.com/x.png", "meta_data": {}}
+
+    monkeypatch.setattr(image_jobs, "generate_image", slow_generate)
+    monkeypatch.setattr(image_jobs.image_job_manager, "max_active_per_user", 2)
+
+    jobs = [
+        live_client.post("/image/jobs", json={"prompt": f"slow {n}"}, headers=auth_headers)
+        for n in range(3)
+    ]
+    assert [r.status_code for r in jobs] == [202, 202, 429]
+    assert jobs[2].headers["retry-after"]
+
+    live_client.portal.call(release.set)
+    for response in jobs[:2]:
+        assert _wait_for_job(live_client, auth_headers, response.json()["id"])["status"] == "succeeded"
+    assert live_client.post("/image/jobs", json={"prompt": "again"}, headers=auth_headers).status_code == 202
+
+def test_image_job_cap_holds_under_concurrent_submits(db_session, test_user):
+    """Simultaneous submits cannot all pass the per-user cap."""
+    import asyncio
+    from sqlalchemy import func, select
+    from app.db import crud
+    from app.db.models import ImageJob
+    from tests.conftest import TestingAsyncSessionLocal
+
+    async def submit(n):
+        async with TestingAsyncSessionLocal() as db:
+            return await crud.create_image_job(db, test_user.id, f"race {n}", {}, max_active=2)
+
+    async def submit_all():
+        return await asyncio.gather(*(submit(n) for n in range(6)))
+
+    jobs = asyncio.run(submit_all())
+    assert sum(job is not None for job in jobs) == 2
+    assert db_session.scalar(select(func.count()).select_from(ImageJob)) == 2
+
+def test_image_job_submit_reserves_queue_slot(test_user, monkeypatch):
+    """A submit still inserting its row holds its queue slot, so a concurrent
+    one gets the 503 instead of overflowing the queue after its insert."""
+    import asyncio
+    from fastapi import HTTPException
+    from app.db import crud
+    from app.services import image_jobs
+    from tests.conftest import TestingAsyncSessionLocal
+
+    create_image_job = crud.create_image_job
+
+    async def slow_create_image_job(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return await create_image_job(*args, **kwargs)
+
+    async def submit_all():
+        release = asyncio.Event()
+
+        async def blocked_generate(prompt, **params):
+            await release.wait()
+            return {"prompt": prompt, "image_url": "https://example.com/x.png", "meta_data": {}}
+
+        monkeypatch.setattr(image_jobs, "generate_image", blocked_generate)
+        manager = image_jobs.ImageJobManager(
+            workers=1, max_active_per_user=10, max_queue=1, session_factory=TestingAsyncSessionLocal
+        )
+        await manager.start()
+        try:
+            async with TestingAsyncSessionLocal() as db:
+                await manager.submit(db, test_user.id, "occupies the worker", {})
+            while not manager.active_jobs:
+                await asyncio.sleep(0.01)
+            monkeypatch.setattr(crud, "create_image_job", slow_create_image_job)
+
+            async def submit(n):
+                async with TestingAsyncSessionLocal() as db:
+                    return await manager.submit(db, test_user.id, f"racing {n}", {})
+
+            return await asyncio.gather(*(submit(n) for n in range(2)), return_exceptions=True)
+        finally:
+            release.set()
+            await manager.stop(grace_seconds=5)
+
+    outcomes = asyncio.run(submit_all())
+    assert sum(not isinstance(o, Exception) for o in outcomes) == 1
+    rejected = [o for o in outcomes if isinstance(o, Exception)]
+    assert isinstance(rejected[0], HTTPException) and rejected[0].status_code == 503
+    assert rejected[0].headers["Retry-After"]
+
+def test_image_jobs_resume_after_restart(db_session, test_user, auth_headers):
+    """Queued and abandoned running jobs are picked up when the app starts."""
+    from datetime import datetime, timedelta, timezone
+    from app.db.models import ImageJob
+    from app.main import app
+
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    db_session.add_all([
+        ImageJob(id="a" * 32, user_id=test_user.id, status="queued", progress=0,
+                 prompt="left queued", params={}, attempts=0),
+        ImageJob(id="b" * 32, user_id=test_user.id, status="running", progress=5,
+                 prompt="worker died", params={}, attempts=1, started_at=stale),
+    ])
+    db_session.commit()
+
+    with TestClient(app) as client:
+        for job_id in ("a" * 32, "b" * 32):
+            job = _wait_for_job(client, auth_headers, job_id)
+            assert job["status"] == "succeeded"
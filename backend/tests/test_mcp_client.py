@@ -0,0 +1,118 @@
+import pytest
+from fastapi.testclient import TestClient
+from tests.mcp_stub import run_stub
+
+@pytest.fixture
+def mcp_stub(monkeypatch):
+    """Point both providers at a local stand-in MCP server."""
+    from app.core.config import settings
+
+    with run_stub() as stub:
+        monkeypatch.setattr(settings, "search_mcp_url", stub.url)
+        monkeypatch.setattr(settings, "image_mcp_url", stub.url)
+        yield stub
+
+@pytest.mark.asyncio
+async def test_provider_calls_reuse_one_connection(mcp_stub):
+    """Sequential provider calls share a pooled keep-alive connection."""
+    from app.services.mcp_client import fetch_search_results, generate_image
+    from app.services.provider_clients import provider_clients
+
+    await provider_clients.start()
+    try:
+        for n in range(20):
+            result = await fetch_search_results(f"query {n}", max_results=3)
+            assert result["results"][0]["title"] == f"Stub result 1 for: query {n}"
+        image = await generate_image("a lighthouse", width=64, height=64, steps=4)
+        assert image["meta_data"]["source"] == "mcp_stub"
+    finally:
+        await provider_clients.aclose()
+
+    assert mcp_stub.requests == 21
+    # One connection per provider client
+    assert len(mcp_stub.connections) == 2
+
+@pytest.mark.asyncio
+async def test_provider_total_timeout(mcp_stub, monkeypatch):
+    """Slow providers fail with ProviderError after the total timeout."""
+    from app.core.config import settings
+    from app.services.provider_clients import ProviderError, provider_clients
+
+    monkeypatch.setattr(settings, "provider_total_timeout_seconds", 0.1)
+    mcp_stub.delay = 1.0
+    await provider_clients.start()
+    try:
+        with pytest.raises(ProviderError):
+            await provider_clients.call_tool("search", "search", {"query": "slow"})
+    finally:
+        await provider_clients.aclose()
+
+@pytest.mark.asyncio
+async def test_provider_tool_error(mcp_stub):
+    from app.services.provider_clients import ProviderError, provider_clients
+
+    await provider_clients.start()
+    try:
+        with pytest.raises(ProviderError, match="Unknown tool"):
+            await provider_clients.call_tool("search", "no_such_tool", {})
+    finally:
+        await provider_clients.aclose()
+
+@pytest.mark.asyncio
+async def test_provider_event_stream_replies(mcp_stub):
+    """Streamable HTTP servers may answer with an SSE body."""
+    from app.services.provider_clients import ProviderError, provider_clients
+
+    mcp_stub.event_stream = True
+    await provider_clients.start()
+    try:
+        result = await provider_clients.call_tool("search", "search", {"query": "streamed", "max_results": 1})
+        assert result["results"][0]["title"] == "Stub result 1 for: streamed"
+        with pytest.raises(ProviderError, match="Unknown tool"):
+            await provider_clients.call_tool("search", "no_such_tool", {})
+    finally:
+        await provider_clients.aclose()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reply", [
+    ("text/html", "<html>Bad gateway</html>"),
+    ("application/json", "[1, 2]"),
+    ("application/json", '{"jsonrpc": "2.0", "id": 1, "error": "overloaded"}'),
+    ("application/json", '{"jsonrpc": "2.0", "id": 1, "result": {"content": [{"type": "text", "text": "nope"}]}}'),
+    ("text/event-stream", "event: message\ndata: {}\n\n"),
+])
+async def test_provider_malformed_replies(mcp_stub, reply):
+    """Replies that are not a usable tool result fail with ProviderError."""
+    from app.services.provider_clients import ProviderError, provider_clients
+
+    mcp_stub.raw_reply = reply
+    await provider_clients.start()
+    try:
+        with pytest.raises(ProviderError):
+            await provider_clients.call_tool("search", "search", {"query": "broken"})
+    finally:
+        await provider_clients.aclose()
+
+def test_lifespan_opens_and_closes_provider_clients(mcp_stub, auth_headers):
+    """Requests go through the clients opened by the app lifespan."""
+    from app.main import app
+    from app.services.provider_clients import provider_clients
+
+    with TestClient(app) as client:
+        assert provider_clients.get("search") is not None
+        for n in range(5):
+            response = client.post(
+                "/search/", json={"query": f"lifespan {n}", "max_results": 2}, headers=auth_headers
+            )
+            assert response.status_code == 200
+            assert response.json()["meta_data"]["source"] == "mcp_stub"
+        search_client = provider_clients.get("search")
+
+    assert search_client.is_closed
+    assert provider_clients.get("search") is None
+    assert len(mcp_stub.connections) == 1
+
+def test_mock_results_without_provider_url(client: TestClient, auth_headers):
+    """Without a configured URL the mock provider answers."""
+    response = client.post("/search/", json={"query": "offline", "max_results": 2}, headers=auth_headers)
+    assert response.json()["meta_data"]["source"] == "tavily_mcp"
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import sys
+import pytest
+from app.core import metrics
+from app.core.metrics import MetricsRegistry, fingerprint
+
+def sample(text: str, line_start: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_start + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_start} not found in metrics output")
+
+def test_metrics_endpoint_labels_routes_by_template(client, auth_headers):
+    metrics.registry.clear()
+    client.get("/health")
+    client.get("/image/jobs/abc123", headers=auth_headers)
+    client.get("/no/such/path")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert sample(body, 'http_requests_total{method="GET",route="/health",status="200"}') == 1
+    # The path parameter stays in template form
+    assert sample(body, 'http_requests_total{method="GET",route="/image/jobs/{job_id}",status="404"}') == 1
+    assert sample(body, 'http_requests_total{method="GET",route="<unmatched>",status="404"}') == 1
+    assert sample(body, 'http_request_duration_seconds_count{method="GET",route="/health"}') == 1
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"} 1' in body
+    # SQL statements from the authenticated request, grouped by fingerprint
+    assert "db_queries_total{statement=\"SELECT users." in body
+    assert "db_pool_checkout_seconds_count{pool=\"test\"}" in body
+
+def test_fingerprint_collapses_literals_and_lists():
+    a = fingerprint("SELECT * FROM users WHERE id IN (?, ?, ?) AND name = 'bob'  LIMIT 10")
+    b = fingerprint("SELECT *\nFROM users WHERE id IN (?, ?) AND name = 'alice' LIMIT 20")
+    assert a == b == "SELECT * FROM users WHERE id IN (...) AND name = ? LIMIT ?"
+
+@pytest.mark.asyncio
+async def test_provider_latency_and_errors(monkeypatch):
+    from app.services import mcp_client
+    from app.services.provider_clients import ProviderError, provider_clients
+
+    metrics.registry.clear()
+    calls = []
+
+    async def fake_call_tool(name, tool, arguments):
+        calls.append(tool)
+        if len(calls) > 1:
+            raise ProviderError("boom")
+        return {"results": []}
+
+    monkeypatch.setattr(provider_clients, "configured", lambda name: True)
+    monkeypatch.setattr(provider_clients, "call_tool", fake_call_tool)
+    await mcp_client.fetch_search_results("ok")
+    with pytest.raises(ProviderError):
+        await mcp_client.generate_image("fails")
+
+    body = metrics.registry.render()
+    assert sample(body, 'provider_requests_total{provider="search",outcome="ok"}') == 1
+    assert sample(body, 'provider_requests_total{provider="image",outcome="error"}') == 1
+    assert sample(body, 'provider_request_duration_seconds_count{provider="image"}') == 1
+
+def test_multiprocess_snapshots_are_merged(tmp_path):
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    depth = registry.gauge("queue_depth", "Depth")
+    requests.inc(route="/a")
+    latency.observe(0.05)
+    depth.set(3)
+
+    # Snapshot left by another worker that has since exited
+    script = (
+        "import sys; from app.core.metrics import MetricsRegistry\n"
+        "r = MetricsRegistry()\n"
+        "r.counter('requests_total', 'Requests', ('route',)).inc(2, route='/a')\n"
+        "r.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(0.5)\n"
+        "r.gauge('queue_depth', 'Depth').set(100)\n"
+        "r.write_snapshot(sys.argv[1])\n"
+    )
+    subprocess.run([sys.executable, "-c", script, str(tmp_path)], check=True, cwd=os.getcwd())
+
+    body = registry.render(str(tmp_path))
+    assert sample(body, 'requests_total{route="/a"}') == 3
+    assert sample(body, 'latency_seconds_bucket{le="0.1"}') == 1
+    assert sample(body, 'latency_seconds_bucket{le="1"}') == 2
+    assert sample(body, "latency_seconds_count") == 2
+    # Gauges from dead processes are dropped
+    assert sample(body, "queue_depth") == 3
+
+def test_render_snapshots_skips_unreadable_files(tmp_path):
+    (tmp_path / "metrics-1.json").write_text("{not json")
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "Hits").inc()
+    assert sample(registry.render(str(tmp_path)), "hits_total") == 1
+
+@pytest.mark.asyncio
+async def test_history_writer_flush_latency(test_user):
+    from app.services.history_writer import HistoryWriter
+    from tests.conftest import TestingAsyncSessionLocal
+
+    metrics.registry.clear()
+    writer = HistoryWriter(
+        max_queue=10, flush_rows=10, flush_interval_ms=60_000,
+        put_timeout_seconds=0.05, session_factory=TestingAsyncSessionLocal
+    )
+    await writer.start()
+    for n in range(3):
+        await writer.record_search(None, test_user.id, f"timed {n}", {"results": []})
+    await writer.stop()
+
+    body = metrics.registry.render()
+    assert sample(body, "history_writer_flush_seconds_count") == 1
+    assert sample(body, 'history_writer_flush_seconds_bucket{le="+Inf"}') == 1
+    assert sample(body, "history_writer_flush_seconds_sum") == pytest.approx(writer.flush_seconds_total)
+    assert sample(body, "history_writer_queue_depth") == 0
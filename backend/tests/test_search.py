@@ -1,3 +1,5 @@
+import asyncio
+import math
 import pytest
 from fastapi.testclient import TestClient
 
@@ -55,4 +57,578 @@ def test_get_search_history_pagination(client: TestClient, auth_headers):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
-    assert len(data) <= 5
\ No newline at end of file
+    assert len(data) <= 5
+
+
+def test_search_history_cursor_pagination(client: TestClient, auth_headers):
+    """Following X-Next-Cursor walks every row exactly once, newest first."""
+    for i in range(5):
+        client.post("/search/", json={"query": f"paged {i}", "max_results": 1}, headers=auth_headers)
+
+    seen = []
+    response = client.get("/search/history?limit=2", headers=auth_headers)
+    while True:
+        assert response.status_code == 200
+        seen.extend(item["query"] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        response = client.get(f"/search/history?limit=2&cursor={cursor}", headers=auth_headers)
+
+    assert seen == [f"paged {i}" for i in reversed(range(5))]
+
+def test_search_history_invalid_cursor(client: TestClient, auth_headers):
+    """A malformed cursor is a client error."""
+    response = client.get("/search/history?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+def test_search_history_summary_view(client: TestClient, auth_headers):
+    """The summary view counts results in SQL instead of returning them."""
+    client.post("/search/", json={"query": "summary view", "max_results": 3}, headers=auth_headers)
+
+    response = client.get("/search/history?view=summary", headers=auth_headers)
+    assert response.status_code == 200
+    item = response.json()[0]
+    assert item["query"] == "summary view"
+    assert item["results_count"] == 3
+    assert "results" not in item
+
+    response = client.get(f"/search/history/{item['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()["results"]["results"]) == 3
+
+def test_search_results_are_stored_once(client: TestClient, auth_headers, db_session):
+    """Results repeated across searches are stored once and read back unchanged."""
+    from sqlalchemy import func, select
+    from app.db.models import SearchDocument, SearchHistoryDocument
+
+    responses = [
+        client.post("/search/", json={"query": query, "max_results": 3}, headers=auth_headers).json()
+        for query in ("shared docs", "shared docs", "other docs")
+    ]
+
+    history = client.get("/search/history", headers=auth_headers).json()
+    assert [h["results"] for h in history] == responses[::-1]
+    entry = client.get(f"/search/history/{history[0]['id']}", headers=auth_headers).json()
+    assert entry["results"] == responses[-1]
+    assert db_session.scalar(select(func.count()).select_from(SearchDocument)) == 6
+    assert db_session.scalar(select(func.count()).select_from(SearchHistoryDocument)) == 9
+
+def test_inline_results_backfill_and_orphan_purge(client: TestClient, auth_headers, db_session, test_user):
+    """Rows written before the document store read the same once moved, and
+    documents go once no search links to them."""
+    from datetime import datetime, timezone
+    from sqlalchemy import func, insert, select
+    from app.db import result_documents
+    from app.db.models import SearchDocument, SearchHistory
+    from app.services.mcp_client import fetch_search_results
+    from tests.conftest import TestingAsyncSessionLocal
+
+    db_session.execute(insert(SearchHistory), [
+        {"user_id": test_user.id, "query": query, "results": results, "meta_data": {},
+         "created_at": datetime.now(timezone.utc)}
+        for query, results in [
+            ("legacy", asyncio.run(fetch_search_results("legacy", 2))),
+            ("odd shape", {"answer": "42", "results": ["not", "documents"]}),
+        ]
+    ])
+    db_session.commit()
+    before = client.get("/search/history", headers=auth_headers).json()
+
+    assert result_documents.backfill(db_session.connection(), batch_size=1) == 1
+    db_session.commit()
+    assert client.get("/search/history", headers=auth_headers).json() == before
+    counts = db_session.execute(select(SearchHistory.query, SearchHistory.result_count)).all()
+    assert sorted(counts) == [("legacy", 2), ("odd shape", None)]
+
+    legacy = next(h for h in before if h["query"] == "legacy")
+    assert client.delete(f"/dashboard/search/{legacy['id']}", headers=auth_headers).status_code == 200
+
+    async def purge():
+        async with TestingAsyncSessionLocal() as db:
+            return await result_documents.purge_orphans(db, batch_size=10)
+
+    assert asyncio.run(purge()) == 2
+    assert db_session.scalar(select(func.count()).select_from(SearchDocument)) == 0
+
+def test_search_history_entry_not_found(client: TestClient, auth_headers):
+    """Entries of other users or unknown ids are 404s."""
+    response = client.get("/search/history/999999", headers=auth_headers)
+    assert response.status_code == 404
+
+def test_repeated_search_is_served_from_cache(client: TestClient, auth_headers):
+    """Equivalent queries share one cache entry and are marked as cached."""
+    from app.services.search_cache import get_search_cache
+
+    first = client.post("/search/", json={"query": "Café  Society", "max_results": 3}, headers=auth_headers)
+    second = client.post("/search/", json={"query": " café society ", "max_results": 3}, headers=auth_headers)
+    other = client.post("/search/", json={"query": "café society", "max_results": 4}, headers=auth_headers)
+
+    assert first.json()["meta_data"]["cached"] is False
+    assert second.json()["meta_data"]["cached"] is True
+    assert second.json()["query"] == " café society "
+    assert second.json()["results"] == first.json()["results"]
+    assert other.json()["meta_data"]["cached"] is False
+    assert get_search_cache().stats() == {
+        "hits": 1, "misses": 2, "coalesced": 0, "evictions": 0, "backend_errors": 0
+    }
+
+@pytest.mark.asyncio
+async def test_search_cache_coalesces_concurrent_misses():
+    """Concurrent identical searches trigger a single provider call."""
+    import asyncio
+    from app.services.search_cache import MemoryCacheBackend, SearchCache
+
+    cache = SearchCache(MemoryCacheBackend(max_bytes=1 << 20), ttl_seconds=60)
+    calls = []
+
+    async def fetch(query, max_results):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return {"query": query, "results": [], "meta_data": {}}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("Same Query", 5, fetch) for _ in range(10)))
+
+    assert len(calls) == 1
+    assert sum(not r["meta_data"]["cached"] for r in results) == 1
+    assert cache.stats()["coalesced"] == 9
+
+    async def failing(query, max_results):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    outcomes = await asyncio.gather(
+        *(cache.get_or_fetch("broken", 5, failing) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+    # Failures are not cached
+    assert await cache.backend.get("broken") is None
+
+@pytest.mark.asyncio
+async def test_memory_cache_backend_ttl_and_byte_budget(monkeypatch):
+    """Entries expire after the TTL and the least recently used go first."""
+    from app.services import search_cache
+    from app.services.search_cache import MemoryCacheBackend
+
+    now = [1000.0]
+    monkeypatch.setattr(search_cache.time, "monotonic", lambda: now[0])
+    backend = MemoryCacheBackend(max_bytes=30)
+
+    await backend.set("a", b"x" * 9, ttl_seconds=10)
+    await backend.set("b", b"x" * 9, ttl_seconds=10)
+    await backend.set("c", b"x" * 9, ttl_seconds=10)
+    assert await backend.get("a") is not None  # "b" is now least recently used
+    await backend.set("d", b"x" * 9, ttl_seconds=10)
+
+    assert await backend.get("b") is None
+    assert backend.evictions == 1
+    assert backend.size_bytes <= 30
+    # Values larger than the whole budget are not stored
+    await backend.set("big", b"x" * 100, ttl_seconds=10)
+    assert await backend.get("big") is None
+
+    now[0] += 11
+    assert await backend.get("a") is None
+    assert backend.size_bytes == 20
+
+@pytest.mark.asyncio
+async def test_shared_cache_backend_with_stand_in_client():
+    """The shared backend works against any redis-like async client."""
+    from app.services.search_cache import RedisCacheBackend, SearchCache
+
+    class StandInRedis:
+        def __init__(self):
+            self.data, self.ttls = {}, {}
+
+        async def get(self, key):
+            return self.data.get(key)
+
+        async def set(self, key, value, ex=None):
+            self.data[key], self.ttls[key] = value, ex
+
+    client = StandInRedis()
+    worker_a = SearchCache(RedisCacheBackend(client), ttl_seconds=120)
+    worker_b = SearchCache(RedisCacheBackend(client), ttl_seconds=120)
+
+    async def fetch(query, max_results):
+        return {"query": query, "results": [{"title": "t"}], "meta_data": {}}
+
+    assert (await worker_a.get_or_fetch("shared", 5, fetch))["meta_data"]["cached"] is False
+    assert (await worker_b.get_or_fetch("SHARED", 5, fetch))["meta_data"]["cached"] is True
+    assert list(client.ttls.values()) == [120]
+
+@pytest.mark.asyncio
+async def test_search_cache_follower_takes_over_cancelled_call():
+    """A caller that goes away does not fail the callers coalesced onto it."""
+    from app.services.search_cache import MemoryCacheBackend, SearchCache
+
+    cache = SearchCache(MemoryCacheBackend(max_bytes=1 << 20), ttl_seconds=60)
+    calls = []
+
+    async def fetch(query, max_results):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return {"query": query, "results": [], "meta_data": {}}
+
+    leader = asyncio.create_task(cache.get_or_fetch("dropped", 5, fetch))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(cache.get_or_fetch("dropped", 5, fetch)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    results = await asyncio.gather(*followers)
+    assert leader.cancelled()
+    assert len(calls) == 2
+    assert sum(not r["meta_data"]["cached"] for r in results) == 1
+
+@pytest.mark.asyncio
+async def test_search_cache_fails_open():
+    """Backend outages fall through to the provider instead of failing the search."""
+    from app.services.search_cache import RedisCacheBackend, SearchCache
+
+    class DownRedis:
+        async def get(self, key):
+            raise ConnectionError("cache down")
+
+        async def set(self, key, value, ex=None):
+            raise ConnectionError("cache down")
+
+    cache = SearchCache(RedisCacheBackend(DownRedis()), ttl_seconds=60)
+
+    async def fetch(query, max_results):
+        await asyncio.sleep(0.01)
+        return {"query": query, "results": [{"title": "t"}], "meta_data": {}}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("outage", 5, fetch) for _ in range(3)))
+    assert all(r["results"] == [{"title": "t"}] for r in results)
+    # Three failed reads, one failed write by the caller that fetched
+    assert cache.stats()["backend_errors"] == 4
+
+def test_search_batch(client: TestClient, auth_headers, monkeypatch):
+    """Batches fan out under the concurrency cap and record successes once."""
+    import asyncio
+    from app.core.config import settings
+    from app.routers import search as search_router
+    from app.services.mcp_client import search_web
+
+    running = {"now": 0, "peak": 0}
+
+    async def tracked_search(query, max_results=10):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            await asyncio.sleep(0.01)
+            if query == "boom":
+                raise RuntimeError("provider failed")
+            return await search_web(query, max_results)
+        finally:
+            running["now"] -= 1
+
+    monkeypatch.setattr(search_router, "search_web", tracked_search)
+    monkeypatch.setattr(settings, "search_batch_concurrency", 3)
+
+    from sqlalchemy import event
+    from tests.conftest import async_engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 3)[:3])
+
+    queries = [f"batch query {n}" for n in range(9)] + ["boom"]
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.post(
+            "/search/batch",
+            json={"searches": [{"query": q, "max_results": 2} for q in queries]},
+            headers=auth_headers
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert statements.count(["INSERT", "INTO", "search_history"]) == 1
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["query"] for r in results] == queries
+    assert all(r["status"] == "ok" and r["result"]["results"] for r in results[:-1])
+    assert results[-1] == {"query": "boom", "status": "error", "result": None, "error": "provider failed"}
+    assert running["peak"] == 3
+
+    history = client.get("/search/history?limit=50", headers=auth_headers).json()
+    assert sorted(h["query"] for h in history) == sorted(queries[:-1])
+
+def test_search_batch_limits(client: TestClient, auth_headers):
+    assert client.post("/search/batch", json={"searches": []}, headers=auth_headers).status_code == 422
+    too_many = {"searches": [{"query": f"q{n}"} for n in range(51)]}
+    assert client.post("/search/batch", json=too_many, headers=auth_headers).status_code == 422
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    """Enable write-behind history inserts for clients entering the lifespan."""
+    from app.core.config import settings
+    from app.services.history_writer import HistoryWriter, history_writer
+    from tests.conftest import TestingAsyncSessionLocal
+
+    writer = HistoryWriter(
+        max_queue=100, flush_rows=500, flush_interval_ms=60_000,
+        put_timeout_seconds=0.05, session_factory=TestingAsyncSessionLocal
+    )
+    monkeypatch.setattr(settings, "history_write_behind", True)
+    for module in ("app.main", "app.routers.search", "app.routers.image"):
+        monkeypatch.setattr(f"{module}.history_writer", writer)
+    yield writer
+
+def _search_history_count(db_session, test_user) -> int:
+    from app.db.models import SearchHistory
+
+    db_session.expire_all()
+    return db_session.query(SearchHistory).filter_by(user_id=test_user.id).count()
+
+def test_write_behind_flushes_on_shutdown(write_behind, db_session, test_user, auth_headers):
+    """Searches return before their rows are committed; shutdown flushes them."""
+    from app.main import app
+
+    with TestClient(app) as client:
+        for n in range(3):
+            response = client.post("/search/", json={"query": f"buffered {n}"}, headers=auth_headers)
+            assert response.status_code == 200
+        assert write_behind.depth == 3
+        assert _search_history_count(db_session, test_user) == 0
+
+    assert _search_history_count(db_session, test_user) == 3
+    stats = write_behind.stats()
+    assert stats["flushes"] == 1 and stats["rows_flushed"] == 3 and stats["queue_depth"] == 0
+
+def test_write_behind_flushes_at_row_threshold(write_behind, db_session, test_user, auth_headers):
+    import time
+    from app.main import app
+
+    write_behind.flush_rows = 2
+    with TestClient(app) as client:
+        for n in range(2):
+            client.post("/search/", json={"query": f"threshold {n}"}, headers=auth_headers)
+        deadline = time.monotonic() + 5
+        while write_behind.rows_flushed < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _search_history_count(db_session, test_user) == 2
+
+def test_write_behind_backpressure(write_behind, db_session, test_user, auth_headers, monkeypatch):
+    """A full queue makes the request write its own row instead of waiting."""
+    import asyncio
+    from app.main import app
+
+    write_behind.max_queue = 1
+    write_behind.flush_rows = 1
+    release = asyncio.Event()
+    original_flush = write_behind._flush
+
+    async def stalled_flush(batch):
+        await release.wait()
+        await original_flush(batch)
+
+    monkeypatch.setattr(write_behind, "_flush", stalled_flush)
+    with TestClient(app) as client:
+        # One row is held by the stalled flush, one fills the queue
+        for n in range(3):
+            assert client.post("/search/", json={"query": f"pressure {n}"}, headers=auth_headers).status_code == 200
+        assert write_behind.overflow_writes == 1
+        assert _search_history_count(db_session, test_user) == 1
+        client.portal.call(release.set)
+
+    assert _search_history_count(db_session, test_user) == 3
+
+def test_search_history_etag_revalidation(client: TestClient, auth_headers):
+    """History carries an ETag that yields 304 until the history changes."""
+    client.post("/search/", json={"query": "etag one", "max_results": 1}, headers=auth_headers)
+    response = client.get("/search/history?limit=5", headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    cached = client.get("/search/history?limit=5", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    # Another page is another representation
+    assert client.get("/search/history?limit=6", headers=auth_headers).headers["etag"] != etag
+
+    client.post("/search/", json={"query": "etag two", "max_results": 1}, headers=auth_headers)
+    changed = client.get("/search/history?limit=5", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+    etag = changed.headers["etag"]
+    entry = changed.json()[0]
+    assert client.delete(f"/dashboard/search/{entry['id']}", headers=auth_headers).status_code == 200
+    after_delete = client.get("/search/history?limit=5", headers={**auth_headers, "If-None-Match": etag})
+    assert after_delete.status_code == 200
+
+def test_large_history_is_compressed(client: TestClient, auth_headers):
+    """Large listings are gzip-encoded for clients that accept it; small bodies are not."""
+    for n in range(10):
+        client.post("/search/", json={"query": f"compress {n}", "max_results": 5}, headers=auth_headers)
+    response = client.get("/search/history", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert len(response.json()) == 10
+
+    identity = client.get("/search/history", headers={**auth_headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == response.json()
+
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+@pytest.fixture
+def strict_admission(monkeypatch):
+    """Swap in an admission controller with tiny limits and a manual clock."""
+    from app.services import admission
+
+    now = [0.0]
+    controller = admission.AdmissionController(
+        admission.MemoryRateLimitBackend(clock=lambda: now[0]),
+        {
+            admission.SEARCH: admission.ClassLimits(rate_per_second=1.0, burst=2, max_in_flight=1),
+            admission.IMAGE: admission.ClassLimits(rate_per_second=0, burst=0, max_in_flight=0),
+        },
+        shed_retry_after=2,
+    )
+    monkeypatch.setattr(admission, "_controller", controller)
+    return controller, now
+
+def test_search_rate_limited_per_user(client: TestClient, auth_headers, strict_admission):
+    """An empty bucket answers 429 with Retry-After until it refills."""
+    controller, now = strict_admission
+    search = {"query": "limited", "max_results": 1}
+    for _ in range(2):
+        assert client.post("/search/", json=search, headers=auth_headers).status_code == 200
+    response = client.post("/search/", json=search, headers=auth_headers)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+    # Image generation has its own (here unlimited) class
+    image = {"prompt": "x", "width": 64, "height": 64}
+    assert client.post("/image/generate", json=image, headers=auth_headers).status_code == 200
+
+    now[0] += 1
+    assert client.post("/search/", json=search, headers=auth_headers).status_code == 200
+    # A batch costs one token per search
+    now[0] += 10
+    batch = {"searches": [search] * 2}
+    assert client.post("/search/batch", json=batch, headers=auth_headers).status_code == 200
+    assert client.post("/search/", json=search, headers=auth_headers).status_code == 429
+    # One bigger than a full bucket could never be admitted
+    now[0] += 10
+    too_large = client.post("/search/batch", json={"searches": [search] * 3}, headers=auth_headers)
+    assert too_large.status_code == 413
+    assert "retry-after" not in too_large.headers
+    # and takes no tokens
+    for _ in range(2):
+        assert client.post("/search/", json=search, headers=auth_headers).status_code == 200
+    assert controller.stats() == {("search", "rate_limited"): 2, ("search", "too_large"): 1}
+
+def test_search_shed_when_in_flight_cap_reached(client: TestClient, auth_headers, strict_admission):
+    """At the in-flight cap new requests are shed with 503 instead of queueing."""
+    controller, now = strict_admission
+
+    async def with_slot_held():
+        async with controller.admit(user_id=0, endpoint_class="search"):
+            return client.post("/search/", json={"query": "shed", "max_results": 1}, headers=auth_headers)
+
+    response = asyncio.run(with_slot_held())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+    assert controller.in_flight("search") == 0
+    assert controller.stats() == {("search", "shed"): 1}
+    # Shed requests do not spend rate tokens: the full burst is still there
+    for _ in range(2):
+        response = client.post("/search/", json={"query": "shed", "max_results": 1}, headers=auth_headers)
+        assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_shared_rate_limit_backend_with_stand_in_client():
+    """Workers using the shared backend draw from the same bucket."""
+    from app.services.admission import RedisRateLimitBackend
+
+    class StandInRedis:
+        """Runs the token bucket script's logic in Python."""
+        def __init__(self):
+            self.buckets = {}
+
+        async def eval(self, script, numkeys, key, rate, burst, cost, now):
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0, now - updated) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = math.ceil((cost - tokens) / rate * 1000)
+            self.buckets[key] = (tokens, now)
+            return wait
+
+    client = StandInRedis()
+    worker_a, worker_b = RedisRateLimitBackend(client), RedisRateLimitBackend(client)
+    assert await worker_a.take("search:1", 0.5, 2, 1) == 0
+    assert await worker_b.take("search:1", 0.5, 2, 1) == 0
+    assert 0 < await worker_a.take("search:1", 0.5, 2, 1) <= 2
+    assert list(client.buckets) == ["ratelimit:v1:search:1"]
+
+def _similar(client: TestClient, auth_headers, q: str, k: int = 10) -> list:
+    response = client.get("/search/similar", params={"q": q, "k": k}, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_similar_searches_follow_history(client: TestClient, auth_headers):
+    """Past searches come back by similarity; inserts and deletes update the index in place."""
+    from app.services.similar_searches import similar_searches
+
+    for query in ("python async database", "chocolate cake recipe", "python asyncio tutorial"):
+        client.post("/search/", json={"query": query, "max_results": 2}, headers=auth_headers)
+
+    hits = _similar(client, auth_headers, "python asyncio")
+    assert [hit["query"] for hit in hits][:2] == ["python asyncio tutorial", "python async database"]
+    assert hits[0]["results"]["query"] == "python asyncio tutorial"
+    similarities = [hit["similarity"] for hit in hits]
+    assert similarities == sorted(similarities, reverse=True) and similarities[0] > 0.5
+    assert len(_similar(client, auth_headers, "python asyncio", k=1)) == 1
+    assert _similar(client, auth_headers, "!!!") == []
+    rebuilds = similar_searches.rebuilds
+
+    client.post("/search/batch", json={"searches": [{"query": "chocolate cake frosting"}]}, headers=auth_headers)
+    cakes = _similar(client, auth_headers, "chocolate cake", k=2)
+    assert {hit["query"] for hit in cakes} == {"chocolate cake recipe", "chocolate cake frosting"}
+
+    response = client.request(
+        "DELETE", "/dashboard/search", json={"ids": [cakes[0]["id"]]}, headers=auth_headers
+    )
+    assert response.json()["deleted"] == 1
+    remaining = _similar(client, auth_headers, "chocolate cake", k=2)
+    assert cakes[0]["id"] not in [hit["id"] for hit in remaining]
+    assert len(remaining) == 2
+    assert similar_searches.rebuilds == rebuilds
+
+def test_similar_search_index_reloads_and_catches_outside_changes(
+    client: TestClient, auth_headers, db_session, test_user
+):
+    """Saved indexes are mapped back at startup; changes made elsewhere trigger a rebuild."""
+    from app.db.models import SearchHistory, UserCollectionVersion
+    from app.services.similar_searches import similar_searches
+
+    for query in ("vector index latency", "gardening tips"):
+        client.post("/search/", json={"query": query}, headers=auth_headers)
+    before = _similar(client, auth_headers, "vector latency")
+
+    asyncio.run(similar_searches.stop())
+    asyncio.run(similar_searches.start())
+    rebuilds = similar_searches.rebuilds
+    assert _similar(client, auth_headers, "vector latency") == before
+    assert similar_searches.rebuilds == rebuilds
+
+    # Another worker records a search: the row and a version bump, nothing in this index
+    db_session.add(SearchHistory(user_id=test_user.id, query="vector database latency", results={}, meta_data={}))
+    version = db_session.get(UserCollectionVersion, (test_user.id, "searches"))
+    version.version += 1
+    db_session.commit()
+    hits = _similar(client, auth_headers, "vector database latency")
+    assert hits[0]["query"] == "vector database latency"
+    assert similar_searches.rebuilds == rebuilds + 1
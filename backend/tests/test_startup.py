@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+# Wall-clock budget for ``import app.main`` in a fresh interpreter. Override
+# on slow CI runners with IMPORT_TIME_BUDGET_SECONDS.
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+# Loaded on first use, never at boot
+LAZY_MODULES = ("httpx", "jose", "passlib", "numpy")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+def import_app_main() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True, env=os.environ.copy()
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_import_app_main_within_budget():
+    """Cold import stays under budget (best of three to absorb noise)."""
+    runs = [import_app_main() for _ in range(3)]
+    best = min(run["seconds"] for run in runs)
+    assert best < IMPORT_TIME_BUDGET_SECONDS, (
+        f"import app.main took {best:.2f}s, budget is {IMPORT_TIME_BUDGET_SECONDS}s; "
+        "profile with python -m benchmarks.import_time"
+    )
+
+def test_provider_and_crypto_modules_load_lazily():
+    assert import_app_main()["modules"] == []
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { dashboardAPI } from '../services/api';
+import { dashboardAPI, blobURL } from '../services/api';
 import LoadingSpinner from '../components/common/LoadingSpinner';
 import ErrorMessage from '../components/common/ErrorMessage';
 
@@ -215,9 +215,9 @@ const Dashboard = () => {
                 key={image.id}
                 className="bg-white dark:bg-gray-800 rounded-lg shadow overflow-hidden"
               >
-                {image.image_data && (
+                {(image.blob_url || image.image_data) && (
                   <img
-                    src={`data:image/png;base64,${image.image_data}`}
+                    src={image.blob_url ? blobURL(image.blob_url) : `data:image/png;base64,${image.image_data}`}
                     alt={image.prompt}
                     className="w-full h-48 object-cover"
                   />
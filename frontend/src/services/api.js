@@ -104,4 +104,6 @@ export const dashboardAPI = {
   exportPDF: async (type = 'all') => (await api.get(`/dashboard/export/pdf?data_type=${type}`, { responseType: 'blob' })).data
 }
 
+export const blobURL = path => `${API_URL}${path}`
+
 export default api